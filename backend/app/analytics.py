@@ -0,0 +1,282 @@
+"""Columnar mirror of waste_entries for long-range reports and dashboards.
+
+Optional: needs pyarrow and WASTE_ANALYTICS_ENABLED=1. Each site's entries
+are copied into Parquet files next to its database
+(<file>.analytics/site-<id>/, or under WASTE_ANALYTICS_DIR), three columns:
+entry_date (YYYYMMDD), item_id and quantity, sorted by date within a file.
+A report reads only the columns it needs and skips row groups outside its
+dates, and aggregates them vectorized in a streaming plan, where SQLite
+walks its covering index one entry at a time.
+
+Reports (services.report) and dashboards (services.dashboard) over
+WASTE_ANALYTICS_MIN_DAYS days or more read it rather than SQLite; see
+choose_engine. For dashboards that saves reading the rollups' per-piece,
+per-item rows, which with a large catalogue is most of a long range's cost.
+
+The mirror is kept current from the change sequence (app.changes): its
+manifest.json records the seq everything up to which it holds, and a
+refresh appends the entries stamped after that as a new part, one indexed
+range read. Entries are never edited, and archiving (app.archive) only
+moves them, so appending is all a refresh does; it also reads the archived
+months holding seqs past its mark, so a mirror built after archiving is
+whole too. Reports refresh before they scan, so they see every committed
+write; the first refresh of a large site reads all of it, so build mirrors
+ahead of use:
+
+    cd backend && python -m app.analytics
+
+Once WASTE_ANALYTICS_COMPACT_PARTS small parts have piled up they are merged
+into one. Writers take a lock file (flock), so several workers can share a
+mirror; readers only read the manifest, and parts a merge replaced are
+deleted at the next merge rather than under a running scan.
+"""
+from __future__ import annotations
+
+import itertools
+import json
+import os
+import threading
+from contextlib import contextmanager
+from datetime import date
+from pathlib import Path
+from typing import Iterator
+
+from pydantic_settings import BaseSettings, SettingsConfigDict
+from sqlalchemy import Integer, select, type_coerce
+from sqlalchemy.orm import Session
+
+from . import models
+from .archive import archives
+from .versions import database_of
+
+try:
+    import fcntl
+except ImportError:  # no cross-process lock; one process per mirror
+    fcntl = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.acero as acero
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+
+class AnalyticsSettings(BaseSettings):
+    """Columnar mirror options, overridable with WASTE_ANALYTICS_* environment variables."""
+
+    model_config = SettingsConfigDict(env_prefix="WASTE_ANALYTICS_")
+
+    enabled: bool = False
+    dir: Path | None = None  # default: a <database>.analytics directory next to each file
+    min_days: int = 92  # reports on engine=auto spanning this many days or more use the mirror
+    batch_rows: int = 1_000_000  # most rows per part written by a refresh; bounds its memory
+    row_group_rows: int = 128 * 1024
+    compact_parts: int = 8  # merge trailing small parts once there are this many
+
+
+def _day_iso(day: int) -> str:
+    return f"{day // 10000:04d}-{day // 100 % 100:02d}-{day % 100:02d}"
+
+
+def _day_key(iso: str) -> int:
+    return int(iso[0:4] + iso[5:7] + iso[8:10])
+
+
+class Mirror:
+    def __init__(self, settings: AnalyticsSettings | None = None):
+        self.settings = settings or AnalyticsSettings()
+        self._lock = threading.Lock()
+        self.refreshes = 0
+        self.rows_copied = 0
+
+    def usable(self) -> bool:
+        return self.settings.enabled and pa is not None
+
+    def site_dir(self, database: str | None, site_id: int) -> Path:
+        if not database or database == ":memory:":
+            raise ValueError("The analytics mirror needs a database file")
+        if self.settings.dir is None:
+            return Path(f"{database}.analytics") / f"site-{site_id}"
+        return self.settings.dir / f"{Path(database).name}-site-{site_id}"
+
+    # ---- Manifest ----
+
+    def _manifest(self, path: Path) -> dict:
+        try:
+            return json.loads((path / "manifest.json").read_text())
+        except FileNotFoundError:
+            return {"seq": 0, "parts": [], "retired": []}
+
+    def _install(self, path: Path, manifest: dict) -> None:
+        tmp = path / f"manifest.json.{os.getpid()}.{threading.get_ident()}"
+        tmp.write_text(json.dumps(manifest))
+        os.replace(tmp, path / "manifest.json")
+
+    @contextmanager
+    def _writing(self, path: Path) -> Iterator[dict]:
+        """The current manifest, with this thread and process the only writer until the block ends."""
+        path.mkdir(parents=True, exist_ok=True)
+        with self._lock, open(path / ".lock", "w") as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)  # released when the file closes
+            yield self._manifest(path)
+
+    # ---- Refresh ----
+
+    def _write_part(self, path: Path, first: int, last: int, table) -> dict:
+        table = table.take(pc.sort_indices(table, [("entry_date", "ascending")]))
+        name = f"part-{first:012d}-{last:012d}.parquet"
+        pq.write_table(table, path / f"{name}.tmp", row_group_size=self.settings.row_group_rows)
+        os.replace(path / f"{name}.tmp", path / name)
+        return {"file": name, "rows": table.num_rows}
+
+    def refresh(self, db: Session, site_id: int) -> int:
+        """Append the site's entries stamped since the last refresh. Returns how many were copied."""
+        path = self.site_dir(database_of(db), site_id)
+        w = models.WasteEntry
+        with self._writing(path) as manifest:
+            months = archives.months(db, site_id)
+            # Everything stamped up to the counter is committed (see app.changes), so it is a safe new mark.
+            head = db.execute(select(models.ChangeSequence.seq).where(models.ChangeSequence.id == 1)).scalar() or 0
+            if head < manifest["seq"]:
+                # Behind the mirror: the database was replaced (restored, regenerated). Start over.
+                for name in [p["file"] for p in manifest["parts"]] + manifest.get("retired", []):
+                    (path / name).unlink(missing_ok=True)
+                manifest = {"seq": 0, "parts": [], "retired": []}
+            elif head == manifest["seq"]:
+                return 0
+            stmt = (
+                select(type_coerce(w.entry_date, Integer), w.item_id, w.quantity, w.seq)
+                .where(w.site_id == site_id, w.seq > manifest["seq"], w.seq <= head)
+                .order_by(w.seq)
+                .execution_options(yield_per=self.settings.batch_rows)
+            )
+            batches = itertools.chain(
+                db.execute(stmt).partitions(),
+                *(
+                    archives.stamped(m, manifest["seq"], head, self.settings.batch_rows)
+                    for m in months
+                    if m.max_seq > manifest["seq"]
+                ),
+            )
+            copied = 0
+            for rows in batches:
+                days, items, quantities, seqs = zip(*rows)
+                table = pa.table(
+                    {
+                        "entry_date": pa.array(days, pa.int32()),
+                        "item_id": pa.array(items, pa.int32()),
+                        "quantity": pa.array(quantities, pa.float64()),
+                    }
+                )
+                manifest["parts"].append(self._write_part(path, seqs[0], seqs[-1], table))
+                copied += len(rows)
+            manifest["seq"] = head
+            self._install(path, manifest)
+            if self._compactable(manifest):
+                self._compact(path, manifest)
+        self.refreshes += 1
+        self.rows_copied += copied
+        return copied
+
+    def _compactable(self, manifest: dict) -> list[dict]:
+        """The trailing parts that fit in one batch together, if there are enough of them to merge."""
+        tail, rows = [], 0
+        for part in reversed(manifest["parts"]):
+            if rows + part["rows"] > self.settings.batch_rows:
+                break
+            tail.insert(0, part)
+            rows += part["rows"]
+        return tail if len(tail) >= self.settings.compact_parts else []
+
+    def _compact(self, path: Path, manifest: dict) -> None:
+        tail = self._compactable(manifest)
+        table = pa.concat_tables(pq.read_table(path / p["file"]) for p in tail)
+        first, last = tail[0]["file"].split("-")[1], tail[-1]["file"].split("-")[2].split(".")[0]
+        merged = self._write_part(path, int(first), int(last), table)
+        for name in manifest.get("retired", []):
+            (path / name).unlink(missing_ok=True)
+        manifest["parts"] = manifest["parts"][: -len(tail)] + [merged]
+        manifest["retired"] = [p["file"] for p in tail]
+        self._install(path, manifest)
+
+    # ---- Reads ----
+
+    def scan(
+        self,
+        database: str | None,
+        site_id: int,
+        start: str,
+        end: str,
+        item_id: int | None = None,
+        by_item: bool = False,
+    ) -> list[tuple]:
+        """(key, total, count, min, max) per entry_date (ISO) or per item_id over [start, end], as of the last refresh.
+
+        Only reads files, so it can run in a worker thread.
+        """
+        path = self.site_dir(database, site_id)
+        files = [str(path / p["file"]) for p in self._manifest(path)["parts"]]
+        if not files:
+            return []
+        expr = (pc.field("entry_date") >= _day_key(start)) & (pc.field("entry_date") <= _day_key(end))
+        if item_id:
+            expr &= pc.field("item_id") == item_id
+        key = "item_id" if by_item else "entry_date"
+        columns = sorted({"entry_date", key, "quantity"} | ({"item_id"} if item_id else set()))
+        dataset = ds.dataset(files, format="parquet")
+        plan = acero.Declaration.from_sequence(
+            [
+                # The scan's filter only prunes row groups by their statistics; the filter node applies it.
+                acero.Declaration("scan", acero.ScanNodeOptions(dataset, columns=columns, filter=expr)),
+                acero.Declaration("filter", acero.FilterNodeOptions(expr)),
+                acero.Declaration(
+                    "aggregate",
+                    acero.AggregateNodeOptions(
+                        [("quantity", f"hash_{fn}", None, fn) for fn in ("sum", "count", "min", "max")], keys=[key]
+                    ),
+                ),
+            ]
+        )
+        table = plan.to_table()
+        keys = table.column(key).to_pylist()
+        if not by_item:
+            keys = [_day_iso(k) for k in keys]
+        return list(zip(keys, *(table.column(fn).to_pylist() for fn in ("sum", "count", "min", "max"))))
+
+    def aggregate(
+        self, db: Session, site_id: int, start: str, end: str, item_id: int | None = None, by_item: bool = False
+    ) -> list[tuple]:
+        """scan after a refresh, so every write committed so far is counted."""
+        self.refresh(db, site_id)
+        return self.scan(database_of(db), site_id, start, end, item_id, by_item)
+
+
+mirror = Mirror()
+
+ENGINES = ("auto", "sqlite", "columnar")
+
+
+def choose_engine(start: date, end: date, engine: str = "auto") -> str:
+    """The engine a read over [start, end] runs on. Raises ValueError if the one asked for is unavailable."""
+    if engine == "columnar" and not mirror.usable():
+        raise ValueError("The columnar engine needs WASTE_ANALYTICS_ENABLED=1 and pyarrow installed")
+    if engine != "auto":
+        return engine
+    return "columnar" if mirror.usable() and (end - start).days + 1 >= mirror.settings.min_days else "sqlite"
+
+
+if __name__ == "__main__":
+    from .migrate import ensure_schema
+    from .sites import router
+
+    if pa is None:
+        raise SystemExit("The analytics mirror needs pyarrow installed")
+    ensure_schema()
+    for site_id in router.sites():
+        with router.session(site_id, readonly=True) as db:
+            n = mirror.refresh(db, site_id)
+        print(f"Site {site_id}: copied {n} entries into {mirror.site_dir(database_of(db), site_id)}")
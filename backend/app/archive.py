@@ -0,0 +1,413 @@
+"""Cold storage for old waste entries: one SQLite file per site and month.
+
+    cd backend && python -m app.archive
+    cd backend && python -m app.archive --horizon-days 730 --vacuum
+
+Plans and counts read the rollups, and dashboards read them wherever a
+month is archived, so raw entries are only read by listings, exports,
+reports and dashboards of recent months. This job moves the entries of every month
+that ended more than WASTE_ARCHIVE_HORIZON_DAYS ago out of waste_entries into
+a file of its own next to the database (<file>.archive/site-<id>/, or under
+WASTE_ARCHIVE_DIR). The rollups keep their daily and period totals, so the
+main file keeps recent raw rows plus the daily per-item totals of all time,
+and its waste_entries indexes stop growing with history.
+
+A month file holds the entries as they were (ids, seqs and all), clustered
+on (entry_date, id) with no other index but (item_id, entry_date). The
+waste_archives table in the main file says which months are archived and in
+which file. Readers go through months() and then read both tiers: what
+crud.list_waste, the export, report's sqlite engine and the columnar mirror
+see is the same as if nothing had moved.
+
+Moving a month is one write: the month's rows, as of the change counter, are
+copied into a new file first; then one transaction deletes exactly those
+rows and points the registry at the file. months() starts a read
+transaction, so a reader sees either both tiers before the move or both
+after it. Entries written into an archived month later (backfills) stay in
+waste_entries, where readers find them too, until the next run folds them
+into a new version of the file. Files the registry no longer names are
+deleted at the start of the next run rather than under a running read.
+
+Archived entries leave the GET /sync feed (it reads waste_entries), and
+their client ids no longer deduplicate uploads: both only matter for
+recent data.
+"""
+from __future__ import annotations
+
+import argparse
+import calendar
+import heapq
+import itertools
+import os
+import sqlite3
+import threading
+from contextlib import closing, contextmanager
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+from typing import Iterator, NamedTuple
+
+from pydantic_settings import BaseSettings, SettingsConfigDict
+from sqlalchemy import Integer, delete, select, type_coerce
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from . import models
+from .versions import database_of
+
+try:
+    import fcntl
+except ImportError:  # no cross-process lock; run one job at a time
+    fcntl = None
+
+
+class Entry(NamedTuple):
+    """An archived waste entry: the WasteEntry columns a month file keeps, read-only."""
+
+    id: int
+    entry_date: str  # YYYYMMDD on disk
+    weekday: int
+    item_id: int
+    quantity: float
+    note: str | None
+    seq: int | None
+    client_id: str | None
+
+
+COLUMNS = Entry._fields
+
+_SCHEMA = (
+    """
+    CREATE TABLE waste_entries (
+        id INTEGER NOT NULL,
+        entry_date INTEGER NOT NULL,
+        weekday INTEGER NOT NULL,
+        item_id INTEGER NOT NULL,
+        quantity FLOAT NOT NULL,
+        note TEXT,
+        seq INTEGER,
+        client_id VARCHAR(64),
+        PRIMARY KEY (entry_date, id)
+    ) WITHOUT ROWID
+    """,
+    "CREATE INDEX ix_archive_item_date ON waste_entries (item_id, entry_date)",
+)
+
+_DAY = models.DayKey()
+
+
+class ArchiveSettings(BaseSettings):
+    """Cold storage options, overridable with WASTE_ARCHIVE_* environment variables."""
+
+    model_config = SettingsConfigDict(env_prefix="WASTE_ARCHIVE_")
+
+    dir: Path | None = None  # default: a <database>.archive directory next to each file
+    horizon_days: int = 365  # months that ended more than this many days ago are moved out
+    batch_rows: int = 50_000  # rows copied per fetch while writing a month file
+
+
+@dataclass(frozen=True)
+class Month:
+    """An archived month of one site: its days (ISO), its file, and the highest seq in it."""
+
+    first: str
+    last: str
+    path: Path
+    max_seq: int
+
+
+def _month_bounds(first: str) -> tuple[str, str]:
+    return first, f"{first[:8]}{calendar.monthrange(int(first[:4]), int(first[5:7]))[1]:02d}"
+
+
+def segments(start: str | None, end: str | None, months: list[Month]) -> list[tuple[str | None, str | None, Month | None]]:
+    """[start, end] cut at archived months, oldest first: (start, end, month), month None where only waste_entries holds rows.
+
+    months are the ones overlapping [start, end], oldest first (as months() returns them).
+    """
+    out, lo = [], start
+    for m in months:
+        if lo is None or lo < m.first:
+            out.append((lo, (date.fromisoformat(m.first) - timedelta(days=1)).isoformat(), None))
+        out.append((max(lo, m.first) if lo else m.first, min(end, m.last) if end else m.last, m))
+        lo = (date.fromisoformat(m.last) + timedelta(days=1)).isoformat()
+    if end is None or lo is None or lo <= end:
+        out.append((lo, end, None))
+    return out
+
+
+def _connect(path: Path) -> sqlite3.Connection:
+    # A month file is never written once it is named in the registry, so it can be read without locking.
+    return sqlite3.connect(f"{path.resolve().as_uri()}?mode=ro&immutable=1", uri=True, check_same_thread=False)
+
+
+def _filters(start: str | None, end: str | None, item_id: int | None) -> tuple[list[str], list]:
+    where, params = [], []
+    if start:
+        where.append("entry_date >= ?")
+        params.append(_DAY.process_bind_param(start, None))
+    if end:
+        where.append("entry_date <= ?")
+        params.append(_DAY.process_bind_param(end, None))
+    if item_id:
+        where.append("item_id = ?")
+        params.append(item_id)
+    return where, params
+
+
+def _sql(select_list: str, where: list[str], tail: str = "") -> str:
+    return f"SELECT {select_list} FROM waste_entries" + (f" WHERE {' AND '.join(where)}" if where else "") + tail
+
+
+class Archive:
+    def __init__(self, settings: ArchiveSettings | None = None):
+        self.settings = settings or ArchiveSettings()
+        self._lock = threading.Lock()
+
+    def site_dir(self, database: str | None, site_id: int) -> Path:
+        if not database or database == ":memory:":
+            raise ValueError("Archiving needs a database file")
+        if self.settings.dir is None:
+            return Path(f"{database}.archive") / f"site-{site_id}"
+        return self.settings.dir / f"{Path(database).name}-site-{site_id}"
+
+    # ---- Registry ----
+
+    def _months_stmt(self, site_id: int, start: str | None, end: str | None):
+        a = models.WasteArchive
+        stmt = select(a.month, a.file, a.max_seq).where(a.site_id == site_id).order_by(a.month)
+        if start:
+            stmt = stmt.where(a.month >= date.fromisoformat(start).replace(day=1).isoformat())
+        if end:
+            stmt = stmt.where(a.month <= end)
+        return stmt
+
+    def _months(self, database: str | None, site_id: int, rows) -> list[Month]:
+        path = self.site_dir(database, site_id)
+        return [Month(*_month_bounds(month), path / file, max_seq) for month, file, max_seq in rows]
+
+    def months(self, db: Session, site_id: int, start: str | None = None, end: str | None = None) -> list[Month]:
+        """The site's archived months overlapping [start, end], oldest first.
+
+        Starts a read transaction on db first (if it is not in one), so what
+        the caller then reads from waste_entries is from the same snapshot.
+        """
+        conn = db.connection()
+        if not conn.connection.driver_connection.in_transaction:
+            conn.exec_driver_sql("BEGIN")
+        # On the connection rather than the session: this runs before every listing, archives or not.
+        rows = conn.execute(self._months_stmt(site_id, start, end)).all()
+        return self._months(conn.engine.url.database, site_id, rows) if rows else []
+
+    async def months_async(
+        self, db: AsyncSession, site_id: int, start: str | None = None, end: str | None = None
+    ) -> list[Month]:
+        """months for an AsyncSession."""
+        conn = await db.connection()
+        if not (await conn.get_raw_connection()).driver_connection.in_transaction:
+            await conn.exec_driver_sql("BEGIN")
+        rows = (await conn.execute(self._months_stmt(site_id, start, end))).all()
+        return self._months(conn.engine.url.database, site_id, rows) if rows else []
+
+    # ---- Reads ----
+
+    def entries(
+        self,
+        month: Month,
+        start: str | None = None,
+        end: str | None = None,
+        item_id: int | None = None,
+        before: tuple[str, int] | None = None,
+        limit: int | None = None,
+        newest_first: bool = False,
+    ) -> Iterator[Entry]:
+        """A month's entries in [start, end], in (entry_date, id) order.
+
+        before=(entry_date, id) keeps only rows ahead of that one newest first
+        (a GET /waste cursor). Only reads the file, so it can run in a worker thread.
+        """
+        where, params = _filters(start, end, item_id)
+        if before is not None:
+            day = _DAY.process_bind_param(before[0], None)
+            where.append("entry_date <= ? AND (entry_date < ? OR id < ?)")
+            params += [day, day, before[1]]
+        order = " ORDER BY entry_date DESC, id DESC" if newest_first else " ORDER BY entry_date, id"
+        sql = _sql(", ".join(COLUMNS), where, order + (f" LIMIT {int(limit)}" if limit is not None else ""))
+        with closing(_connect(month.path)) as conn:
+            cur = conn.execute(sql, params)
+            while rows := cur.fetchmany(self.settings.batch_rows):
+                for row in rows:
+                    yield Entry(row[0], _DAY.process_result_value(row[1], None), *row[2:])
+
+    def parts(
+        self, month: Month, start: str, end: str, item_id: int | None = None, by_item: bool = False
+    ) -> list[tuple]:
+        """(entry_date ISO or item_id, total, count, min, max) over the month's entries in [start, end]."""
+        where, params = _filters(start, end, item_id)
+        key = "item_id" if by_item else "entry_date"
+        sql = _sql(f"{key}, SUM(quantity), COUNT(*), MIN(quantity), MAX(quantity)", where, f" GROUP BY {key}")
+        with closing(_connect(month.path)) as conn:
+            rows = conn.execute(sql, params).fetchall()
+        if by_item:
+            return rows
+        return [(_DAY.process_result_value(k, None), *rest) for k, *rest in rows]
+
+    def daily(self, month: Month) -> list[tuple]:
+        """(entry_date ISO, item_id, weekday, total, count) per day and item, as daily_item_totals holds them."""
+        sql = "SELECT entry_date, item_id, MIN(weekday), SUM(quantity), COUNT(*) FROM waste_entries GROUP BY 1, 2"
+        with closing(_connect(month.path)) as conn:
+            rows = conn.execute(sql).fetchall()
+        return [(_DAY.process_result_value(d, None), *rest) for d, *rest in rows]
+
+    def stamped(self, month: Month, after: int, upto: int, batch_rows: int) -> Iterator[list[tuple]]:
+        """(entry_date YYYYMMDD, item_id, quantity, seq) for the month's entries with after < seq <= upto, in batches."""
+        with closing(_connect(month.path)) as conn:
+            cur = conn.execute(
+                "SELECT entry_date, item_id, quantity, seq FROM waste_entries WHERE seq > ? AND seq <= ? ORDER BY seq",
+                (after, upto),
+            )
+            while rows := cur.fetchmany(batch_rows):
+                yield rows
+
+    # ---- Moving months out ----
+
+    @contextmanager
+    def _writing(self, path: Path) -> Iterator[None]:
+        path.mkdir(parents=True, exist_ok=True)
+        with self._lock, open(path / ".lock", "w") as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)  # released when the file closes
+            yield
+
+    def cutoff(self, today: date | None = None) -> date:
+        """First day of the oldest month that stays in waste_entries."""
+        return ((today or date.today()) - timedelta(days=self.settings.horizon_days)).replace(day=1)
+
+    def _sweep(self, db: Session, path: Path, site_id: int) -> None:
+        a = models.WasteArchive
+        named = set(db.execute(select(a.file).where(a.site_id == site_id)).scalars())
+        db.rollback()
+        for f in path.iterdir():
+            if f.name != ".lock" and f.name not in named:
+                f.unlink(missing_ok=True)
+
+    def _write_month(self, db: Session, site_id: int, key: int, old: Month | None, head: int, path: Path) -> tuple[str, int, int]:
+        """Copy the month's rows stamped up to head (and an older version's) into a new file. Returns (file, rows, max seq)."""
+        w = models.WasteEntry
+        name = f"{key // 100:04d}-{key % 100:02d}-{head:012d}.sqlite"
+        tmp = path / f"{name}.tmp"
+        tmp.unlink(missing_ok=True)
+        stmt = (
+            select(
+                w.id, type_coerce(w.entry_date, Integer), w.weekday, w.item_id, w.quantity, w.note, w.seq, w.client_id
+            )
+            .where(w.site_id == site_id, w.entry_date >= key * 100 + 1, w.entry_date <= key * 100 + 31, w.seq <= head)
+            .order_by(w.entry_date, w.id)
+            .execution_options(yield_per=self.settings.batch_rows)
+        )
+        insert_sql = f"INSERT INTO waste_entries ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})"
+        copied, max_seq = 0, old.max_seq if old is not None else 0
+        with closing(sqlite3.connect(tmp)) as out:
+            out.execute("PRAGMA journal_mode = OFF")  # a temp file until it is renamed
+            for sql in _SCHEMA:
+                out.execute(sql)
+            if old is not None:
+                out.execute("ATTACH DATABASE ? AS old", (str(old.path),))
+                out.execute("INSERT INTO waste_entries SELECT * FROM old.waste_entries")
+                out.commit()
+                out.execute("DETACH DATABASE old")
+            for rows in db.execute(stmt).partitions():
+                out.executemany(insert_sql, rows)
+                copied += len(rows)
+                max_seq = max(max_seq, max(r[6] for r in rows))
+            out.commit()
+        os.replace(tmp, path / name)
+        return name, copied, max_seq
+
+    def archive_site(self, db: Session, site_id: int, today: date | None = None) -> list[tuple[str, int]]:
+        """Move the site's entries in months before cutoff(today) to month files. Returns (month, entries moved) per month."""
+        w, a = models.WasteEntry, models.WasteArchive
+        cutoff = self.cutoff(today)
+        path = self.site_dir(database_of(db), site_id)
+        moved = []
+        with self._writing(path):
+            self._sweep(db, path, site_id)
+            month_key = type_coerce(w.entry_date, Integer) // 100
+            keys = db.execute(
+                select(month_key).where(w.site_id == site_id, w.entry_date < cutoff.isoformat()).distinct()
+            ).scalars().all()
+            db.rollback()
+            for key in sorted(keys):
+                first = f"{key // 100:04d}-{key % 100:02d}-01"
+                old = self.months(db, site_id, first, first)
+                head = db.execute(select(models.ChangeSequence.seq).where(models.ChangeSequence.id == 1)).scalar() or 0
+                name, copied, max_seq = self._write_month(db, site_id, key, old[0] if old else None, head, path)
+                db.rollback()  # end the read snapshot; the move is its own write
+                if not copied:
+                    (path / name).unlink(missing_ok=True)  # rows without a seq yet: next run
+                    continue
+
+                deleted = db.execute(
+                    delete(w).where(
+                        w.site_id == site_id, w.entry_date >= key * 100 + 1, w.entry_date <= key * 100 + 31, w.seq <= head
+                    )
+                ).rowcount
+                if deleted != copied:
+                    db.rollback()
+                    raise RuntimeError(f"Archiving {first} for site {site_id}: copied {copied} entries, {deleted} to delete")
+                entries = copied + (db.execute(select(a.entries).where(a.site_id == site_id, a.month == first)).scalar() or 0)
+                stmt = sqlite_insert(a).values(
+                    site_id=site_id,
+                    month=first,
+                    file=name,
+                    entries=entries,
+                    max_seq=max_seq,
+                    archived_at=datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                )
+                db.execute(
+                    stmt.on_conflict_do_update(
+                        index_elements=[a.site_id, a.month],
+                        set_={k: stmt.excluded[k] for k in ("file", "entries", "max_seq", "archived_at")},
+                    )
+                )
+                db.commit()
+                moved.append((first[:7], copied))
+        return moved
+
+
+archives = Archive()
+
+
+def merged(newer: list, older: Iterator, key, n: int | None = None, newest_first: bool = False) -> list:
+    """Two runs sorted by key, merged; the first n only when n is given."""
+    out = heapq.merge(newer, older, key=key, reverse=newest_first)
+    return list(itertools.islice(out, n))
+
+
+def main() -> None:
+    from . import db as storage
+    from .migrate import ensure_schema
+    from .sites import router
+
+    parser = argparse.ArgumentParser(description="Move old waste entries to per-month archive files")
+    parser.add_argument("--horizon-days", type=int, default=archives.settings.horizon_days)
+    parser.add_argument("--vacuum", action="store_true", help="then VACUUM each file to hand the space back")
+    args = parser.parse_args()
+
+    archives.settings = archives.settings.model_copy(update={"horizon_days": args.horizon_days})
+    ensure_schema()
+    for site_id in router.sites():
+        with router.session(site_id) as db:
+            moved = archives.archive_site(db, site_id)
+        print(f"Site {site_id}: archived {sum(n for _, n in moved)} entries in {len(moved)} months before {archives.cutoff()}")
+    if args.vacuum:
+        engines = {router.engine(site_id) for site_id in router.sites()} | {storage.engine}
+        for engine in engines:
+            with engine.connect() as conn:
+                conn.exec_driver_sql("VACUUM")
+            print(f"Vacuumed {engine.url.database}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import date
+from typing import Any, Awaitable, Callable, Hashable
+
+DEFAULT_MAXSIZE = 256
+
+
+@dataclass
+class _Entry:
+    value: Any
+    start: date
+    end: date  # inclusive
+    site: int | None  # None: computed from every site
+    version: Hashable  # the data versions it was computed at
+
+
+class ResultCache:
+    """In-process LRU of computed endpoint results.
+
+    Each entry records the date span and site its result was computed from, so
+    a waste write only drops the entries whose span covers the written date at
+    that site (or at every site, for cross-site results). A
+    generation counter stops a result computed before an invalidation from
+    being stored after it.
+
+    Invalidation only reaches this process, so each entry also carries the
+    data version tokens (app.versions) read before it was computed, and a
+    lookup at other tokens is a miss: a write committed by another worker
+    retires the entries here as soon as it bumps the shared version.
+    """
+
+    def __init__(self, maxsize: int = DEFAULT_MAXSIZE):
+        self.maxsize = maxsize
+        self._entries: OrderedDict[Hashable, _Entry] = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get_or_compute(
+        self,
+        key: Hashable,
+        start: date,
+        end: date,
+        compute: Callable[[], Any],
+        site: int | None = None,
+        version: Hashable = None,
+    ) -> Any:
+        hit, value, generation = self._lookup(key, version)
+        if hit:
+            return value
+        value = compute()
+        self._store(key, generation, value, start, end, site, version)
+        return value
+
+    async def get_or_compute_async(
+        self,
+        key: Hashable,
+        start: date,
+        end: date,
+        compute: Callable[[], Awaitable[Any]],
+        site: int | None = None,
+        version: Hashable = None,
+    ) -> Any:
+        hit, value, generation = self._lookup(key, version)
+        if hit:
+            return value
+        value = await compute()
+        self._store(key, generation, value, start, end, site, version)
+        return value
+
+    def _lookup(self, key: Hashable, version: Hashable) -> tuple[bool, Any, int]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.version == version:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return True, entry.value, self._generation
+            if entry is not None:
+                del self._entries[key]  # written elsewhere since
+                self.invalidations += 1
+            self.misses += 1
+            return False, None, self._generation
+
+    def _store(
+        self, key: Hashable, generation: int, value: Any, start: date, end: date, site: int | None, version: Hashable
+    ) -> None:
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._entries[key] = _Entry(value, start, end, site, version)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate_date(self, d: date, site: int | None = None) -> None:
+        """Drop every entry whose span covers d, for one site or (site=None) all of them."""
+        self._drop(lambda key, e: e.start <= d <= e.end and _same_site(e, site))
+
+    def invalidate_endpoint(self, *endpoints: str, site: int | None = None) -> None:
+        """Drop every entry for the given endpoints (keys are tuples led by the endpoint name)."""
+        self._drop(lambda key, e: key[0] in endpoints and _same_site(e, site))
+
+    def invalidate_site(self, site: int) -> None:
+        """Drop everything computed from one site."""
+        self._drop(lambda key, e: _same_site(e, site))
+
+    def clear(self) -> None:
+        self._drop(lambda key, e: True)
+
+    def _drop(self, match: Callable[[Hashable, _Entry], bool]) -> None:
+        with self._lock:
+            self._generation += 1
+            stale = [k for k, e in self._entries.items() if match(k, e)]
+            for k in stale:
+                del self._entries[k]
+            self.invalidations += len(stale)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits / lookups) if lookups else None,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+def _same_site(entry: _Entry, site: int | None) -> bool:
+    return site is None or entry.site is None or entry.site == site
+
+
+results = ResultCache()
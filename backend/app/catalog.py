@@ -0,0 +1,113 @@
+"""In-memory item catalogue: each site's items by id and by name, loaded once.
+
+Item writes (crud.create_item / update_item) bump the site's items version
+(app.versions), and the next lookup reloads. Everything else that needs an
+item's name, unit or active flag reads the catalogue instead of the items
+table.
+
+Snapshots are keyed by database file and site, so shards, bench temp files
+and the main file never share one. With shared versions (the default) a
+worker process sees another worker's item writes on its next lookup.
+"""
+from __future__ import annotations
+
+import threading
+from dataclasses import dataclass
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from . import models, versions
+from .versions import Versions, database_of
+
+
+@dataclass(frozen=True)
+class CatalogItem:
+    id: int
+    site_id: int
+    name: str
+    unit: str
+    is_active: bool
+    forecast_model: str | None
+
+
+@dataclass(frozen=True)
+class SiteItems:
+    """One site's items at one version; never mutated, so safe to read from any thread."""
+
+    version: str  # the items version it was loaded at
+    by_id: dict[int, CatalogItem]
+    by_name: dict[str, CatalogItem]
+    ordered: tuple[CatalogItem, ...]  # by name, as GET /items lists them
+
+    def get(self, item_id: int) -> CatalogItem | None:
+        return self.by_id.get(item_id)
+
+    def named(self, name: str) -> CatalogItem | None:
+        return self.by_name.get(name.strip())
+
+    def listed(self, include_inactive: bool = True) -> list[CatalogItem]:
+        return list(self.ordered) if include_inactive else [i for i in self.ordered if i.is_active]
+
+
+def _items_stmt(site_id: int):
+    i = models.Item
+    return (
+        select(i.id, i.site_id, i.name, i.unit, i.is_active, i.forecast_model)
+        .where(i.site_id == site_id)
+        .order_by(i.name.asc())
+    )
+
+
+def _snapshot(version: str, rows) -> SiteItems:
+    items = tuple(CatalogItem(*row) for row in rows)
+    return SiteItems(version, {i.id: i for i in items}, {i.name: i for i in items}, items)
+
+
+Key = tuple[str | None, int]  # (database file, site id)
+
+
+class ItemCatalog:
+    def __init__(self, item_versions: Versions = versions.items):
+        self.versions = item_versions
+        self._snapshots: dict[Key, SiteItems] = {}
+        self._lock = threading.Lock()
+        self.loads = 0
+
+    def _lookup(self, db: Session | AsyncSession, site_id: int) -> tuple[Key, str, SiteItems | None]:
+        key = (database_of(db), site_id)
+        version = self.versions.current(*key)
+        snap = self._snapshots.get(key)
+        return key, version, snap if snap is not None and snap.version == version else None
+
+    def _store(self, key: Key, version: str, rows) -> SiteItems:
+        snap = _snapshot(version, rows)
+        with self._lock:
+            self.loads += 1
+            # A bump while loading means these rows may predate it; serve them, but don't keep them.
+            if self.versions.current(*key) == version:
+                self._snapshots[key] = snap
+        return snap
+
+    def items(self, db: Session, site_id: int = models.DEFAULT_SITE_ID) -> SiteItems:
+        key, version, snap = self._lookup(db, site_id)
+        if snap is None:
+            snap = self._store(key, version, db.execute(_items_stmt(site_id)).all())
+        return snap
+
+    async def items_async(self, db: AsyncSession, site_id: int = models.DEFAULT_SITE_ID) -> SiteItems:
+        key, version, snap = self._lookup(db, site_id)
+        if snap is None:
+            snap = self._store(key, version, (await db.execute(_items_stmt(site_id))).all())
+        return snap
+
+    def bump(self, db: Session | AsyncSession, site_id: int = models.DEFAULT_SITE_ID) -> None:
+        """Call after committing an item write for site_id."""
+        key = (database_of(db), site_id)
+        self.versions.bump(*key)
+        with self._lock:
+            self._snapshots.pop(key, None)
+
+
+catalog = ItemCatalog()
@@ -0,0 +1,136 @@
+"""The change sequence behind GET /sync, the delta feed for offline clients.
+
+Every crud write to items or waste_entries stamps the row's seq with the
+next value of the file's change_sequence counter, taken inside the write's
+own transaction. Taking it is the transaction's first write, so it holds
+SQLite's write lock from then on: seqs are unique across both tables and
+become visible in order, and once a reader sees the counter at n, every row
+stamped n or lower is committed. An item edit takes a new seq, so the item
+shows up again after the client's watermark.
+
+A client keeps the highest seq it has seen and asks for what changed after
+it, so reconnecting costs the changes since, not the history. The feed has
+no deletes: nothing in the app deletes items or entries. Months moved to
+archive files (app.archive) are older than any device's watermark by then,
+so they only drop out of a first sync.
+
+Rows written around crud (seed data, site imports, bench fills) are stamped
+in one pass by stamp() / STAMP_SQL, in id order after everything stamped so
+far; until then they have no seq and the feed does not show them.
+"""
+from __future__ import annotations
+
+from sqlalchemy import select, text
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from . import models
+
+ITEM_COLUMNS = ("id", "name", "unit", "is_active", "forecast_model")
+WASTE_COLUMNS = ("id", "client_id", "entry_date", "item_id", "quantity", "note")
+
+# Plain SQL so migrations and site imports can run it on a raw cursor. Item
+# ids and waste ids are each unique, so base + id and base + max(item id) + id
+# never collide; the counter then moves past both.
+STAMP_SQL = (
+    "INSERT OR IGNORE INTO change_sequence (id, seq) VALUES (1, 0)",
+    "UPDATE items SET seq = (SELECT seq FROM change_sequence) + id WHERE seq IS NULL",
+    """
+    UPDATE waste_entries SET seq = (SELECT seq FROM change_sequence) + (SELECT COALESCE(MAX(id), 0) FROM items) + id
+    WHERE seq IS NULL
+    """,
+    """
+    UPDATE change_sequence
+    SET seq = seq + (SELECT COALESCE(MAX(id), 0) FROM items) + (SELECT COALESCE(MAX(id), 0) FROM waste_entries)
+    """,
+)
+
+
+def _take_stmt(n: int):
+    c = models.ChangeSequence
+    stmt = sqlite_insert(c).values(id=1, seq=n)
+    return stmt.on_conflict_do_update(index_elements=[c.id], set_={"seq": c.seq + stmt.excluded.seq}).returning(c.seq)
+
+
+def take(db: Session, n: int = 1) -> int:
+    """Reserve n consecutive seqs in the caller's transaction. Returns the first; the caller commits."""
+    return int(db.execute(_take_stmt(n)).scalar_one()) - n + 1
+
+
+async def take_async(db: AsyncSession, n: int = 1) -> int:
+    """take for an AsyncSession."""
+    return int((await db.execute(_take_stmt(n))).scalar_one()) - n + 1
+
+
+def stamp(db: Session) -> None:
+    """Give every row written without a seq one, and commit."""
+    for sql in STAMP_SQL:
+        db.execute(text(sql))
+    db.commit()
+
+
+def _head_stmt():
+    return select(models.ChangeSequence.seq).where(models.ChangeSequence.id == 1)
+
+
+def head(db: Session) -> int:
+    """The counter: every row stamped at or below it is committed."""
+    return db.execute(_head_stmt()).scalar() or 0
+
+
+def _changes_stmts(site_id: int, since: int, head: int, limit: int):
+    i, w = models.Item, models.WasteEntry
+    # limit + 1 from each table tells whether anything is left after the batch.
+    items = (
+        select(i.seq, *(getattr(i, c) for c in ITEM_COLUMNS))
+        .where(i.site_id == site_id, i.seq > since, i.seq <= head)
+        .order_by(i.seq)
+        .limit(limit + 1)
+    )
+    waste = (
+        select(w.seq, *(getattr(w, c) for c in WASTE_COLUMNS))
+        .where(w.site_id == site_id, w.seq > since, w.seq <= head)
+        .order_by(w.seq)
+        .limit(limit + 1)
+    )
+    return items, waste
+
+
+def _batch(since: int, head: int, limit: int, items: list, waste: list) -> dict:
+    rows = sorted([(r[0], "items", r[1:]) for r in items] + [(r[0], "waste", r[1:]) for r in waste])
+    more = len(rows) > limit
+    rows = rows[:limit]
+    out = {"items": [], "waste": []}
+    for _, table, values in rows:
+        out[table].append(list(values))
+    return {
+        "since": since,
+        # The whole of (since, head] when nothing is left, else up to the last row sent.
+        "until": rows[-1][0] if more else max(head, since),
+        "more": more,
+        "columns": {"items": list(ITEM_COLUMNS), "waste": list(WASTE_COLUMNS)},
+        **out,
+    }
+
+
+def changes_since(db: Session, site_id: int, since: int, limit: int) -> dict:
+    """Up to `limit` of the site's item and entry writes after seq `since`, oldest first (a SyncOut).
+
+    Rows are arrays in `columns` order. The counter is read first and bounds
+    both reads, so a write committing in between cannot slip a row under
+    the returned `until`; the client passes `until` as `since` next time,
+    straight away while `more` is set.
+    """
+    head = db.execute(_head_stmt()).scalar() or 0
+    items_stmt, waste_stmt = _changes_stmts(site_id, since, head, limit)
+    return _batch(since, head, limit, db.execute(items_stmt).all(), db.execute(waste_stmt).all())
+
+
+async def changes_since_async(db: AsyncSession, site_id: int, since: int, limit: int) -> dict:
+    """changes_since for an AsyncSession."""
+    head = (await db.execute(_head_stmt())).scalar() or 0
+    items_stmt, waste_stmt = _changes_stmts(site_id, since, head, limit)
+    items = (await db.execute(items_stmt)).all()
+    waste = (await db.execute(waste_stmt)).all()
+    return _batch(since, head, limit, items, waste)
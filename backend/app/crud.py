@@ -1,75 +1,437 @@
 from __future__ import annotations
 
+import asyncio
+from datetime import date
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from sqlalchemy import select, func
+from sqlalchemy import select, func, insert, or_
 
-from . import models, schemas
+from . import models, schemas, rollup, cache, changes, snapshots, live, versions, archive
+from .archive import Month, archives, merged, segments
+from .catalog import CatalogItem, catalog
 
 
-def list_items(db: Session, include_inactive: bool = True) -> list[models.Item]:
-    stmt = select(models.Item).order_by(models.Item.name.asc())
-    if not include_inactive:
-        stmt = stmt.where(models.Item.is_active.is_(True))
-    return list(db.execute(stmt).scalars().all())
+def list_items(db: Session, include_inactive: bool = True, site_id: int = models.DEFAULT_SITE_ID) -> list[CatalogItem]:
+    return catalog.items(db, site_id).listed(include_inactive)
 
 
-def create_item(db: Session, data: schemas.ItemCreate) -> models.Item:
-    item = models.Item(name=data.name.strip(), unit=data.unit, is_active=data.is_active)
+def _new_item(data: schemas.ItemCreate, site_id: int) -> models.Item:
+    return models.Item(
+        site_id=site_id,
+        name=data.name.strip(),
+        unit=data.unit,
+        is_active=data.is_active,
+        forecast_model=data.forecast_model,
+    )
+
+
+def create_item(db: Session, data: schemas.ItemCreate, site_id: int = models.DEFAULT_SITE_ID) -> models.Item:
+    item = _new_item(data, site_id)
+    item.seq = changes.take(db)
     db.add(item)
+    snapshots.invalidate(db, site_id)
     db.commit()
     db.refresh(item)
+    # A new item has no waste yet, so only the plans (which list every active item) change.
+    cache.results.invalidate_endpoint("tomorrow-plan", "plan", site=site_id)
+    catalog.bump(db, site_id)
+    snapshots.notify()
     return item
 
 
-def update_item(db: Session, data: schemas.ItemUpdate) -> models.Item:
+def update_item(db: Session, data: schemas.ItemUpdate, site_id: int = models.DEFAULT_SITE_ID) -> models.Item:
     item = db.get(models.Item, data.id)
-    if not item:
+    if not item or item.site_id != site_id:
         raise ValueError("Item not found")
     item.name = data.name.strip()
     item.unit = data.unit
     item.is_active = data.is_active
+    if "forecast_model" in data.model_fields_set:
+        item.forecast_model = data.forecast_model
+    item.seq = changes.take(db)
+    snapshots.invalidate(db, site_id)
     db.commit()
     db.refresh(item)
+    # Names, units and active flags show up in results for any date.
+    cache.results.invalidate_site(site_id)
+    catalog.bump(db, site_id)
+    live.hub.resync(site_id)
+    snapshots.notify()
     return item
 
 
-def create_waste(db: Session, data: schemas.WasteCreate) -> models.WasteEntry:
-    item = db.get(models.Item, data.item_id)
-    if not item:
+def create_waste(db: Session, data: schemas.WasteCreate, site_id: int = models.DEFAULT_SITE_ID) -> models.WasteEntry:
+    item = catalog.items(db, site_id).get(data.item_id)
+    if item is None:
         raise ValueError("Item not found")
     entry = models.WasteEntry(
+        site_id=site_id,
         entry_date=data.entry_date,
         item_id=data.item_id,
         quantity=float(data.quantity),
         note=data.note.strip() if data.note else None,
+        seq=changes.take(db),
     )
     db.add(entry)
+    rollup.apply_delta(db, entry.entry_date, entry.item_id, entry.quantity, site_id=site_id)
+    snapshots.invalidate(db, site_id, entry.entry_date, entry.entry_date)
     db.commit()
     db.refresh(entry)
+    # Cache first, version last: a reader that sees the new version never finds the old body (app.responses).
+    cache.results.invalidate_date(date.fromisoformat(entry.entry_date), site=site_id)
+    versions.waste.bump(versions.database_of(db), site_id)
+    live.hub.publish(site_id, [(entry.entry_date, item.id, item.name, item.unit, entry.quantity)], entry.seq)
+    snapshots.notify()
     return entry
 
 
-def list_waste(
-    db: Session,
-    start_date: str | None,
-    end_date: str | None,
-    item_id: int | None,
-    limit: int,
-    offset: int,
-) -> tuple[list[models.WasteEntry], int]:
-    stmt = select(models.WasteEntry).order_by(models.WasteEntry.entry_date.desc(), models.WasteEntry.id.desc())
-    count_stmt = select(func.count()).select_from(models.WasteEntry)
+def _waste_values(r: schemas.WasteCreate, site_id: int) -> dict:
+    return {
+        "site_id": site_id,
+        "entry_date": r.entry_date,
+        "item_id": r.item_id,
+        "quantity": float(r.quantity),
+        "note": r.note.strip() if r.note else None,
+    }
+
+
+def _insert_waste(db: Session, values: list[dict], site_id: int) -> None:
+    """Insert prepared rows (with their seqs) and fold them into the rollups, in the caller's transaction."""
+    deltas: dict[tuple[str, int], tuple[float, int]] = {}
+    for v in values:
+        total, count = deltas.get((v["entry_date"], v["item_id"]), (0.0, 0))
+        deltas[(v["entry_date"], v["item_id"])] = (total + v["quantity"], count + 1)
+    db.execute(insert(models.WasteEntry), values)
+    rollup.apply_deltas(db, deltas, site_id=site_id)
+    dates = {d for d, _ in deltas}
+    snapshots.invalidate(db, site_id, min(dates), max(dates))
+
+
+def _inserted_waste(db: Session, values: list[dict], known: dict[int, CatalogItem], site_id: int) -> None:
+    """After _insert_waste's commit: caches, then versions, live dashboards and the plan scheduler."""
+    for d in {v["entry_date"] for v in values}:
+        cache.results.invalidate_date(date.fromisoformat(d), site=site_id)
+    versions.waste.bump(versions.database_of(db), site_id)
+    entries = [(v["entry_date"], known[v["item_id"]], v["quantity"]) for v in values]
+    live.hub.publish(
+        site_id, [(d, item.id, item.name, item.unit, qty) for d, item, qty in entries], values[-1]["seq"]
+    )
+    snapshots.notify()
+
+
+def create_waste_bulk(
+    db: Session, rows: list[schemas.WasteCreate], site_id: int = models.DEFAULT_SITE_ID
+) -> tuple[int, list[tuple[int, str]]]:
+    """Insert many entries for one site in one transaction.
+
+    Item ids are checked against the catalogue; rows with an unknown item (or
+    one from another site) are skipped and reported as (index into rows,
+    message) instead of failing the batch. Returns (inserted count, errors).
+    """
+    known = catalog.items(db, site_id).by_id if rows else {}
+    values = []
+    errors: list[tuple[int, str]] = []
+    for idx, r in enumerate(rows):
+        if r.item_id not in known:
+            errors.append((idx, "Item not found"))
+            continue
+        values.append(_waste_values(r, site_id))
+
+    if values:
+        first = changes.take(db, len(values))
+        for n, v in enumerate(values):
+            v["seq"] = first + n
+        _insert_waste(db, values, site_id)
+        db.commit()
+        _inserted_waste(db, values, known, site_id)
+    return len(values), errors
+
+
+def _stored_client_ids(db: Session, site_id: int, client_ids: list[str], chunk: int = 500) -> dict[str, int]:
+    w = models.WasteEntry
+    stored = {}
+    for i in range(0, len(client_ids), chunk):
+        stmt = select(w.client_id, w.id).where(w.site_id == site_id, w.client_id.in_(client_ids[i : i + chunk]))
+        stored.update(db.execute(stmt).tuples().all())
+    return stored
+
+
+def upload_waste(
+    db: Session, rows: list[schemas.WasteUpload], site_id: int = models.DEFAULT_SITE_ID
+) -> list[tuple[str, int | None, str, str | None]]:
+    """Insert entries keyed by client-generated ids, each at most once however often it is sent.
+
+    A client_id the site already has (an earlier upload whose reply was
+    lost, or a repeat within rows) is not inserted again and comes back as
+    "duplicate" with the stored entry's id; a row naming an unknown item is
+    "rejected". Returns (client_id, id, status, detail) per row, in order.
+    """
+    if not rows:
+        return []
+    known = catalog.items(db, site_id).by_id
+    # Taking the seqs first takes the write lock, so no other upload can store these ids between check and insert.
+    first = changes.take(db, len(rows))
+    stored = _stored_client_ids(db, site_id, list({r.client_id for r in rows}))
+    values, statuses = [], []
+    batch: set[str] = set()
+    for r in rows:
+        if r.client_id in stored or r.client_id in batch:
+            statuses.append("duplicate")
+        elif r.item_id not in known:
+            statuses.append("rejected")
+        else:
+            statuses.append("created")
+            batch.add(r.client_id)
+            values.append({**_waste_values(r, site_id), "client_id": r.client_id, "seq": first + len(values)})
 
+    if values:
+        _insert_waste(db, values, site_id)
+        stored.update(_stored_client_ids(db, site_id, [v["client_id"] for v in values]))
+        db.commit()
+        _inserted_waste(db, values, known, site_id)
+    else:
+        db.rollback()
+
+    results = []
+    for r, status in zip(rows, statuses):
+        if status == "rejected":
+            results.append((r.client_id, None, status, "Item not found"))
+        else:
+            results.append((r.client_id, stored[r.client_id], status, None))
+    return results
+
+
+def encode_cursor(entry: models.WasteEntry) -> str:
+    return f"{entry.entry_date}:{entry.id}"
+
+
+def decode_cursor(cursor: str) -> tuple[str, int]:
+    """(entry_date, id) from a GET /waste cursor. Raises ValueError if the date is not a calendar day."""
+    entry_date, _, entry_id = cursor.partition(":")
+    try:
+        date.fromisoformat(entry_date)
+    except ValueError:
+        raise ValueError(f"Invalid cursor date: {entry_date}") from None
+    return entry_date, int(entry_id)
+
+
+def _count_waste_stmt(start_date: str | None, end_date: str | None, item_id: int | None, site_id: int):
+    # entry_count in the rollup is exact, and summing it reads days x items rows instead of every entry.
+    stmt = select(func.coalesce(func.sum(models.DailyItemTotal.entry_count), 0)).where(
+        models.DailyItemTotal.site_id == site_id
+    )
+    if start_date:
+        stmt = stmt.where(models.DailyItemTotal.entry_date >= start_date)
+    if end_date:
+        stmt = stmt.where(models.DailyItemTotal.entry_date <= end_date)
+    if item_id:
+        stmt = stmt.where(models.DailyItemTotal.item_id == item_id)
+    return stmt
+
+
+def filter_waste(
+    stmt, start_date: str | None, end_date: str | None, item_id: int | None, site_id: int = models.DEFAULT_SITE_ID
+):
+    """Apply the GET /waste site, date and item filters to a statement over waste_entries."""
+    stmt = stmt.where(models.WasteEntry.site_id == site_id)
     if start_date:
         stmt = stmt.where(models.WasteEntry.entry_date >= start_date)
-        count_stmt = count_stmt.where(models.WasteEntry.entry_date >= start_date)
     if end_date:
         stmt = stmt.where(models.WasteEntry.entry_date <= end_date)
-        count_stmt = count_stmt.where(models.WasteEntry.entry_date <= end_date)
     if item_id:
         stmt = stmt.where(models.WasteEntry.item_id == item_id)
-        count_stmt = count_stmt.where(models.WasteEntry.item_id == item_id)
+    return stmt
+
+
+def _list_waste_stmt(
+    start_date: str | None,
+    end_date: str | None,
+    item_id: int | None,
+    limit: int,
+    offset: int,
+    cursor: str | None,
+    site_id: int,
+):
+    stmt = select(models.WasteEntry).order_by(models.WasteEntry.entry_date.desc(), models.WasteEntry.id.desc())
+    stmt = filter_waste(stmt, start_date, end_date, item_id, site_id)
+    if cursor:
+        after_date, after_id = decode_cursor(cursor)
+        # The leading <= keeps this an index range; the OR only splits ties on the boundary date.
+        stmt = stmt.where(models.WasteEntry.entry_date <= after_date).where(
+            or_(models.WasteEntry.entry_date < after_date, models.WasteEntry.id < after_id)
+        )
+    elif offset:
+        stmt = stmt.offset(offset)
+    return stmt.limit(limit)
+
+
+def _archived_page(
+    month: Month, start: str | None, end: str | None, item_id: int | None, before, n: int
+) -> list[archive.Entry]:
+    return list(archives.entries(month, start, end, item_id, before, n, newest_first=True))
+
+
+def _newest_first(e: models.WasteEntry | archive.Entry) -> tuple[str, int]:
+    return e.entry_date, e.id
+
+
+def _spans(months: list[Month], start_date: str | None, end_date: str | None, cursor: str | None):
+    """The (start, end, archived month or None) spans a listing walks, newest first, skipping those after the cursor."""
+    after = decode_cursor(cursor)[0] if cursor else None
+    spans = reversed(segments(start_date, end_date, months))
+    return [s for s in spans if after is None or s[0] is None or s[0] <= after]
+
+
+def _with_names(entries, items: dict[int, CatalogItem]) -> list[tuple[models.WasteEntry, str | None, str | None]]:
+    rows = []
+    for entry in entries:
+        item = items.get(entry.item_id)
+        rows.append((entry, item.name, item.unit) if item is not None else (entry, None, None))
+    return rows
+
+
+def list_waste(
+    db: Session,
+    start_date: str | None,
+    end_date: str | None,
+    item_id: int | None,
+    limit: int,
+    offset: int = 0,
+    cursor: str | None = None,
+    with_total: bool = True,
+    site_id: int = models.DEFAULT_SITE_ID,
+):
+    """Entries newest first as (entry, item_name, unit) rows, plus the total (None if not asked for).
+    Names and units come from the item catalogue rather than a join.
+
+    With a cursor (from encode_cursor on the last row of the previous page) the
+    page starts right after that row via the (entry_date, id) index, so deep
+    pages cost the same as the first; offset is kept for older clients.
+
+    A range reaching into archived months (app.archive) is read span by span,
+    newest first, each archived month from its file and waste_entries
+    together, until the page is full; entries from a file are archive.Entry
+    tuples with the same attributes.
+    """
+    # months() opens the read snapshot, so the count and the page see the same writes and archive moves.
+    months = archives.months(db, site_id, start_date, end_date)
+    total = None
+    if with_total:
+        total = int(db.execute(_count_waste_stmt(start_date, end_date, item_id, site_id)).scalar_one())
+    if not months:
+        entries = db.execute(_list_waste_stmt(start_date, end_date, item_id, limit, offset, cursor, site_id)).scalars()
+        return _with_names(entries, catalog.items(db, site_id).by_id), total
+
+    # Reaching into archived months: walk the spans newest first until the page is full.
+    want, page = limit + offset, []
+    before = decode_cursor(cursor) if cursor else None
+    for lo, hi, month in _spans(months, start_date, end_date, cursor):
+        n = want - len(page)
+        rows = db.execute(_list_waste_stmt(lo, hi, item_id, n, 0, cursor, site_id)).scalars().all()
+        if month is not None:
+            cold = _archived_page(month, lo, hi, item_id, before, n)
+            rows = merged(rows, cold, _newest_first, n, newest_first=True)
+        page += rows
+        if len(page) >= want:
+            break
+    return _with_names(page[offset:], catalog.items(db, site_id).by_id), total
+
+
+# ---- Async variants, used by main_async ----
+
+
+async def list_items_async(
+    db: AsyncSession, include_inactive: bool = True, site_id: int = models.DEFAULT_SITE_ID
+) -> list[CatalogItem]:
+    return (await catalog.items_async(db, site_id)).listed(include_inactive)
+
+
+async def create_item_async(db: AsyncSession, data: schemas.ItemCreate, site_id: int = models.DEFAULT_SITE_ID) -> models.Item:
+    item = _new_item(data, site_id)
+    item.seq = await changes.take_async(db)
+    db.add(item)
+    await snapshots.invalidate_async(db, site_id)
+    await db.commit()
+    await db.refresh(item)
+    cache.results.invalidate_endpoint("tomorrow-plan", "plan", site=site_id)
+    catalog.bump(db, site_id)
+    snapshots.notify()
+    return item
+
+
+async def update_item_async(db: AsyncSession, data: schemas.ItemUpdate, site_id: int = models.DEFAULT_SITE_ID) -> models.Item:
+    item = await db.get(models.Item, data.id)
+    if not item or item.site_id != site_id:
+        raise ValueError("Item not found")
+    item.name = data.name.strip()
+    item.unit = data.unit
+    item.is_active = data.is_active
+    if "forecast_model" in data.model_fields_set:
+        item.forecast_model = data.forecast_model
+    item.seq = await changes.take_async(db)
+    await snapshots.invalidate_async(db, site_id)
+    await db.commit()
+    await db.refresh(item)
+    cache.results.invalidate_site(site_id)
+    catalog.bump(db, site_id)
+    live.hub.resync(site_id)
+    snapshots.notify()
+    return item
+
+
+async def create_waste_async(
+    db: AsyncSession, data: schemas.WasteCreate, site_id: int = models.DEFAULT_SITE_ID
+) -> models.WasteEntry:
+    item = (await catalog.items_async(db, site_id)).get(data.item_id)
+    if item is None:
+        raise ValueError("Item not found")
+    entry = models.WasteEntry(
+        site_id=site_id,
+        entry_date=data.entry_date,
+        item_id=data.item_id,
+        quantity=float(data.quantity),
+        note=data.note.strip() if data.note else None,
+        seq=await changes.take_async(db),
+    )
+    db.add(entry)
+    await rollup.apply_delta_async(db, entry.entry_date, entry.item_id, entry.quantity, site_id=site_id)
+    await snapshots.invalidate_async(db, site_id, entry.entry_date, entry.entry_date)
+    await db.commit()
+    cache.results.invalidate_date(date.fromisoformat(entry.entry_date), site=site_id)
+    versions.waste.bump(versions.database_of(db), site_id)
+    live.hub.publish(site_id, [(entry.entry_date, item.id, item.name, item.unit, entry.quantity)], entry.seq)
+    snapshots.notify()
+    return entry
+
+
+async def list_waste_async(
+    db: AsyncSession,
+    start_date: str | None,
+    end_date: str | None,
+    item_id: int | None,
+    limit: int,
+    offset: int = 0,
+    cursor: str | None = None,
+    with_total: bool = True,
+    site_id: int = models.DEFAULT_SITE_ID,
+):
+    months = await archives.months_async(db, site_id, start_date, end_date)
+    total = None
+    if with_total:
+        total = int((await db.execute(_count_waste_stmt(start_date, end_date, item_id, site_id))).scalar_one())
+    if not months:
+        result = await db.execute(_list_waste_stmt(start_date, end_date, item_id, limit, offset, cursor, site_id))
+        return _with_names(result.scalars(), (await catalog.items_async(db, site_id)).by_id), total
 
-    total = int(db.execute(count_stmt).scalar_one())
-    rows = list(db.execute(stmt.limit(limit).offset(offset)).scalars().all())
-    return rows, total
+    want, page = limit + offset, []
+    before = decode_cursor(cursor) if cursor else None
+    for lo, hi, month in _spans(months, start_date, end_date, cursor):
+        n = want - len(page)
+        rows = (await db.execute(_list_waste_stmt(lo, hi, item_id, n, 0, cursor, site_id))).scalars().all()
+        if month is not None:
+            cold = await asyncio.to_thread(_archived_page, month, lo, hi, item_id, before, n)
+            rows = merged(rows, cold, _newest_first, n, newest_first=True)
+        page += rows
+        if len(page) >= want:
+            break
+    return _with_names(page[offset:], (await catalog.items_async(db, site_id)).by_id), total
@@ -1,18 +1,117 @@
 from __future__ import annotations
 
+import threading
 from pathlib import Path
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, DeclarativeBase
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from pydantic_settings import BaseSettings, SettingsConfigDict
 
-DB_PATH = Path(__file__).resolve().parent / "data.sqlite"
+DEFAULT_DB_PATH = Path(__file__).resolve().parent / "data.sqlite"
+
+
+class StorageSettings(BaseSettings):
+    """SQLite storage profile, overridable with WASTE_DB_* environment variables."""
+
+    model_config = SettingsConfigDict(env_prefix="WASTE_DB_")
+
+    path: Path = DEFAULT_DB_PATH
+    journal_mode: str = "wal"  # readers and one writer proceed concurrently
+    synchronous: str = "normal"  # safe under WAL; fsync at checkpoints, not every commit
+    busy_timeout_ms: int = 5000  # wait for a lock instead of raising "database is locked"
+    cache_size_kib: int = 32768
+    mmap_size_bytes: int = 256 * 1024 * 1024
+    pool_size: int = 5
+    max_overflow: int = 10
+    pool_timeout_s: float = 30.0
+    # Set to keep each site in its own file there (see app.sites); `path` then holds only the sites table.
+    shard_dir: Path | None = None
+    # Off when migrations run as a release step; workers then fail fast on an old schema (see app.lifespan).
+    migrate_on_startup: bool = True
+
+
+def _install_pragmas(engine: Engine, settings: StorageSettings, readonly: bool) -> None:
+    @event.listens_for(engine, "connect")
+    def _apply_pragmas(dbapi_conn, _record):
+        cur = dbapi_conn.cursor()
+        cur.execute(f"PRAGMA busy_timeout = {int(settings.busy_timeout_ms)}")
+        if not readonly:
+            # journal_mode is stored in the file; setting it needs a write lock.
+            cur.execute(f"PRAGMA journal_mode = {settings.journal_mode}")
+        cur.execute(f"PRAGMA synchronous = {settings.synchronous}")
+        cur.execute(f"PRAGMA cache_size = -{int(settings.cache_size_kib)}")
+        cur.execute(f"PRAGMA mmap_size = {int(settings.mmap_size_bytes)}")
+        if readonly:
+            cur.execute("PRAGMA query_only = ON")
+        cur.close()
+
+
+def make_engine(settings: StorageSettings, readonly: bool = False) -> Engine:
+    engine = create_engine(
+        f"sqlite:///{settings.path}",
+        connect_args={"check_same_thread": False},
+        pool_size=settings.pool_size,
+        max_overflow=settings.max_overflow,
+        pool_timeout=settings.pool_timeout_s,
+    )
+    _install_pragmas(engine, settings, readonly)
+    return engine
+
+
+def make_async_engine(settings: StorageSettings, readonly: bool = False) -> AsyncEngine:
+    engine = create_async_engine(
+        f"sqlite+aiosqlite:///{settings.path}",
+        poolclass=AsyncAdaptedQueuePool,  # aiosqlite defaults to NullPool
+        pool_size=settings.pool_size,
+        max_overflow=settings.max_overflow,
+        pool_timeout=settings.pool_timeout_s,
+    )
+    _install_pragmas(engine.sync_engine, settings, readonly)
+    return engine
+
+
+settings = StorageSettings()
+DB_PATH = settings.path
 DATABASE_URL = f"sqlite:///{DB_PATH}"
 
-engine = create_engine(
-    DATABASE_URL,
-    connect_args={"check_same_thread": False},
-)
+# The engines and session factories below are built on first use (PEP 562
+# module __getattr__), not at import: a worker that has not served a request
+# yet has opened nothing, and the sync app never builds the async pair.
+# Once built, each is an ordinary module global.
+_LAZY = {
+    "engine": lambda: make_engine(settings),
+    # Analytics reads go through their own pool so they never queue behind
+    # writers for a connection, and cannot write by accident.
+    "read_engine": lambda: make_engine(settings, readonly=True),
+    "SessionLocal": lambda: sessionmaker(autocommit=False, autoflush=False, bind=_get("engine")),
+    "ReadSessionLocal": lambda: sessionmaker(autocommit=False, autoflush=False, bind=_get("read_engine")),
+    # The same pair for the async app (main_async).
+    "async_engine": lambda: make_async_engine(settings),
+    "async_read_engine": lambda: make_async_engine(settings, readonly=True),
+    "AsyncSessionLocal": lambda: async_sessionmaker(_get("async_engine"), autoflush=False, expire_on_commit=False),
+    "AsyncReadSessionLocal": lambda: async_sessionmaker(
+        _get("async_read_engine"), autoflush=False, expire_on_commit=False
+    ),
+}
+_lazy_lock = threading.RLock()
+
+
+def _get(name: str):
+    value = globals().get(name)
+    if value is None:
+        with _lazy_lock:
+            value = globals().get(name)
+            if value is None:
+                value = globals()[name] = _LAZY[name]()
+    return value
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+def __getattr__(name: str):
+    if name in _LAZY:
+        return _get(name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 class Base(DeclarativeBase):
@@ -20,8 +119,26 @@ class Base(DeclarativeBase):
 
 
 def get_db():
-    db = SessionLocal()
+    db = _get("SessionLocal")()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def get_read_db():
+    db = _get("ReadSessionLocal")()
     try:
         yield db
     finally:
         db.close()
+
+
+async def get_async_db():
+    async with _get("AsyncSessionLocal")() as db:
+        yield db
+
+
+async def get_async_read_db():
+    async with _get("AsyncReadSessionLocal")() as db:
+        yield db
@@ -0,0 +1,38 @@
+"""Startup and shutdown shared by main and main_async.
+
+Importing an app module builds routes and nothing else: no engine, no file
+access. The database is checked here, when the server runs the lifespan,
+and a file already at the current schema costs one PRAGMA read. Deploys
+that migrate as a release step (`python -m app.migrate`) can set
+WASTE_DB_MIGRATE_ON_STARTUP=0, and workers then refuse to start on an old
+schema instead of racing to upgrade it.
+"""
+from __future__ import annotations
+
+from contextlib import asynccontextmanager
+
+from . import db as storage
+from . import migrate, rollup, scheduler
+from .sites import router
+
+
+def prepare_storage() -> None:
+    found = migrate.version(storage.engine)
+    if found < migrate.SCHEMA_VERSION:
+        if not storage.settings.migrate_on_startup:
+            raise RuntimeError(
+                f"Database schema is at version {found}, the app needs {migrate.SCHEMA_VERSION}: "
+                "run `python -m app.migrate`"
+            )
+        migrate.ensure_schema(storage.engine)
+        with storage.SessionLocal() as db:
+            rollup.backfill_if_empty(db)
+    router.ensure_default()
+
+
+@asynccontextmanager
+async def lifespan(app):
+    """FastAPI lifespan: storage first, then the plan scheduler (see scheduler.lifespan)."""
+    prepare_storage()
+    async with scheduler.lifespan(app):
+        yield
@@ -0,0 +1,260 @@
+"""Live dashboards: GET /dashboard/stream pushes changes as waste is written.
+
+Each (site, view, anchor, start, end) that at least one client is watching
+is a topic. A topic's dashboard is built once, when its first client
+connects, and then kept current in memory: crud publishes every committed
+waste entry, it is folded into each topic of its site (total, by_item,
+trend, comparisons), and the changed fields go out as one pre-encoded event
+shared by all of the topic's clients. Later clients are sent the topic's
+current state rather than a rebuild.
+
+Server-sent events, one JSON object per event:
+
+    event: snapshot   a full DashboardOut
+    event: delta      {"seq": n, ...} with only the fields that changed
+
+In a delta, by_item, trend and comparisons hold just the changed rows, to
+replace the row with the same item_id, date or label (by_item is then ranked
+again); by_item_removed lists item ids that dropped out. See
+services.dashboard.apply_delta.
+
+A build reads the dashboard and the change sequence head (app.changes) in
+one snapshot, and crud publishes each write with the seq it took, so a
+write is folded in only if it came after the build: one that committed
+while a build ran is folded into its result, never counted twice.
+
+Writes this process does not see (another worker, a script) and item
+renames are caught by a resync: every topic is rebuilt each
+WASTE_LIVE_RESYNC_S seconds, and a site's topics straight away when its
+items change, and whatever differs goes out as a delta.
+
+Streams stay open until the client leaves, so run uvicorn with
+--timeout-graceful-shutdown for restarts not to wait on them; EventSource
+reconnects by itself.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Callable, ContextManager
+
+from pydantic_settings import BaseSettings, SettingsConfigDict
+from sqlalchemy.orm import Session
+
+from . import changes
+from .services.dashboard import Entry, apply_delta, build_dashboard, diff_dashboards, fold_entries
+from .sites import router
+
+log = logging.getLogger(__name__)
+
+
+class LiveSettings(BaseSettings):
+    """Dashboard stream options, overridable with WASTE_LIVE_* environment variables."""
+
+    model_config = SettingsConfigDict(env_prefix="WASTE_LIVE_")
+
+    resync_s: float = 60.0  # rebuild every watched dashboard this often
+    keepalive_s: float = 15.0  # comment line on idle streams, so proxies keep them open
+    queue_size: int = 64  # events a slow client may fall behind by before it is sent a snapshot instead
+    retry_ms: int = 2000  # EventSource reconnect delay
+
+
+Key = tuple[int, str, str, str | None, str | None]  # (site, view, anchor, start, end)
+
+
+def _event(kind: str, seq: int, data: dict) -> bytes:
+    return f"event: {kind}\nid: {seq}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n".encode()
+
+
+@dataclass(eq=False)
+class _Topic:
+    key: Key
+    state: dict | None = None
+    seq: int = 0
+    built_at: int = 0  # change seq the last build read at; writes up to it are in state already
+    clients: set[asyncio.Queue] = field(default_factory=set)
+    ready: asyncio.Event = field(default_factory=asyncio.Event)
+    error: str | None = None
+    loading: bool = False
+    pending: list[tuple[int, list[Entry]]] = field(default_factory=list)  # published while a build ran
+    dirty: bool = False  # a resync was asked for while a build ran
+    _snapshot: bytes | None = None
+
+    def snapshot(self) -> bytes:
+        if self._snapshot is None:
+            self._snapshot = _event("snapshot", self.seq, self.state)
+        return self._snapshot
+
+
+class DashboardHub:
+    def __init__(
+        self,
+        settings: LiveSettings | None = None,
+        open_session: Callable[[int], ContextManager[Session]] = lambda site_id: router.session(site_id, readonly=True),
+    ):
+        self.settings = settings or LiveSettings()
+        self.open_session = open_session
+        self._topics: dict[Key, _Topic] = {}
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._resync_task: asyncio.Task | None = None
+        self.builds = 0
+        self.folds = 0
+        self.events = 0
+        self.lagged = 0
+
+    # ---- Clients ----
+
+    async def stream(self, key: Key) -> AsyncIterator[bytes]:
+        """The SSE body for one client of key: a snapshot, then deltas and keepalives until it leaves."""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._topics.clear()
+            self._resync_task = None
+        topic = self._topics.get(key)
+        if topic is None:
+            topic = self._topics[key] = _Topic(key)
+            loop.create_task(self._load(topic))
+        if self._resync_task is None:
+            self._resync_task = loop.create_task(self._resync_loop())
+
+        queue: asyncio.Queue[bytes] = asyncio.Queue(self.settings.queue_size)
+        topic.clients.add(queue)
+        try:
+            await topic.ready.wait()
+            if topic.error is not None:
+                yield _event("error", 0, {"detail": topic.error})
+                return
+            # Anything queued while waiting is already part of the state.
+            while not queue.empty():
+                queue.get_nowait()
+            yield f"retry: {self.settings.retry_ms}\n".encode() + topic.snapshot()
+            while True:
+                try:
+                    yield await asyncio.wait_for(queue.get(), self.settings.keepalive_s)
+                except asyncio.TimeoutError:
+                    yield b": keepalive\n\n"
+        finally:
+            topic.clients.discard(queue)
+            if not topic.clients and self._topics.get(key) is topic:
+                del self._topics[key]
+
+    def _send(self, topic: _Topic, message: bytes) -> None:
+        for queue in topic.clients:
+            try:
+                queue.put_nowait(message)
+            except asyncio.QueueFull:
+                # Too far behind for the deltas to be worth it: start it over from the current state.
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(topic.snapshot())
+                self.lagged += 1
+        self.events += 1
+
+    def _change(self, topic: _Topic, delta: dict) -> None:
+        topic.state = apply_delta(topic.state, delta)
+        topic.seq += 1
+        topic._snapshot = None
+        self._send(topic, _event("delta", topic.seq, {"seq": topic.seq, **delta}))
+
+    # ---- Builds ----
+
+    def _build(self, key: Key) -> tuple[dict, int]:
+        """The dashboard and the change seq it is current to, read in one snapshot."""
+        site_id, view, anchor, start, end = key
+        with self.open_session(site_id) as db:
+            db.connection().exec_driver_sql("BEGIN")
+            return build_dashboard(db, view, anchor, site_id=site_id, start=start, end=end), changes.head(db)
+
+    async def _load(self, topic: _Topic) -> None:
+        """Build (or rebuild) a topic, fold in the writes it missed, and send what changed."""
+        if topic.loading:
+            return
+        topic.loading = True
+        try:
+            try:
+                payload, head = await asyncio.to_thread(self._build, topic.key)
+            except Exception as e:
+                log.exception("Live dashboard build failed for %s", topic.key)
+                if topic.state is None:
+                    topic.error = str(e) or type(e).__name__
+                return
+            self.builds += 1
+            for seq, entries in topic.pending:
+                if seq > head:
+                    payload = apply_delta(payload, fold_entries(payload, entries))
+            topic.built_at = head
+            if topic.state is None:
+                topic.state = payload
+            else:
+                delta = diff_dashboards(topic.state, payload)
+                if delta:
+                    self._change(topic, delta)
+        finally:
+            topic.loading = False
+            topic.pending = []
+            topic.ready.set()
+        if topic.dirty:
+            topic.dirty = False
+            await self._load(topic)
+
+    async def _resync_loop(self) -> None:
+        while self._topics:
+            await asyncio.sleep(self.settings.resync_s)
+            for topic in list(self._topics.values()):
+                if topic.ready.is_set():
+                    await self._load(topic)
+        self._resync_task = None
+
+    # ---- Writes (any thread) ----
+
+    def publish(self, site_id: int, entries: list[Entry], seq: int) -> None:
+        """Fold waste entries committed together into the site's live dashboards; seq is one the write took."""
+        loop = self._loop
+        if loop is None or not self._topics or not entries:
+            return
+        loop.call_soon_threadsafe(self._fold, site_id, entries, seq)
+
+    def resync(self, site_id: int) -> None:
+        """Rebuild the site's live dashboards, for changes that cannot be folded in (item edits)."""
+        loop = self._loop
+        if loop is None or not self._topics:
+            return
+        loop.call_soon_threadsafe(self._resync_site, site_id)
+
+    def _fold(self, site_id: int, entries: list[Entry], seq: int) -> None:
+        for topic in list(self._topics.values()):
+            if topic.key[0] != site_id:
+                continue
+            if topic.loading:
+                topic.pending.append((seq, entries))
+            # A write's seqs commit together: at or below the build's head, all of them are in state.
+            if topic.state is None or seq <= topic.built_at:
+                continue
+            delta = fold_entries(topic.state, entries)
+            self.folds += 1
+            if delta:
+                self._change(topic, delta)
+
+    def _resync_site(self, site_id: int) -> None:
+        for topic in list(self._topics.values()):
+            if topic.key[0] == site_id:
+                if topic.loading:
+                    topic.dirty = True
+                else:
+                    self._loop.create_task(self._load(topic))
+
+    def stats(self) -> dict:
+        return {
+            "topics": len(self._topics),
+            "clients": sum(len(t.clients) for t in self._topics.values()),
+            "builds": self.builds,
+            "folds": self.folds,
+            "events": self.events,
+            "lagged": self.lagged,
+        }
+
+
+hub = DashboardHub()
@@ -1,19 +1,26 @@
 from __future__ import annotations
 
 from datetime import date, timedelta
-from fastapi import FastAPI, Depends, HTTPException, Query
+from typing import Literal
+from fastapi import FastAPI, Depends, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy.orm import Session
-from sqlalchemy import select
 
-from .db import Base, engine, get_db
-from . import models, schemas, crud
-from .services.dashboard import build_dashboard
-from .services.tomorrow_plan import build_tomorrow_plan
+from .sites import router, site_param, sites_param, get_site_db, get_site_read_db
+from . import schemas, crud, cache, changes, lifespan, live, metrics, responses, snapshots, versions
+from .analytics import choose_engine
+from .catalog import CatalogItem, catalog
+from .services.dashboard import build_dashboard, build_sites_dashboard, dashboard_span
+from .services.report import build_report
+# The planner (and NumPy behind it) is imported by the plan routes on first use.
+from .services.waste_import import parse_rows, validate_rows
+from .services import waste_export
 
 
 def create_app() -> FastAPI:
-    app = FastAPI(title="Circle M Deli Waste MVP", version="1.3.0")
+    app = FastAPI(title="Circle M Deli Waste MVP", version="1.3.0", lifespan=lifespan.lifespan)
 
     app.add_middleware(
         CORSMiddleware,
@@ -22,93 +29,395 @@ def create_app() -> FastAPI:
         allow_methods=["*"],
         allow_headers=["*"],
     )
-
-    Base.metadata.create_all(bind=engine)
+    metrics_settings = metrics.MetricsSettings()
+    if metrics_settings.enabled:
+        metrics.install(app, metrics_settings)
 
     @app.get("/health")
     def health():
         return {"ok": True}
 
+    @app.get("/cache/stats")
+    def cache_stats():
+        return cache.results.stats()
+
+    @app.get("/live/stats")
+    def live_stats():
+        return live.hub.stats()
+
+    # ---- Sites ----
+    @app.get("/sites", response_model=list[schemas.SiteOut])
+    def get_sites():
+        return [{"id": site_id, "name": name} for site_id, name in router.sites(reload=True).items()]
+
+    @app.post("/sites", response_model=schemas.SiteOut)
+    def post_site(data: schemas.SiteCreate):
+        if data.name.strip() in router.sites(reload=True).values():
+            raise HTTPException(status_code=400, detail="Site name already exists")
+        return router.create(data.name)
+
     # ---- Items ----
     @app.get("/items", response_model=list[schemas.ItemOut])
     def get_items(
+        request: Request,
         include_inactive: bool = Query(True),
-        db: Session = Depends(get_db),
+        site_id: int = Depends(site_param),
+        db: Session = Depends(get_site_db),
     ):
-        return crud.list_items(db, include_inactive=include_inactive)
+        def body():
+            items = crud.list_items(db, include_inactive=include_inactive, site_id=site_id)
+            return [
+                {"id": i.id, "name": i.name, "unit": i.unit, "is_active": i.is_active, "forecast_model": i.forecast_model}
+                for i in items
+            ]
+
+        return responses.conditional(request, responses.data_version([site_id], (versions.items,)), body)
+
+    def _item_named(db: Session, name: str, site_id: int) -> CatalogItem | None:
+        return catalog.items(db, site_id).named(name)
 
     @app.post("/items", response_model=schemas.ItemOut)
-    def post_item(data: schemas.ItemCreate, db: Session = Depends(get_db)):
-        existing = db.execute(select(models.Item).where(models.Item.name == data.name.strip())).scalar_one_or_none()
-        if existing:
+    def post_item(data: schemas.ItemCreate, site_id: int = Depends(site_param), db: Session = Depends(get_site_db)):
+        if _item_named(db, data.name, site_id):
             raise HTTPException(status_code=400, detail="Item name already exists")
-        return crud.create_item(db, data)
+        return crud.create_item(db, data, site_id=site_id)
 
     @app.put("/items", response_model=schemas.ItemOut)
-    def put_item(data: schemas.ItemUpdate, db: Session = Depends(get_db)):
-        existing = db.execute(select(models.Item).where(models.Item.name == data.name.strip())).scalar_one_or_none()
+    def put_item(data: schemas.ItemUpdate, site_id: int = Depends(site_param), db: Session = Depends(get_site_db)):
+        existing = _item_named(db, data.name, site_id)
         if existing and existing.id != data.id:
             raise HTTPException(status_code=400, detail="Item name already exists")
         try:
-            return crud.update_item(db, data)
+            return crud.update_item(db, data, site_id=site_id)
         except ValueError as e:
             raise HTTPException(status_code=404, detail=str(e))
 
     # ---- Waste ----
     @app.post("/waste")
-    def post_waste(data: schemas.WasteCreate, db: Session = Depends(get_db)):
+    def post_waste(data: schemas.WasteCreate, site_id: int = Depends(site_param), db: Session = Depends(get_site_db)):
         try:
-            entry = crud.create_waste(db, data)
+            entry = crud.create_waste(db, data, site_id=site_id)
             return {"id": entry.id}
         except ValueError as e:
             raise HTTPException(status_code=400, detail=str(e))
 
+    @app.post("/waste/bulk", response_model=schemas.WasteBulkOut)
+    async def post_waste_bulk(
+        request: Request, site_id: int = Depends(site_param), db: Session = Depends(get_site_db)
+    ):
+        """JSON array, NDJSON or CSV body; bad rows are reported, the rest are inserted together."""
+        try:
+            raw = parse_rows(await request.body(), request.headers.get("content-type", ""))
+        except LookupError as e:
+            raise HTTPException(status_code=415, detail=str(e))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        valid, errors = validate_rows(raw)
+        inserted, missing = await run_in_threadpool(crud.create_waste_bulk, db, [r for _, r in valid], site_id)
+        errors += [(valid[pos][0], detail) for pos, detail in missing]
+        return {
+            "inserted": inserted,
+            "errors": [{"index": i, "detail": d} for i, d in sorted(errors)],
+        }
+
     @app.get("/waste", response_model=schemas.WasteListOut)
     def get_waste(
+        request: Request,
         start_date: str | None = Query(None, pattern=r"^\d{4}-\d{2}-\d{2}$"),
         end_date: str | None = Query(None, pattern=r"^\d{4}-\d{2}-\d{2}$"),
         item_id: int | None = Query(None),
         limit: int = Query(50, ge=1, le=200),
         offset: int = Query(0, ge=0),
-        db: Session = Depends(get_db),
+        cursor: str | None = Query(None, pattern=r"^\d{4}-\d{2}-\d{2}:\d+$"),
+        include_total: bool = Query(True),
+        site_id: int = Depends(site_param),
+        db: Session = Depends(get_site_db),
     ):
-        rows, total = crud.list_waste(db, start_date, end_date, item_id, limit, offset)
-        items = {i.id: i for i in db.execute(select(models.Item)).scalars().all()}
-
-        out_rows = []
-        for r in rows:
-            it = items.get(r.item_id)
-            out_rows.append(
-                {
-                    "id": r.id,
-                    "entry_date": r.entry_date,
-                    "item_id": r.item_id,
-                    "quantity": float(r.quantity),
-                    "note": r.note,
-                    "item_name": it.name if it else "Unknown",
-                    "unit": it.unit if it else "pieces",
-                }
+        if cursor:
+            try:
+                crud.decode_cursor(cursor)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+
+        def body():
+            rows, total = crud.list_waste(
+                db, start_date, end_date, item_id, limit, offset, cursor=cursor, with_total=include_total, site_id=site_id
             )
 
-        return {"rows": out_rows, "total": total}
+            out_rows = []
+            for r, item_name, unit in rows:
+                out_rows.append(
+                    {
+                        "id": r.id,
+                        "entry_date": r.entry_date,
+                        "item_id": r.item_id,
+                        "quantity": float(r.quantity),
+                        "note": r.note,
+                        "item_name": item_name if item_name is not None else "Unknown",
+                        "unit": unit if unit is not None else "pieces",
+                    }
+                )
+
+            next_cursor = crud.encode_cursor(rows[-1][0]) if len(rows) == limit else None
+            return {"rows": out_rows, "total": total, "next_cursor": next_cursor}
+
+        return responses.conditional(request, responses.data_version([site_id]), body)
+
+    @app.get("/waste/export")
+    def export_waste(
+        fmt: Literal["csv", "ndjson", "parquet"] = Query("csv", alias="format"),
+        start_date: str | None = Query(None, pattern=r"^\d{4}-\d{2}-\d{2}$"),
+        end_date: str | None = Query(None, pattern=r"^\d{4}-\d{2}-\d{2}$"),
+        item_id: int | None = Query(None),
+        site_id: int = Depends(site_param),
+    ):
+        try:
+            waste_export.require_format(fmt)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        # The request-scoped session is closed before the body streams, so the
+        # generator holds its own for as long as the download runs.
+        def body():
+            with router.session(site_id, readonly=True) as db:
+                yield from waste_export.stream_waste(db, fmt, start_date, end_date, item_id, site_id)
+
+        return StreamingResponse(
+            body(),
+            media_type=waste_export.MEDIA_TYPES[fmt],
+            headers={"Content-Disposition": f'attachment; filename="waste.{fmt}"'},
+        )
+
+    # ---- Sync (offline clients) ----
+    @app.get("/sync", response_model=schemas.SyncOut)
+    def sync_changes(
+        request: Request,
+        since: int = Query(0, ge=0),
+        limit: int = Query(1000, ge=1, le=5000),
+        site_id: int = Depends(site_param),
+        db: Session = Depends(get_site_read_db),
+    ):
+        """Items and entries written after seq `since`, in batches; see app.changes."""
+        return responses.conditional(
+            request, responses.data_version([site_id]), lambda: changes.changes_since(db, site_id, since, limit)
+        )
+
+    @app.post("/sync/waste", response_model=schemas.WasteUploadOut)
+    def sync_waste(
+        data: list[schemas.WasteUpload], site_id: int = Depends(site_param), db: Session = Depends(get_site_db)
+    ):
+        """Entries with client-generated ids; resending a batch is safe (see crud.upload_waste)."""
+        results = crud.upload_waste(db, data, site_id=site_id)
+        return {"results": [{"client_id": c, "id": i, "status": s, "detail": d} for c, i, s, d in results]}
 
     # ---- Dashboard ----
+    def _span(view: str, anchor_date: str, start_date: str | None, end_date: str | None):
+        try:
+            return dashboard_span(
+                view,
+                date.fromisoformat(anchor_date),
+                start_date and date.fromisoformat(start_date),
+                end_date and date.fromisoformat(end_date),
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
     @app.get("/dashboard", response_model=schemas.DashboardOut)
     def dashboard(
+        request: Request,
         view: schemas.DashboardView = Query("week"),
         anchor_date: str = Query(date.today().isoformat(), pattern=r"^\d{4}-\d{2}-\d{2}$"),
-        db: Session = Depends(get_db),
+        start_date: str | None = Query(None, pattern=r"^\d{4}-\d{2}-\d{2}$"),
+        end_date: str | None = Query(None, pattern=r"^\d{4}-\d{2}-\d{2}$"),
+        site_id: int = Depends(site_param),
+        db: Session = Depends(get_site_read_db),
     ):
-        return build_dashboard(db, view=view, anchor_date_str=anchor_date)
+        """day/week/month/quarter/year around anchor_date, or view=range with start_date and end_date."""
+        span = _span(view, anchor_date, start_date, end_date)
+
+        # The cache keeps encoded bodies, so a hit is not serialized again either.
+        def encoded():
+            return responses.dumps(
+                build_dashboard(db, view, anchor_date, site_id=site_id, start=start_date, end=end_date)
+            )
+
+        version = responses.data_version([site_id])
+        return responses.conditional(
+            request,
+            version,
+            lambda: cache.results.get_or_compute(
+                ("dashboard", site_id, view, anchor_date, start_date, end_date),
+                span.start,
+                span.end,
+                encoded,
+                site=site_id,
+                version=version,
+            ),
+        )
+
+    @app.get("/dashboard/stream")
+    async def dashboard_stream(
+        view: schemas.DashboardView = Query("week"),
+        anchor_date: str = Query(date.today().isoformat(), pattern=r"^\d{4}-\d{2}-\d{2}$"),
+        start_date: str | None = Query(None, pattern=r"^\d{4}-\d{2}-\d{2}$"),
+        end_date: str | None = Query(None, pattern=r"^\d{4}-\d{2}-\d{2}$"),
+        site_id: int = Depends(site_param),
+    ):
+        """The dashboard as server-sent events: a snapshot, then only what changes as waste is written (app.live)."""
+        _span(view, anchor_date, start_date, end_date)
+        return StreamingResponse(
+            live.hub.stream((site_id, view, anchor_date, start_date, end_date)),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
+    @app.get("/dashboard/sites", response_model=schemas.SitesDashboardOut)
+    def sites_dashboard(
+        request: Request,
+        view: schemas.DashboardView = Query("week"),
+        anchor_date: str = Query(date.today().isoformat(), pattern=r"^\d{4}-\d{2}-\d{2}$"),
+        start_date: str | None = Query(None, pattern=r"^\d{4}-\d{2}-\d{2}$"),
+        end_date: str | None = Query(None, pattern=r"^\d{4}-\d{2}-\d{2}$"),
+        sites: dict[int, str] = Depends(sites_param),
+    ):
+        """Every site (or the ?site_id=... given) summed, with a per-site breakdown."""
+        span = _span(view, anchor_date, start_date, end_date)
+
+        def encoded():
+            return responses.dumps(
+                build_sites_dashboard(
+                    sites,
+                    view,
+                    anchor_date,
+                    lambda site_id: router.session(site_id, readonly=True),
+                    start=start_date,
+                    end=end_date,
+                )
+            )
+
+        version = responses.data_version(sites)
+        return responses.conditional(
+            request,
+            version,
+            lambda: cache.results.get_or_compute(
+                ("dashboard-sites", tuple(sites), view, anchor_date, start_date, end_date),
+                span.start,
+                span.end,
+                encoded,
+                version=version,
+            ),
+        )
+
+    # ---- Reports ----
+    @app.get("/reports/waste", response_model=schemas.WasteReportOut)
+    def waste_report(
+        request: Request,
+        start_date: str = Query(..., pattern=r"^\d{4}-\d{2}-\d{2}$"),
+        end_date: str = Query(..., pattern=r"^\d{4}-\d{2}-\d{2}$"),
+        group_by: schemas.ReportGroupBy = Query("day"),
+        item_id: int | None = Query(None),
+        engine: schemas.ReportEngine = Query("auto"),
+        site_id: int = Depends(site_param),
+        db: Session = Depends(get_site_read_db),
+    ):
+        """Totals and per-entry stats over any range; long ranges run on the columnar mirror (services.report)."""
+        try:
+            start, end = date.fromisoformat(start_date), date.fromisoformat(end_date)
+            used = choose_engine(start, end, engine)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        def encoded():
+            try:
+                return responses.dumps(build_report(db, start_date, end_date, group_by, item_id, site_id, used))
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+
+        version = responses.data_version([site_id])
+        return responses.conditional(
+            request,
+            version,
+            lambda: cache.results.get_or_compute(
+                ("report", site_id, start_date, end_date, group_by, item_id, used),
+                start,
+                end,
+                encoded,
+                site=site_id,
+                version=version,
+            ),
+        )
 
     # ---- Tomorrow plan (tomorrow only) ----
     @app.get("/tomorrow-plan", response_model=schemas.TomorrowPlanOut)
     def tomorrow_plan(
+        request: Request,
         target_date: str | None = Query(None, pattern=r"^\d{4}-\d{2}-\d{2}$"),
-        db: Session = Depends(get_db),
+        model: schemas.ForecastModel | None = Query(None),
+        site_id: int = Depends(site_param),
+        db: Session = Depends(get_site_read_db),
     ):
+        from .services.tomorrow_plan import build_tomorrow_plan, history_span
+
         t = date.fromisoformat(target_date) if target_date else (date.today() + timedelta(days=1))
-        return build_tomorrow_plan(db, target_date=t)
+        # The history window slides with today, so today is part of the key (and the ETag).
+        today = date.today()
+
+        def encoded():
+            return responses.dumps(build_tomorrow_plan(db, target_date=t, model=model, site_id=site_id))
+
+        def body():
+            if model is None:
+                # Materialized by app.scheduler: already-serialized JSON, one primary-key read.
+                payload = snapshots.load(db, t, today, site_id)
+                if payload is not None:
+                    return payload.encode()
+            start, end = history_span(today)
+            return cache.results.get_or_compute(
+                ("tomorrow-plan", site_id, t.isoformat(), today.isoformat(), model),
+                start,
+                end,
+                encoded,
+                site=site_id,
+                version=version,
+            )
+
+        version = responses.data_version([site_id])
+        return responses.conditional(request, version, body, daily=True)
+
+    # ---- Multi-day plan ----
+    @app.get("/plan", response_model=schemas.PlanMatrixOut)
+    def plan(
+        request: Request,
+        start: str | None = Query(None, pattern=r"^\d{4}-\d{2}-\d{2}$"),
+        days: int = Query(7, ge=1, le=31),
+        model: schemas.ForecastModel | None = Query(None),
+        site_id: int = Depends(site_param),
+        db: Session = Depends(get_site_read_db),
+    ):
+        from .services.tomorrow_plan import build_plan_range, history_span
+
+        s = date.fromisoformat(start) if start else (date.today() + timedelta(days=1))
+        today = date.today()
+        h_start, h_end = history_span(today)
+
+        def encoded():
+            return responses.dumps(build_plan_range(db, start=s, days=days, model=model, site_id=site_id))
+
+        version = responses.data_version([site_id])
+        return responses.conditional(
+            request,
+            version,
+            lambda: cache.results.get_or_compute(
+                ("plan", site_id, s.isoformat(), days, today.isoformat(), model),
+                h_start,
+                h_end,
+                encoded,
+                site=site_id,
+                version=version,
+            ),
+            daily=True,
+        )
 
     return app
 
@@ -0,0 +1,444 @@
+"""Async variant of the API: same routes and responses as main, served from
+AsyncSession with the analytics passes offloaded to worker threads.
+
+    uvicorn app.main_async:app
+"""
+from __future__ import annotations
+
+from datetime import date, timedelta
+from typing import Literal
+from fastapi import FastAPI, Depends, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .sites import router, site_param, sites_param, get_async_site_db, get_async_site_read_db
+from . import schemas, crud, cache, changes, lifespan, live, metrics, responses, snapshots, versions
+from .analytics import choose_engine
+from .catalog import CatalogItem, catalog
+from .services.dashboard import build_dashboard_async, build_sites_dashboard_async, dashboard_span
+from .services.report import build_report
+# The planner (and NumPy behind it) is imported by the plan routes on first use.
+from .services.waste_import import parse_rows, validate_rows
+from .services import waste_export
+
+
+def create_app() -> FastAPI:
+    app = FastAPI(title="Circle M Deli Waste MVP", version="1.3.0", lifespan=lifespan.lifespan)
+
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["http://localhost:5173", "http://127.0.0.1:5173"],
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+    metrics_settings = metrics.MetricsSettings()
+    if metrics_settings.enabled:
+        metrics.install(app, metrics_settings)
+
+    @app.get("/health")
+    async def health():
+        return {"ok": True}
+
+    @app.get("/cache/stats")
+    async def cache_stats():
+        return cache.results.stats()
+
+    @app.get("/live/stats")
+    async def live_stats():
+        return live.hub.stats()
+
+    # ---- Sites ----
+    @app.get("/sites", response_model=list[schemas.SiteOut])
+    async def get_sites():
+        sites = await run_in_threadpool(router.sites, True)
+        return [{"id": site_id, "name": name} for site_id, name in sites.items()]
+
+    @app.post("/sites", response_model=schemas.SiteOut)
+    async def post_site(data: schemas.SiteCreate):
+        if data.name.strip() in (await run_in_threadpool(router.sites, True)).values():
+            raise HTTPException(status_code=400, detail="Site name already exists")
+        return await run_in_threadpool(router.create, data.name)
+
+    # ---- Items ----
+    @app.get("/items", response_model=list[schemas.ItemOut])
+    async def get_items(
+        request: Request,
+        include_inactive: bool = Query(True),
+        site_id: int = Depends(site_param),
+        db: AsyncSession = Depends(get_async_site_db),
+    ):
+        async def body():
+            items = await crud.list_items_async(db, include_inactive=include_inactive, site_id=site_id)
+            return [
+                {"id": i.id, "name": i.name, "unit": i.unit, "is_active": i.is_active, "forecast_model": i.forecast_model}
+                for i in items
+            ]
+
+        return await responses.conditional_async(request, responses.data_version([site_id], (versions.items,)), body)
+
+    async def _item_named(db: AsyncSession, name: str, site_id: int) -> CatalogItem | None:
+        return (await catalog.items_async(db, site_id)).named(name)
+
+    @app.post("/items", response_model=schemas.ItemOut)
+    async def post_item(
+        data: schemas.ItemCreate, site_id: int = Depends(site_param), db: AsyncSession = Depends(get_async_site_db)
+    ):
+        if await _item_named(db, data.name, site_id):
+            raise HTTPException(status_code=400, detail="Item name already exists")
+        return await crud.create_item_async(db, data, site_id=site_id)
+
+    @app.put("/items", response_model=schemas.ItemOut)
+    async def put_item(
+        data: schemas.ItemUpdate, site_id: int = Depends(site_param), db: AsyncSession = Depends(get_async_site_db)
+    ):
+        existing = await _item_named(db, data.name, site_id)
+        if existing and existing.id != data.id:
+            raise HTTPException(status_code=400, detail="Item name already exists")
+        try:
+            return await crud.update_item_async(db, data, site_id=site_id)
+        except ValueError as e:
+            raise HTTPException(status_code=404, detail=str(e))
+
+    # ---- Waste ----
+    @app.post("/waste")
+    async def post_waste(
+        data: schemas.WasteCreate, site_id: int = Depends(site_param), db: AsyncSession = Depends(get_async_site_db)
+    ):
+        try:
+            entry = await crud.create_waste_async(db, data, site_id=site_id)
+            return {"id": entry.id}
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    @app.post("/waste/bulk", response_model=schemas.WasteBulkOut)
+    async def post_waste_bulk(request: Request, site_id: int = Depends(site_param)):
+        """JSON array, NDJSON or CSV body; bad rows are reported, the rest are inserted together."""
+        try:
+            raw = parse_rows(await request.body(), request.headers.get("content-type", ""))
+        except LookupError as e:
+            raise HTTPException(status_code=415, detail=str(e))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        valid, errors = validate_rows(raw)
+
+        # One executemany transaction; the sync path in a thread is as fast as it gets on SQLite.
+        def insert():
+            with router.session(site_id) as db:
+                return crud.create_waste_bulk(db, [r for _, r in valid], site_id)
+
+        inserted, missing = await run_in_threadpool(insert)
+        errors += [(valid[pos][0], detail) for pos, detail in missing]
+        return {
+            "inserted": inserted,
+            "errors": [{"index": i, "detail": d} for i, d in sorted(errors)],
+        }
+
+    @app.get("/waste", response_model=schemas.WasteListOut)
+    async def get_waste(
+        request: Request,
+        start_date: str | None = Query(None, pattern=r"^\d{4}-\d{2}-\d{2}$"),
+        end_date: str | None = Query(None, pattern=r"^\d{4}-\d{2}-\d{2}$"),
+        item_id: int | None = Query(None),
+        limit: int = Query(50, ge=1, le=200),
+        offset: int = Query(0, ge=0),
+        cursor: str | None = Query(None, pattern=r"^\d{4}-\d{2}-\d{2}:\d+$"),
+        include_total: bool = Query(True),
+        site_id: int = Depends(site_param),
+        db: AsyncSession = Depends(get_async_site_db),
+    ):
+        if cursor:
+            try:
+                crud.decode_cursor(cursor)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+
+        async def body():
+            rows, total = await crud.list_waste_async(
+                db, start_date, end_date, item_id, limit, offset, cursor=cursor, with_total=include_total, site_id=site_id
+            )
+
+            out_rows = []
+            for r, item_name, unit in rows:
+                out_rows.append(
+                    {
+                        "id": r.id,
+                        "entry_date": r.entry_date,
+                        "item_id": r.item_id,
+                        "quantity": float(r.quantity),
+                        "note": r.note,
+                        "item_name": item_name if item_name is not None else "Unknown",
+                        "unit": unit if unit is not None else "pieces",
+                    }
+                )
+
+            next_cursor = crud.encode_cursor(rows[-1][0]) if len(rows) == limit else None
+            return {"rows": out_rows, "total": total, "next_cursor": next_cursor}
+
+        return await responses.conditional_async(request, responses.data_version([site_id]), body)
+
+    @app.get("/waste/export")
+    async def export_waste(
+        fmt: Literal["csv", "ndjson", "parquet"] = Query("csv", alias="format"),
+        start_date: str | None = Query(None, pattern=r"^\d{4}-\d{2}-\d{2}$"),
+        end_date: str | None = Query(None, pattern=r"^\d{4}-\d{2}-\d{2}$"),
+        item_id: int | None = Query(None),
+        site_id: int = Depends(site_param),
+    ):
+        try:
+            waste_export.require_format(fmt)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        # A sync generator: Starlette iterates it in a worker thread.
+        def body():
+            with router.session(site_id, readonly=True) as db:
+                yield from waste_export.stream_waste(db, fmt, start_date, end_date, item_id, site_id)
+
+        return StreamingResponse(
+            body(),
+            media_type=waste_export.MEDIA_TYPES[fmt],
+            headers={"Content-Disposition": f'attachment; filename="waste.{fmt}"'},
+        )
+
+    # ---- Sync (offline clients) ----
+    @app.get("/sync", response_model=schemas.SyncOut)
+    async def sync_changes(
+        request: Request,
+        since: int = Query(0, ge=0),
+        limit: int = Query(1000, ge=1, le=5000),
+        site_id: int = Depends(site_param),
+        db: AsyncSession = Depends(get_async_site_read_db),
+    ):
+        """Items and entries written after seq `since`, in batches; see app.changes."""
+        return await responses.conditional_async(
+            request, responses.data_version([site_id]), lambda: changes.changes_since_async(db, site_id, since, limit)
+        )
+
+    @app.post("/sync/waste", response_model=schemas.WasteUploadOut)
+    async def sync_waste(data: list[schemas.WasteUpload], site_id: int = Depends(site_param)):
+        """Entries with client-generated ids; resending a batch is safe (see crud.upload_waste)."""
+
+        # One transaction around the duplicate check and the executemany, as /waste/bulk.
+        def upload():
+            with router.session(site_id) as db:
+                return crud.upload_waste(db, data, site_id)
+
+        results = await run_in_threadpool(upload)
+        return {"results": [{"client_id": c, "id": i, "status": s, "detail": d} for c, i, s, d in results]}
+
+    # ---- Dashboard ----
+    def _span(view: str, anchor_date: str, start_date: str | None, end_date: str | None):
+        try:
+            return dashboard_span(
+                view,
+                date.fromisoformat(anchor_date),
+                start_date and date.fromisoformat(start_date),
+                end_date and date.fromisoformat(end_date),
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    @app.get("/dashboard", response_model=schemas.DashboardOut)
+    async def dashboard(
+        request: Request,
+        view: schemas.DashboardView = Query("week"),
+        anchor_date: str = Query(date.today().isoformat(), pattern=r"^\d{4}-\d{2}-\d{2}$"),
+        start_date: str | None = Query(None, pattern=r"^\d{4}-\d{2}-\d{2}$"),
+        end_date: str | None = Query(None, pattern=r"^\d{4}-\d{2}-\d{2}$"),
+        site_id: int = Depends(site_param),
+        db: AsyncSession = Depends(get_async_site_read_db),
+    ):
+        """day/week/month/quarter/year around anchor_date, or view=range with start_date and end_date."""
+        span = _span(view, anchor_date, start_date, end_date)
+
+        async def encoded():
+            return responses.dumps(
+                await build_dashboard_async(db, view, anchor_date, site_id=site_id, start=start_date, end=end_date)
+            )
+
+        version = responses.data_version([site_id])
+        return await responses.conditional_async(
+            request,
+            version,
+            lambda: cache.results.get_or_compute_async(
+                ("dashboard", site_id, view, anchor_date, start_date, end_date),
+                span.start,
+                span.end,
+                encoded,
+                site=site_id,
+                version=version,
+            ),
+        )
+
+    @app.get("/dashboard/stream")
+    async def dashboard_stream(
+        view: schemas.DashboardView = Query("week"),
+        anchor_date: str = Query(date.today().isoformat(), pattern=r"^\d{4}-\d{2}-\d{2}$"),
+        start_date: str | None = Query(None, pattern=r"^\d{4}-\d{2}-\d{2}$"),
+        end_date: str | None = Query(None, pattern=r"^\d{4}-\d{2}-\d{2}$"),
+        site_id: int = Depends(site_param),
+    ):
+        """The dashboard as server-sent events: a snapshot, then only what changes as waste is written (app.live)."""
+        _span(view, anchor_date, start_date, end_date)
+        return StreamingResponse(
+            live.hub.stream((site_id, view, anchor_date, start_date, end_date)),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
+    @app.get("/dashboard/sites", response_model=schemas.SitesDashboardOut)
+    async def sites_dashboard(
+        request: Request,
+        view: schemas.DashboardView = Query("week"),
+        anchor_date: str = Query(date.today().isoformat(), pattern=r"^\d{4}-\d{2}-\d{2}$"),
+        start_date: str | None = Query(None, pattern=r"^\d{4}-\d{2}-\d{2}$"),
+        end_date: str | None = Query(None, pattern=r"^\d{4}-\d{2}-\d{2}$"),
+        sites: dict[int, str] = Depends(sites_param),
+    ):
+        span = _span(view, anchor_date, start_date, end_date)
+
+        async def encoded():
+            return responses.dumps(
+                await build_sites_dashboard_async(
+                    sites,
+                    view,
+                    anchor_date,
+                    lambda site_id: router.async_session(site_id, readonly=True),
+                    start=start_date,
+                    end=end_date,
+                )
+            )
+
+        version = responses.data_version(sites)
+        return await responses.conditional_async(
+            request,
+            version,
+            lambda: cache.results.get_or_compute_async(
+                ("dashboard-sites", tuple(sites), view, anchor_date, start_date, end_date),
+                span.start,
+                span.end,
+                encoded,
+                version=version,
+            ),
+        )
+
+    # ---- Reports ----
+    @app.get("/reports/waste", response_model=schemas.WasteReportOut)
+    async def waste_report(
+        request: Request,
+        start_date: str = Query(..., pattern=r"^\d{4}-\d{2}-\d{2}$"),
+        end_date: str = Query(..., pattern=r"^\d{4}-\d{2}-\d{2}$"),
+        group_by: schemas.ReportGroupBy = Query("day"),
+        item_id: int | None = Query(None),
+        engine: schemas.ReportEngine = Query("auto"),
+        site_id: int = Depends(site_param),
+    ):
+        """Totals and per-entry stats over any range; long ranges run on the columnar mirror (services.report)."""
+        try:
+            start, end = date.fromisoformat(start_date), date.fromisoformat(end_date)
+            used = choose_engine(start, end, engine)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        # A report is one long scan (or a Parquet read) either way: the sync path in a thread.
+        def report():
+            with router.session(site_id, readonly=True) as db:
+                return build_report(db, start_date, end_date, group_by, item_id, site_id, used)
+
+        async def encoded():
+            try:
+                return responses.dumps(await run_in_threadpool(report))
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+
+        version = responses.data_version([site_id])
+        return await responses.conditional_async(
+            request,
+            version,
+            lambda: cache.results.get_or_compute_async(
+                ("report", site_id, start_date, end_date, group_by, item_id, used),
+                start,
+                end,
+                encoded,
+                site=site_id,
+                version=version,
+            ),
+        )
+
+    # ---- Tomorrow plan (tomorrow only) ----
+    @app.get("/tomorrow-plan", response_model=schemas.TomorrowPlanOut)
+    async def tomorrow_plan(
+        request: Request,
+        target_date: str | None = Query(None, pattern=r"^\d{4}-\d{2}-\d{2}$"),
+        model: schemas.ForecastModel | None = Query(None),
+        site_id: int = Depends(site_param),
+        db: AsyncSession = Depends(get_async_site_read_db),
+    ):
+        from .services.tomorrow_plan import build_tomorrow_plan_async, history_span
+
+        t = date.fromisoformat(target_date) if target_date else (date.today() + timedelta(days=1))
+        today = date.today()
+
+        async def encoded():
+            return responses.dumps(await build_tomorrow_plan_async(db, target_date=t, model=model, site_id=site_id))
+
+        async def body():
+            if model is None:
+                payload = await snapshots.load_async(db, t, today, site_id)
+                if payload is not None:
+                    return payload.encode()
+            start, end = history_span(today)
+            return await cache.results.get_or_compute_async(
+                ("tomorrow-plan", site_id, t.isoformat(), today.isoformat(), model),
+                start,
+                end,
+                encoded,
+                site=site_id,
+                version=version,
+            )
+
+        version = responses.data_version([site_id])
+        return await responses.conditional_async(request, version, body, daily=True)
+
+    # ---- Multi-day plan ----
+    @app.get("/plan", response_model=schemas.PlanMatrixOut)
+    async def plan(
+        request: Request,
+        start: str | None = Query(None, pattern=r"^\d{4}-\d{2}-\d{2}$"),
+        days: int = Query(7, ge=1, le=31),
+        model: schemas.ForecastModel | None = Query(None),
+        site_id: int = Depends(site_param),
+        db: AsyncSession = Depends(get_async_site_read_db),
+    ):
+        from .services.tomorrow_plan import build_plan_range_async, history_span
+
+        s = date.fromisoformat(start) if start else (date.today() + timedelta(days=1))
+        today = date.today()
+        h_start, h_end = history_span(today)
+
+        async def encoded():
+            return responses.dumps(await build_plan_range_async(db, start=s, days=days, model=model, site_id=site_id))
+
+        version = responses.data_version([site_id])
+        return await responses.conditional_async(
+            request,
+            version,
+            lambda: cache.results.get_or_compute_async(
+                ("plan", site_id, s.isoformat(), days, today.isoformat(), model),
+                h_start,
+                h_end,
+                encoded,
+                site=site_id,
+                version=version,
+            ),
+            daily=True,
+        )
+
+    return app
+
+
+app = create_app()
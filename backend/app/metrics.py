@@ -0,0 +1,328 @@
+"""Per-endpoint request metrics and on-demand profiles, off unless WASTE_METRICS_ENABLED=1.
+
+When enabled, create_app installs:
+
+- a middleware timing each request, labelled by route template
+  (/dashboard, not /dashboard?view=year);
+- engine events counting the SQL statements and SQL time behind each request;
+- a route class that notes when the endpoint returns, so the time from there
+  to the first response byte is recorded as serialization (response_model
+  validation and JSON encoding);
+- GET /metrics in the Prometheus text format.
+
+With WASTE_METRICS_PROFILE=1 as well, a request carrying `X-Profile: 1` runs
+under cProfile; the stats are written to WASTE_METRICS_PROFILE_DIR and the path
+is returned in the X-Profile-File response header:
+
+    python -m pstats /tmp/waste-profiles/dashboard-1729170000123.prof
+
+The profile covers the event loop thread plus the thread a sync endpoint runs
+on, so on a busy server it also picks up other requests' work on the loop.
+"""
+from __future__ import annotations
+
+import asyncio
+import cProfile
+import contextvars
+import functools
+import pstats
+import tempfile
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable
+
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
+from fastapi.routing import APIRoute
+from pydantic_settings import BaseSettings, SettingsConfigDict
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+PROFILE_HEADER = b"x-profile"
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+
+class MetricsSettings(BaseSettings):
+    """Instrumentation switches, overridable with WASTE_METRICS_* environment variables."""
+
+    model_config = SettingsConfigDict(env_prefix="WASTE_METRICS_")
+
+    enabled: bool = False
+    profile: bool = False  # honour X-Profile: 1
+    profile_dir: Path = Path(tempfile.gettempdir()) / "waste-profiles"
+
+
+# ---- Per-request accounting ----
+
+
+@dataclass
+class RequestStats:
+    """What one request spent, filled in from whichever thread does the work."""
+
+    sql_statements: int = 0
+    sql_s: float = 0.0
+    returned_at: float | None = None  # perf_counter when the endpoint returned
+    profile: cProfile.Profile | None = None  # set when the request asked for a profile
+    worker_profiles: list[cProfile.Profile] = field(default_factory=list)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def add_sql(self, seconds: float) -> None:
+        with self._lock:
+            self.sql_statements += 1
+            self.sql_s += seconds
+
+
+# Set by the middleware for the length of a request. Starlette's threadpool,
+# asyncio.to_thread and asyncio tasks copy the context, so SQL run on their
+# threads is charged to the request that started it.
+current: contextvars.ContextVar[RequestStats | None] = contextvars.ContextVar("request_stats", default=None)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("metrics_t0", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    t0 = conn.info["metrics_t0"].pop()
+    stats = current.get()
+    if stats is not None:
+        stats.add_sql(time.perf_counter() - t0)
+
+
+_listening = False
+
+
+def listen_sql() -> None:
+    """Time every statement on every engine: the main pair, the async engines and site shards alike."""
+    global _listening
+    if not _listening:
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+        _listening = True
+
+
+# ---- Prometheus registry ----
+
+
+class Histogram:
+    """Cumulative-bucket histogram per label tuple."""
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...], buckets: tuple[float, ...]):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self._series: dict[tuple[str, ...], tuple[list[int], list[float]]] = {}  # counts per bucket + inf, [sum]
+
+    def observe(self, label_values: tuple[str, ...], value: float) -> None:
+        counts, total = self._series.setdefault(label_values, ([0] * (len(self.buckets) + 1), [0.0]))
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[i] += 1
+        counts[-1] += 1
+        total[0] += value
+
+    def render(self) -> list[str]:
+        out = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for values, (counts, total) in sorted(self._series.items()):
+            labels = ",".join(f'{k}="{_escape(v)}"' for k, v in zip(self.labels, values))
+            for bound, n in zip(self.buckets, counts):
+                out.append(f'{self.name}_bucket{{{labels},le="{bound:g}"}} {n}')
+            out.append(f'{self.name}_bucket{{{labels},le="+Inf"}} {counts[-1]}')
+            out.append(f"{self.name}_sum{{{labels}}} {total[0]:.6f}")
+            out.append(f"{self.name}_count{{{labels}}} {counts[-1]}")
+        return out
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: tuple[str, ...]):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._series: dict[tuple[str, ...], int] = {}
+
+    def inc(self, label_values: tuple[str, ...]) -> None:
+        self._series[label_values] = self._series.get(label_values, 0) + 1
+
+    def render(self) -> list[str]:
+        out = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for values, n in sorted(self._series.items()):
+            labels = ",".join(f'{k}="{_escape(v)}"' for k, v in zip(self.labels, values))
+            out.append(f"{self.name}{{{labels}}} {n}")
+        return out
+
+
+def _escape(v: str) -> str:
+    return v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Registry:
+    """The app's request metrics; observe() may be called from any thread."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        route = ("method", "route")
+        self.requests = Counter("waste_requests_total", "Requests handled.", ("method", "route", "status"))
+        self.latency = Histogram(
+            "waste_request_duration_seconds", "Time from request to last response byte.", route, LATENCY_BUCKETS
+        )
+        self.sql_statements = Histogram(
+            "waste_request_sql_statements", "SQL statements executed per request.", route, STATEMENT_BUCKETS
+        )
+        self.sql_seconds = Histogram(
+            "waste_request_sql_seconds", "Time spent executing SQL per request.", route, LATENCY_BUCKETS
+        )
+        self.serialize_seconds = Histogram(
+            "waste_request_serialize_seconds",
+            "Time from the endpoint returning to the response starting.",
+            route,
+            LATENCY_BUCKETS,
+        )
+
+    def observe(self, method: str, route: str, status: int, seconds: float, stats: RequestStats, serialize_s: float):
+        key = (method, route)
+        with self._lock:
+            self.requests.inc((method, route, str(status)))
+            self.latency.observe(key, seconds)
+            self.sql_statements.observe(key, stats.sql_statements)
+            self.sql_seconds.observe(key, stats.sql_s)
+            self.serialize_seconds.observe(key, serialize_s)
+
+    def render(self) -> str:
+        with self._lock:
+            lines = []
+            for metric in (self.requests, self.latency, self.sql_statements, self.sql_seconds, self.serialize_seconds):
+                lines += metric.render()
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+
+# ---- Endpoint return marker ----
+
+
+def _mark_returned(call: Callable) -> Callable:
+    """Wrap an endpoint so the request's stats note when it returns (and profile it, if on a worker thread)."""
+    if asyncio.iscoroutinefunction(call):
+
+        @functools.wraps(call)
+        async def timed_async(*args, **kwargs):
+            try:
+                return await call(*args, **kwargs)
+            finally:
+                stats = current.get()
+                if stats is not None:
+                    stats.returned_at = time.perf_counter()
+
+        return timed_async
+
+    @functools.wraps(call)
+    def timed(*args, **kwargs):
+        stats = current.get()
+        # cProfile only sees its own thread, and sync endpoints run on the threadpool.
+        profile = cProfile.Profile() if stats is not None and stats.profile is not None else None
+        if profile is not None:
+            profile.enable()
+        try:
+            return call(*args, **kwargs)
+        finally:
+            if profile is not None:
+                profile.disable()
+                with stats._lock:
+                    stats.worker_profiles.append(profile)
+            if stats is not None:
+                stats.returned_at = time.perf_counter()
+
+    return timed
+
+
+class InstrumentedRoute(APIRoute):
+    """APIRoute whose endpoint records when it returns; see _mark_returned."""
+
+    def get_route_handler(self):
+        # Called once from APIRoute.__init__, after the signature has been read
+        # from the real endpoint.
+        self.dependant.call = _mark_returned(self.dependant.call)
+        return super().get_route_handler()
+
+
+# ---- Middleware ----
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware: times the request and files its RequestStats under its route."""
+
+    def __init__(self, app, settings: MetricsSettings, registry: Registry = registry):
+        self.app = app
+        self.settings = settings
+        self.registry = registry
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = current.set(stats)
+        profile_path = None
+        if self.settings.profile and dict(scope["headers"]).get(PROFILE_HEADER) in (b"1", b"true"):
+            stats.profile = cProfile.Profile()
+            name = scope["path"].strip("/").replace("/", "_") or "root"
+            profile_path = self.settings.profile_dir / f"{name}-{time.time_ns() // 1_000_000}.prof"
+
+        status = 500
+        started_at: float | None = None
+
+        async def send_wrapper(message):
+            nonlocal status, started_at
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                started_at = time.perf_counter()
+                if profile_path is not None:
+                    message = {**message, "headers": [*message["headers"], (b"x-profile-file", str(profile_path).encode())]}
+            await send(message)
+
+        t0 = time.perf_counter()
+        if stats.profile is not None:
+            stats.profile.enable()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            if stats.profile is not None:
+                stats.profile.disable()
+            elapsed = time.perf_counter() - t0
+            current.reset(token)
+            route = scope.get("route")
+            label = route.path if route is not None else "<unmatched>"
+            serialize_s = (
+                started_at - stats.returned_at if started_at is not None and stats.returned_at is not None else 0.0
+            )
+            self.registry.observe(scope["method"], label, status, elapsed, stats, max(serialize_s, 0.0))
+            if profile_path is not None:
+                _dump_profile(stats, profile_path)
+
+
+def _dump_profile(stats: RequestStats, path: Path) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    combined = pstats.Stats(stats.profile)
+    for profile in stats.worker_profiles:
+        combined.add(profile)
+    combined.dump_stats(path)
+
+
+def install(app: FastAPI, settings: MetricsSettings | None = None) -> None:
+    """Instrument `app`. Call before any route is declared, so every route gets InstrumentedRoute."""
+    settings = settings or MetricsSettings()
+    listen_sql()
+    app.router.route_class = InstrumentedRoute
+    app.add_middleware(MetricsMiddleware, settings=settings)
+
+    @app.get("/metrics", include_in_schema=False)
+    def metrics():
+        return PlainTextResponse(registry.render(), media_type=CONTENT_TYPE)
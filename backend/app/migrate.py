@@ -0,0 +1,240 @@
+"""Schema versioning for the SQLite file, tracked in PRAGMA user_version.
+
+    cd backend && python -m app.migrate
+
+Version 1: waste_entries.entry_date and daily_item_totals.entry_date become
+integer YYYYMMDD day keys with a stored weekday, waste_entries gets covering
+(date, item, qty) / (item, date, qty) indexes, and the rollup becomes a
+WITHOUT ROWID table. Older files are rewritten in place in one transaction.
+
+Version 2: items.forecast_model, the per-item planner forecaster.
+
+Version 3: sites. items, waste_entries, daily_item_totals and plan_snapshots
+gain a site_id that leads their keys and indexes; existing rows belong to
+DEFAULT_SITE_ID. Item names become unique per site.
+
+Version 4: period_item_totals, the week/month/year cube over
+daily_item_totals, filled from it.
+
+Version 5: the change sequence for GET /sync (app.changes). items and
+waste_entries gain a seq, stamped for existing rows, waste_entries a
+client_id unique per site, and change_sequence holds the counter.
+
+Version 6: waste_archives, the registry of months moved out to their own
+files by app.archive.
+"""
+from __future__ import annotations
+
+from sqlalchemy.engine import Engine
+from sqlalchemy.schema import CreateIndex, CreateTable
+
+from . import changes, db, models, rollup
+from .db import Base
+
+SCHEMA_VERSION = 6
+
+
+def _user_version(cur) -> int:
+    return int(cur.execute("PRAGMA user_version").fetchone()[0])
+
+
+def _column_type(cur, table: str, column: str) -> str | None:
+    for row in cur.execute(f"PRAGMA table_info({table})").fetchall():
+        if row[1] == column:
+            return str(row[2]).upper()
+    return None
+
+
+def _create(cur, dialect, table) -> None:
+    cur.execute(str(CreateTable(table).compile(dialect=dialect)))
+    for index in table.indexes:
+        cur.execute(str(CreateIndex(index).compile(dialect=dialect)))
+
+
+def _set_aside(cur, table: str) -> str:
+    """Rename table out of the way, dropping its named indexes so the new ones can reuse names."""
+    for (name,) in cur.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL", (table,)
+    ).fetchall():
+        cur.execute(f'DROP INDEX "{name}"')
+    old = f"{table}__v0"
+    cur.execute(f'ALTER TABLE "{table}" RENAME TO "{old}"')
+    return old
+
+
+def _to_v1(cur, dialect) -> None:
+    if _column_type(cur, "waste_entries", "entry_date") in (None, "INTEGER"):
+        return  # no table yet, or created by the current models
+
+    waste = models.WasteEntry.__table__
+    totals = models.DailyItemTotal.__table__
+
+    old_waste = _set_aside(cur, "waste_entries")
+    old_totals = _set_aside(cur, "daily_item_totals") if _column_type(cur, "daily_item_totals", "entry_date") else None
+
+    _create(cur, dialect, waste)
+    _create(cur, dialect, totals)
+
+    # strftime('%w') counts from Sunday=0; the app uses date.weekday(), Monday=0.
+    cur.execute(
+        f"""
+        INSERT INTO waste_entries (id, entry_date, weekday, item_id, quantity, note)
+        SELECT id,
+               CAST(REPLACE(entry_date, '-', '') AS INTEGER),
+               (CAST(strftime('%w', entry_date) AS INTEGER) + 6) % 7,
+               item_id, quantity, note
+        FROM "{old_waste}"
+        """
+    )
+    # The rollup is derived data, so rebuild it rather than convert it.
+    cur.execute(
+        """
+        INSERT INTO daily_item_totals (entry_date, item_id, weekday, total, entry_count)
+        SELECT entry_date, item_id, MIN(weekday), SUM(quantity), COUNT(*)
+        FROM waste_entries
+        GROUP BY entry_date, item_id
+        """
+    )
+
+    cur.execute(f'DROP TABLE "{old_waste}"')
+    if old_totals:
+        cur.execute(f'DROP TABLE "{old_totals}"')
+
+
+def _to_v2(cur, dialect) -> None:
+    if _column_type(cur, "items", "forecast_model") is None:
+        cur.execute("ALTER TABLE items ADD COLUMN forecast_model VARCHAR(20)")
+
+
+def _to_v3(cur, dialect) -> None:
+    if _column_type(cur, "sites", "id") is None:
+        _create(cur, dialect, models.Site.__table__)
+
+    if _column_type(cur, "items", "site_id") is None:
+        cur.execute("INSERT OR IGNORE INTO sites (id, name) VALUES (?, 'Main')", (models.DEFAULT_SITE_ID,))
+        old = _set_aside(cur, "items")
+        _create(cur, dialect, models.Item.__table__)
+        cur.execute(
+            f"""
+            INSERT INTO items (id, site_id, name, unit, is_active, forecast_model)
+            SELECT id, {models.DEFAULT_SITE_ID}, name, unit, is_active, forecast_model FROM "{old}"
+            """
+        )
+        cur.execute(f'DROP TABLE "{old}"')
+
+    # Files that went through _to_v1 in this same upgrade already have the v3 layout.
+    if _column_type(cur, "waste_entries", "site_id") is None:
+        old = _set_aside(cur, "waste_entries")
+        _create(cur, dialect, models.WasteEntry.__table__)
+        cur.execute(
+            f"""
+            INSERT INTO waste_entries (id, site_id, entry_date, weekday, item_id, quantity, note)
+            SELECT id, {models.DEFAULT_SITE_ID}, entry_date, weekday, item_id, quantity, note FROM "{old}"
+            """
+        )
+        cur.execute(f'DROP TABLE "{old}"')
+
+    # Derived tables: rebuilt rather than converted.
+    if _column_type(cur, "daily_item_totals", "site_id") is None:
+        cur.execute(f'DROP TABLE "{_set_aside(cur, "daily_item_totals")}"')
+        _create(cur, dialect, models.DailyItemTotal.__table__)
+        cur.execute(
+            """
+            INSERT INTO daily_item_totals (site_id, entry_date, item_id, weekday, total, entry_count)
+            SELECT site_id, entry_date, item_id, MIN(weekday), SUM(quantity), COUNT(*)
+            FROM waste_entries
+            GROUP BY site_id, entry_date, item_id
+            """
+        )
+    if _column_type(cur, "plan_snapshots", "site_id") is None:
+        cur.execute("DROP TABLE IF EXISTS plan_snapshots")
+        _create(cur, dialect, models.PlanSnapshot.__table__)
+
+
+def _to_v4(cur, dialect) -> None:
+    if _column_type(cur, "period_item_totals", "grain") is None:
+        _create(cur, dialect, models.PeriodItemTotal.__table__)
+    cur.execute("DELETE FROM period_item_totals")
+    cur.execute(rollup.cube_fill_sql())
+
+
+def _to_v5(cur, dialect) -> None:
+    # Files rebuilt by _to_v1 / _to_v3 in this same upgrade already have these.
+    for table, column, kind in (
+        ("items", "seq", "INTEGER"),
+        ("waste_entries", "seq", "INTEGER"),
+        ("waste_entries", "client_id", "VARCHAR(64)"),
+    ):
+        if _column_type(cur, table, column) is None:
+            cur.execute(f"ALTER TABLE {table} ADD COLUMN {column} {kind}")
+    if _column_type(cur, "change_sequence", "seq") is None:
+        _create(cur, dialect, models.ChangeSequence.__table__)
+    for index in (*models.Item.__table__.indexes, *models.WasteEntry.__table__.indexes):
+        if index.name in ("ix_items_site_seq", "ix_waste_site_seq", "uq_waste_site_client"):
+            cur.execute(str(CreateIndex(index, if_not_exists=True).compile(dialect=dialect)))
+    for sql in changes.STAMP_SQL:
+        cur.execute(sql)
+
+
+def _to_v6(cur, dialect) -> None:
+    if _column_type(cur, "waste_archives", "month") is None:
+        _create(cur, dialect, models.WasteArchive.__table__)
+
+
+_STEPS = {1: _to_v1, 2: _to_v2, 3: _to_v3, 4: _to_v4, 5: _to_v5, 6: _to_v6}
+
+
+def version(engine: Engine) -> int:
+    """The file's PRAGMA user_version: one statement, no table inspection."""
+    with engine.connect() as conn:
+        return int(conn.exec_driver_sql("PRAGMA user_version").scalar_one())
+
+
+def upgrade(engine: Engine | None = None) -> int:
+    """Bring the file to SCHEMA_VERSION. Returns the version found before upgrading."""
+    engine = engine or db.engine
+    raw = engine.raw_connection()
+    try:
+        dbapi = raw.driver_connection
+        cur = dbapi.cursor()
+        found = _user_version(cur)
+        if found >= SCHEMA_VERSION:
+            return found
+
+        saved = dbapi.isolation_level
+        dbapi.isolation_level = None  # explicit BEGIN/COMMIT so the DDL is transactional too
+        try:
+            cur.execute("BEGIN IMMEDIATE")
+            try:
+                for step in range(found + 1, SCHEMA_VERSION + 1):
+                    _STEPS[step](cur, engine.dialect)
+                cur.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+                cur.execute("COMMIT")
+            except BaseException:
+                cur.execute("ROLLBACK")
+                raise
+            cur.execute("ANALYZE")
+        finally:
+            dbapi.isolation_level = saved
+        return found
+    finally:
+        raw.close()
+
+
+def ensure_schema(engine: Engine | None = None) -> int:
+    """Create missing tables, then migrate whatever was already there. Returns the version found.
+
+    A file already at SCHEMA_VERSION costs one PRAGMA read: create_all's
+    per-table checks only run on files that need them.
+    """
+    engine = engine or db.engine
+    found = version(engine)
+    if found >= SCHEMA_VERSION:
+        return found
+    Base.metadata.create_all(bind=engine)
+    return upgrade(engine)
+
+
+if __name__ == "__main__":
+    before = ensure_schema()
+    print(f"Schema version {before} -> {SCHEMA_VERSION}")
@@ -1,18 +1,86 @@
 from __future__ import annotations
 
-from sqlalchemy import String, Integer, Boolean, ForeignKey, Text, Float, Index
+from datetime import date
+from functools import lru_cache
+
+from sqlalchemy import String, Integer, SmallInteger, Boolean, ForeignKey, Text, Float, Index, UniqueConstraint, text
 from sqlalchemy.orm import Mapped, mapped_column, relationship
+from sqlalchemy.types import TypeDecorator
 
 from .db import Base
 
+# Rows written before sites existed belong here (see migrate._to_v3).
+DEFAULT_SITE_ID = 1
+
+
+class DayKey(TypeDecorator):
+    """A calendar day stored as the integer YYYYMMDD.
+
+    Python sees ISO "YYYY-MM-DD" strings both ways (date objects are accepted
+    too), so range predicates bind to integer compares on the index.
+    """
+
+    impl = Integer
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None or isinstance(value, int):
+            return value
+        if isinstance(value, date):
+            return value.year * 10000 + value.month * 100 + value.day
+        return int(value[0:4] + value[5:7] + value[8:10])
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        return _day_str(value)
+
+
+@lru_cache(maxsize=8192)
+def _day_str(value: int) -> str:
+    # A few hundred distinct days cover any real read, so formatting each once pays off.
+    return f"{value // 10000:04d}-{value // 100 % 100:02d}-{value % 100:02d}"
+
+
+def weekday_of(day) -> int:
+    """Monday=0 .. Sunday=6, as date.weekday(), for an ISO string, YYYYMMDD int or date."""
+    if isinstance(day, int):
+        return date(day // 10000, day // 100 % 100, day % 100).weekday()
+    if isinstance(day, str):
+        day = date.fromisoformat(day)
+    return day.weekday()
+
+
+def _weekday_default(context) -> int:
+    return weekday_of(context.get_current_parameters()["entry_date"])
+
+
+def _site_column():
+    return mapped_column(Integer, ForeignKey("sites.id"), nullable=False, server_default=text(str(DEFAULT_SITE_ID)))
+
+
+class Site(Base):
+    """A shop. In sharded mode only the main file's sites table is authoritative."""
+
+    __tablename__ = "sites"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    name: Mapped[str] = mapped_column(String(120), unique=True, nullable=False)
+
 
 class Item(Base):
     __tablename__ = "items"
+    # Names are unique per site; two shops may both sell a "Sausage Roll".
+    __table_args__ = (UniqueConstraint("site_id", "name", name="uq_items_site_name"),)
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
-    name: Mapped[str] = mapped_column(String(120), unique=True, nullable=False, index=True)
+    site_id: Mapped[int] = _site_column()
+    name: Mapped[str] = mapped_column(String(120), nullable=False)
     unit: Mapped[str] = mapped_column(String(20), nullable=False)  # "pieces" or "kg"
     is_active: Mapped[bool] = mapped_column(Boolean, default=True, nullable=False)
+    # Planner forecaster ("heuristic", "ses", "seasonal"); NULL means the default.
+    forecast_model: Mapped[str | None] = mapped_column(String(20), nullable=True)
+    seq: Mapped[int | None] = mapped_column(Integer, nullable=True)  # change seq of its last write (app.changes)
 
     waste_entries: Mapped[list["WasteEntry"]] = relationship(
         back_populates="item",
@@ -24,12 +92,121 @@ class WasteEntry(Base):
     __tablename__ = "waste_entries"
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
-    entry_date: Mapped[str] = mapped_column(String(10), nullable=False, index=True)  # YYYY-MM-DD
-    item_id: Mapped[int] = mapped_column(Integer, ForeignKey("items.id"), nullable=False, index=True)
+    site_id: Mapped[int] = _site_column()  # the item's site, copied so indexes can lead on it
+    entry_date: Mapped[str] = mapped_column(DayKey, nullable=False)  # YYYY-MM-DD in Python
+    weekday: Mapped[int] = mapped_column(SmallInteger, nullable=False, default=_weekday_default)  # Monday=0
+    item_id: Mapped[int] = mapped_column(Integer, ForeignKey("items.id"), nullable=False)
     quantity: Mapped[float] = mapped_column(Float, nullable=False)
     note: Mapped[str | None] = mapped_column(Text, nullable=True)
+    seq: Mapped[int | None] = mapped_column(Integer, nullable=True)  # change seq of its write (app.changes)
+    client_id: Mapped[str | None] = mapped_column(String(64), nullable=True)  # set by POST /sync/waste uploads
 
     item: Mapped[Item] = relationship(back_populates="waste_entries")
 
 
-Index("ix_waste_date_item", WasteEntry.entry_date, WasteEntry.item_id)
+# Every read is scoped to one site, so every index leads on it.
+# (site, date) ends in the rowid, which serves GET /waste's (entry_date, id) keyset order.
+Index("ix_waste_site_date", WasteEntry.site_id, WasteEntry.entry_date)
+# Covering indexes: range aggregates by date or by item are answered from the index alone.
+Index("ix_waste_site_date_item_qty", WasteEntry.site_id, WasteEntry.entry_date, WasteEntry.item_id, WasteEntry.quantity)
+Index("ix_waste_site_item_date_qty", WasteEntry.site_id, WasteEntry.item_id, WasteEntry.entry_date, WasteEntry.quantity)
+# GET /sync reads each table's changes in seq order; uploads are deduplicated on the client's id.
+Index("ix_items_site_seq", Item.site_id, Item.seq)
+Index("ix_waste_site_seq", WasteEntry.site_id, WasteEntry.seq)
+Index(
+    "uq_waste_site_client",
+    WasteEntry.site_id,
+    WasteEntry.client_id,
+    unique=True,
+    sqlite_where=WasteEntry.client_id.isnot(None),
+)
+
+
+class ChangeSequence(Base):
+    """The last change seq handed out in this file (see app.changes). One row, id 1."""
+
+    __tablename__ = "change_sequence"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    seq: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
+
+class DailyItemTotal(Base):
+    """Per-day, per-item rollup of waste_entries, kept in step by crud writes."""
+
+    __tablename__ = "daily_item_totals"
+    # Clustered on (site_id, entry_date, item_id), so a site's date-range reads need no rowid lookups.
+    __table_args__ = {"sqlite_with_rowid": False}
+
+    site_id: Mapped[int] = mapped_column(
+        Integer, ForeignKey("sites.id"), primary_key=True, server_default=text(str(DEFAULT_SITE_ID))
+    )
+    entry_date: Mapped[str] = mapped_column(DayKey, primary_key=True)  # YYYY-MM-DD in Python
+    item_id: Mapped[int] = mapped_column(Integer, ForeignKey("items.id"), primary_key=True)
+    weekday: Mapped[int] = mapped_column(SmallInteger, nullable=False, default=_weekday_default)  # Monday=0
+    total: Mapped[float] = mapped_column(Float, nullable=False, default=0.0)
+    entry_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
+
+Index(
+    "ix_daily_totals_site_item_date",
+    DailyItemTotal.site_id,
+    DailyItemTotal.item_id,
+    DailyItemTotal.entry_date,
+    DailyItemTotal.total,
+)
+
+
+class PeriodItemTotal(Base):
+    """daily_item_totals summed per ISO week, month and year, kept in step with it by app.rollup.
+
+    Long dashboard ranges are answered from a few of these buckets (see
+    services.dashboard._cover) plus the odd day at the edges.
+    """
+
+    __tablename__ = "period_item_totals"
+    __table_args__ = {"sqlite_with_rowid": False}
+
+    site_id: Mapped[int] = mapped_column(
+        Integer, ForeignKey("sites.id"), primary_key=True, server_default=text(str(DEFAULT_SITE_ID))
+    )
+    grain: Mapped[str] = mapped_column(String(5), primary_key=True)  # "week", "month" or "year"
+    period_start: Mapped[str] = mapped_column(DayKey, primary_key=True)  # Monday, 1st of month, 1 January
+    item_id: Mapped[int] = mapped_column(Integer, ForeignKey("items.id"), primary_key=True)
+    total: Mapped[float] = mapped_column(Float, nullable=False, default=0.0)
+    entry_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
+
+class WasteArchive(Base):
+    """A month of a site's waste_entries moved out to its own file by app.archive.
+
+    Its daily_item_totals and period_item_totals rows stay; readers of raw
+    entries read the file as well (archive.months).
+    """
+
+    __tablename__ = "waste_archives"
+
+    site_id: Mapped[int] = mapped_column(Integer, ForeignKey("sites.id"), primary_key=True)
+    month: Mapped[str] = mapped_column(DayKey, primary_key=True)  # the 1st of the month
+    file: Mapped[str] = mapped_column(String(64), nullable=False)  # name in the site's archive directory
+    entries: Mapped[int] = mapped_column(Integer, nullable=False)
+    max_seq: Mapped[int] = mapped_column(Integer, nullable=False)  # highest change seq in the file
+    archived_at: Mapped[str] = mapped_column(String(32), nullable=False)  # ISO 8601, UTC
+
+
+class PlanSnapshot(Base):
+    """A materialized /tomorrow-plan response, written by app.snapshots.
+
+    Valid while computed_on is today: writes that change a plan's inputs
+    delete the snapshots whose history window they touch.
+    """
+
+    __tablename__ = "plan_snapshots"
+
+    site_id: Mapped[int] = mapped_column(Integer, ForeignKey("sites.id"), primary_key=True)
+    target_date: Mapped[str] = mapped_column(DayKey, primary_key=True)
+    computed_on: Mapped[str] = mapped_column(DayKey, nullable=False)  # the "today" of its history window
+    history_start: Mapped[str] = mapped_column(DayKey, nullable=False)
+    history_end: Mapped[str] = mapped_column(DayKey, nullable=False)
+    computed_at: Mapped[str] = mapped_column(String(32), nullable=False)  # ISO 8601, UTC
+    payload: Mapped[str] = mapped_column(Text, nullable=False)  # TomorrowPlanOut JSON
@@ -0,0 +1,157 @@
+"""Conditional GET and the fast JSON path for the read endpoints.
+
+A read endpoint's ETag hashes the request URL, the data versions it reads
+(app.versions) and, for plans, today's date. Checking it costs a small
+file read per version and no query, so a poll that finds nothing changed
+is answered 304 with no body. The versions are read once per request
+(data_version) and the result cache (app.cache) checks its entries against
+the same tokens, so a body cached before a write, in this process or
+another, is never sent under the tag of a version after it.
+
+Full responses are the plain dicts and lists the services already build in
+the response schema's shape, encoded with orjson when it is installed (json
+otherwise) and returned as a Response, so FastAPI does not validate them
+against response_model again; the schemas still document them. Bodies of
+WASTE_HTTP_COMPRESS_MIN_BYTES or more are compressed, with brotli when the
+package is installed and the client takes it, gzip otherwise.
+"""
+from __future__ import annotations
+
+import gzip
+import hashlib
+import json
+from datetime import date
+from typing import Any, Awaitable, Callable, Iterable
+
+from fastapi import Request
+from fastapi.responses import Response
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+from . import versions
+from .sites import router
+from .versions import Versions
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+class HttpSettings(BaseSettings):
+    """Read response options, overridable with WASTE_HTTP_* environment variables."""
+
+    model_config = SettingsConfigDict(env_prefix="WASTE_HTTP_")
+
+    etags: bool = True
+    compress_min_bytes: int = 1024  # smaller bodies go out as they are
+    gzip_level: int = 5
+    brotli_quality: int = 4
+
+
+settings = HttpSettings()
+
+DATA = (versions.items, versions.waste)
+
+
+def _default(obj: Any) -> Any:
+    if hasattr(obj, "item"):  # NumPy scalars from the forecasters
+        return obj.item()
+    raise TypeError(f"{type(obj).__name__} is not JSON serializable")
+
+
+def dumps(obj: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj, default=_default, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(obj, default=_default, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def data_version(site_ids: Iterable[int], kinds: tuple[Versions, ...] = DATA) -> tuple[str, ...]:
+    """The sites' current version tokens of each kind, in order."""
+    return tuple(
+        kind.current(router.engine(site_id).url.database, site_id) for site_id in site_ids for kind in kinds
+    )
+
+
+def etag(request: Request, version: tuple[str, ...], daily: bool = False) -> str:
+    """A strong ETag for this URL at a data_version (and today, if daily)."""
+    h = hashlib.blake2b(digest_size=12)
+    h.update(f"{request.url.path}?{request.url.query}".encode())
+    for token in version:
+        h.update(f"|{token}".encode())
+    if daily:
+        h.update(f"|{date.today().isoformat()}".encode())
+    return f'"{h.hexdigest()}"'
+
+
+def _opaque(candidate: str) -> str:
+    # W/ and the -gzip / -br an encoded response adds do not change what the data is.
+    return candidate.strip().removeprefix("W/").strip('"').split("-")[0]
+
+
+def not_modified(request: Request, tag: str) -> Response | None:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return None
+    for candidate in header.split(","):
+        if candidate.strip() == "*" or _opaque(candidate) == tag.strip('"'):
+            return Response(status_code=304, headers={"ETag": candidate.strip(), "Cache-Control": "no-cache"})
+    return None
+
+
+def _coding(accept_encoding: str) -> str | None:
+    accepted = set()
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        if params.replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            accepted.add(name)
+    if brotli is not None and "br" in accepted:
+        return "br"
+    return "gzip" if "gzip" in accepted else None
+
+
+def json_response(request: Request, content: Any, tag: str | None = None) -> Response:
+    """content (or already-encoded JSON bytes) as a compressed-if-worth-it response."""
+    body = content if isinstance(content, bytes) else dumps(content)
+    headers = {"Vary": "Accept-Encoding"}
+    if tag is not None:
+        headers.update({"ETag": tag, "Cache-Control": "no-cache"})
+    coding = _coding(request.headers.get("accept-encoding", "")) if len(body) >= settings.compress_min_bytes else None
+    if coding == "br":
+        body = brotli.compress(body, quality=settings.brotli_quality)
+    elif coding == "gzip":
+        body = gzip.compress(body, compresslevel=settings.gzip_level, mtime=0)
+    if coding is not None:
+        headers["Content-Encoding"] = coding
+        if tag is not None:
+            headers["ETag"] = f'{tag[:-1]}-{coding}"'
+    return Response(body, media_type="application/json", headers=headers)
+
+
+def conditional(
+    request: Request, version: tuple[str, ...], compute: Callable[[], Any], daily: bool = False
+) -> Response:
+    """304 if the client's copy is current, otherwise compute() as a fast JSON response.
+
+    version is the data_version read before compute() runs (and handed to
+    the result cache with it): a write landing meanwhile can only make the
+    next request's tag differ, never pin a stale body to a new tag.
+    """
+    tag = etag(request, version, daily) if settings.etags else None
+    if tag is not None and (hit := not_modified(request, tag)) is not None:
+        return hit
+    return json_response(request, compute(), tag)
+
+
+async def conditional_async(
+    request: Request, version: tuple[str, ...], compute: Callable[[], Awaitable[Any]], daily: bool = False
+) -> Response:
+    """conditional for the async app."""
+    tag = etag(request, version, daily) if settings.etags else None
+    if tag is not None and (hit := not_modified(request, tag)) is not None:
+        return hit
+    return json_response(request, await compute(), tag)
@@ -0,0 +1,211 @@
+from __future__ import annotations
+
+from datetime import date, timedelta
+
+from sqlalchemy import select, func, delete, insert, text
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from . import db as storage
+from . import models
+from .archive import archives
+
+# Buckets of the period_item_totals cube, finest first.
+GRAINS = ("week", "month", "year")
+
+
+def period_start(grain: str, d: date) -> date:
+    """First day of the `grain` bucket holding d: its Monday, the 1st of its month, or 1 January."""
+    if grain == "week":
+        return d - timedelta(days=d.weekday())
+    if grain == "month":
+        return d.replace(day=1)
+    if grain == "year":
+        return d.replace(month=1, day=1)
+    raise ValueError(f"Unknown grain: {grain}")
+
+
+def _periods(entry_date: str) -> list[tuple[str, date]]:
+    d = date.fromisoformat(entry_date)
+    return [(grain, period_start(grain, d)) for grain in GRAINS]
+
+
+def _daily_upsert():
+    t = models.DailyItemTotal
+    stmt = sqlite_insert(t)
+    return stmt.on_conflict_do_update(
+        index_elements=[t.site_id, t.entry_date, t.item_id],
+        set_={"total": t.total + stmt.excluded.total, "entry_count": t.entry_count + stmt.excluded.entry_count},
+    )
+
+
+def _cube_upsert():
+    c = models.PeriodItemTotal
+    stmt = sqlite_insert(c)
+    return stmt.on_conflict_do_update(
+        index_elements=[c.site_id, c.grain, c.period_start, c.item_id],
+        set_={"total": c.total + stmt.excluded.total, "entry_count": c.entry_count + stmt.excluded.entry_count},
+    )
+
+
+def _delta_statements(site_id: int, entry_date: str, item_id: int, quantity: float, count: int) -> list:
+    t, c = models.DailyItemTotal, models.PeriodItemTotal
+    stmts = [
+        _daily_upsert().values(site_id=site_id, entry_date=entry_date, item_id=item_id, total=quantity, entry_count=count)
+    ]
+    for grain, start in _periods(entry_date):
+        stmts.append(
+            _cube_upsert().values(
+                site_id=site_id, grain=grain, period_start=start, item_id=item_id, total=quantity, entry_count=count
+            )
+        )
+    if count < 0:
+        stmts.append(
+            delete(t)
+            .where(t.site_id == site_id)
+            .where(t.entry_date == entry_date)
+            .where(t.item_id == item_id)
+            .where(t.entry_count <= 0)
+        )
+        for grain, start in _periods(entry_date):
+            stmts.append(
+                delete(c)
+                .where(c.site_id == site_id)
+                .where(c.grain == grain)
+                .where(c.period_start == start)
+                .where(c.item_id == item_id)
+                .where(c.entry_count <= 0)
+            )
+    return stmts
+
+
+def apply_delta(
+    db: Session, entry_date: str, item_id: int, quantity: float, count: int = 1, site_id: int = models.DEFAULT_SITE_ID
+) -> None:
+    """Fold a waste write into daily_item_totals and period_item_totals inside the caller's transaction.
+
+    Inserts pass (qty, 1); deletes pass (-qty, -1); edits are a delete of the
+    old values plus an insert of the new ones. The caller commits.
+    """
+    for stmt in _delta_statements(site_id, entry_date, item_id, quantity, count):
+        db.execute(stmt)
+
+
+async def apply_delta_async(
+    db: AsyncSession,
+    entry_date: str,
+    item_id: int,
+    quantity: float,
+    count: int = 1,
+    site_id: int = models.DEFAULT_SITE_ID,
+) -> None:
+    """apply_delta for an AsyncSession."""
+    for stmt in _delta_statements(site_id, entry_date, item_id, quantity, count):
+        await db.execute(stmt)
+
+
+def apply_deltas(
+    db: Session, deltas: dict[tuple[str, int], tuple[float, int]], site_id: int = models.DEFAULT_SITE_ID
+) -> None:
+    """Batch form of apply_delta for inserts: {(entry_date, item_id): (qty, count)}, one executemany per table."""
+    if not deltas:
+        return
+    db.execute(
+        _daily_upsert(),
+        [
+            {"site_id": site_id, "entry_date": d, "item_id": i, "total": qty, "entry_count": count}
+            for (d, i), (qty, count) in deltas.items()
+        ],
+    )
+    # Many days of a batch usually share a week, month and year: fold them first.
+    periods: dict[tuple[str, date, int], tuple[float, int]] = {}
+    for (d, item_id), (qty, count) in deltas.items():
+        for grain, start in _periods(d):
+            total, n = periods.get((grain, start, item_id), (0.0, 0))
+            periods[(grain, start, item_id)] = (total + qty, n + count)
+    db.execute(
+        _cube_upsert(),
+        [
+            {"site_id": site_id, "grain": g, "period_start": p, "item_id": i, "total": qty, "entry_count": count}
+            for (g, p, i), (qty, count) in periods.items()
+        ],
+    )
+
+
+def cube_fill_sql(where: str = "") -> str:
+    """INSERT filling period_item_totals from daily_item_totals (optionally filtered by `where`).
+
+    Plain SQL so migrations and site imports can run it on a raw cursor.
+    The week start comes from the stored weekday; day keys are YYYYMMDD integers.
+    """
+    week = (
+        "CAST(strftime('%Y%m%d', printf('%04d-%02d-%02d', entry_date / 10000, entry_date / 100 % 100, "
+        "entry_date % 100), '-' || weekday || ' days') AS INTEGER)"
+    )
+    starts = {"week": week, "month": "entry_date / 100 * 100 + 1", "year": "entry_date / 10000 * 10000 + 101"}
+    selects = " UNION ALL ".join(
+        f"SELECT site_id, '{grain}', {starts[grain]}, item_id, SUM(total), SUM(entry_count) "
+        f"FROM daily_item_totals {where} GROUP BY 1, 2, 3, 4"
+        for grain in GRAINS
+    )
+    return f"INSERT INTO period_item_totals (site_id, grain, period_start, item_id, total, entry_count) {selects}"
+
+
+def rebuild(db: Session) -> int:
+    """Recompute daily_item_totals and period_item_totals from waste_entries and the archived months.
+
+    Returns the number of daily rows.
+    """
+    db.execute(delete(models.DailyItemTotal))
+    db.execute(delete(models.PeriodItemTotal))
+    db.execute(
+        insert(models.DailyItemTotal).from_select(
+            ["site_id", "entry_date", "item_id", "weekday", "total", "entry_count"],
+            select(
+                models.WasteEntry.site_id,
+                models.WasteEntry.entry_date,
+                models.WasteEntry.item_id,
+                func.min(models.WasteEntry.weekday),  # constant within a day
+                func.sum(models.WasteEntry.quantity),
+                func.count(),
+            ).group_by(models.WasteEntry.site_id, models.WasteEntry.entry_date, models.WasteEntry.item_id),
+        )
+    )
+    # Archived months' entries are in their files; a day and item may be in both tiers.
+    for site_id in db.execute(select(models.WasteArchive.site_id).distinct()).scalars().all():
+        for month in archives.months(db, site_id):
+            db.execute(
+                _daily_upsert(),
+                [
+                    {"site_id": site_id, "entry_date": d, "item_id": i, "weekday": wd, "total": qty, "entry_count": n}
+                    for d, i, wd, qty, n in archives.daily(month)
+                ],
+            )
+    db.execute(text(cube_fill_sql()))
+    db.commit()
+    return int(db.execute(select(func.count()).select_from(models.DailyItemTotal)).scalar_one())
+
+
+def backfill_if_empty(db: Session) -> None:
+    """Populate the rollup for databases created before it existed."""
+    has_rollup = db.execute(select(models.DailyItemTotal.item_id).limit(1)).first() is not None
+    has_waste = db.execute(select(models.WasteEntry.id).limit(1)).first() is not None
+    if has_waste and not has_rollup:
+        rebuild(db)
+
+
+if __name__ == "__main__":
+    from .migrate import ensure_schema
+    from .sites import router
+
+    ensure_schema()
+    if router.sharded:
+        for site_id in router.sites():
+            with router.session(site_id) as db:
+                n = rebuild(db)
+            print(f"Rebuilt daily_item_totals for site {site_id}: {n} rows")
+    else:
+        with storage.SessionLocal() as db:
+            n = rebuild(db)
+        print(f"Rebuilt daily_item_totals: {n} rows")
@@ -0,0 +1,160 @@
+"""Keeps plan_snapshots filled for the next few days.
+
+Runs as an asyncio task inside the app (see app.lifespan), or on its own:
+
+    cd backend && python -m app.scheduler
+
+Snapshots are rebuilt in full after close of business, shortly after a waste
+or item write in this process drops them, and whenever a poll finds any of
+them missing (writes from other processes, the date rolling over). Each site
+is checked and rebuilt on its own, without holding up writers while the
+plans are computed (snapshots.materialize).
+
+With several workers on one database only one of them runs the schedule:
+the one holding a lock file next to it (<file>.scheduler.lock, flock). The
+others keep trying it at each poll, so one takes over if that worker exits.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from datetime import date, datetime, timedelta
+from typing import IO, Callable
+
+from pydantic_settings import BaseSettings, SettingsConfigDict
+from sqlalchemy.orm import Session
+
+from .sites import router
+from . import db as storage
+from . import migrate, snapshots
+
+try:
+    import fcntl
+except ImportError:  # no cross-process lock; run one scheduler per database
+    fcntl = None
+
+log = logging.getLogger(__name__)
+
+
+class PlanScheduleSettings(BaseSettings):
+    """Snapshot schedule, overridable with WASTE_PLAN_* environment variables."""
+
+    model_config = SettingsConfigDict(env_prefix="WASTE_PLAN_")
+
+    in_app: bool = True  # run the scheduler inside the API process
+    days: int = 7  # snapshot the plans for this many days after today
+    close_hour: int = 21  # local hour of the nightly full rebuild
+    poll_s: float = 30.0  # how often to look for missing snapshots
+    debounce_s: float = 2.0  # wait this long after a write for more to land
+
+
+class PlanScheduler:
+    def __init__(self, settings: PlanScheduleSettings, open_session: Callable[[int], Session] = router.session):
+        self.settings = settings
+        self.open_session = open_session
+        self.runs = 0
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._wake: asyncio.Event | None = None
+        self._lock: IO | None = None
+
+    def notify(self) -> None:
+        """Wake the loop; safe to call from any thread."""
+        if self._loop is not None and self._wake is not None:
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    def lead(self) -> bool:
+        """Whether this process runs the schedule: it holds the database's scheduler lock, or just took it."""
+        if self._lock is not None or fcntl is None or str(storage.settings.path) == ":memory:":
+            return True
+        lock = open(f"{storage.settings.path}.scheduler.lock", "w")
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock.close()
+            return False
+        self._lock = lock  # held until run() ends or the process exits
+        log.info("Plan scheduler running in this process")
+        return True
+
+    def _next_close(self, now: datetime) -> datetime:
+        close = now.replace(hour=self.settings.close_hour, minute=0, second=0, microsecond=0)
+        return close if close > now else close + timedelta(days=1)
+
+    def refresh(self, full: bool = False) -> int:
+        """Rebuild each site's snapshots if asked to or if any are missing. Returns how many were written."""
+        today = date.today()
+        written = 0
+        for site_id in router.sites(reload=True):
+            with self.open_session(site_id) as db:
+                if not full and not snapshots.missing(db, self.settings.days, today, site_id):
+                    continue
+                n = snapshots.materialize(db, self.settings.days, today, site_id)
+            written += n
+            log.info("Materialized %d plan snapshots for site %d on %s", n, site_id, today.isoformat())
+        if written:
+            self.runs += 1
+        return written
+
+    async def run(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        snapshots.listeners.append(self.notify)
+        try:
+            next_close = self._next_close(datetime.now())
+            full = False
+            while True:
+                try:
+                    if self.lead():
+                        await asyncio.to_thread(self.refresh, full)
+                except Exception:
+                    log.exception("Plan snapshot refresh failed")
+
+                now = datetime.now()
+                timeout = min(self.settings.poll_s, (next_close - now).total_seconds())
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout=max(timeout, 0.0))
+                    await asyncio.sleep(self.settings.debounce_s)
+                except asyncio.TimeoutError:
+                    pass
+                self._wake.clear()
+
+                full = datetime.now() >= next_close
+                if full:
+                    next_close = self._next_close(datetime.now())
+        finally:
+            snapshots.listeners.remove(self.notify)
+            if self._lock is not None:
+                self._lock.close()
+                self._lock = None
+
+
+def start(settings: PlanScheduleSettings | None = None) -> asyncio.Task:
+    """Start a PlanScheduler on the running loop."""
+    scheduler = PlanScheduler(settings or PlanScheduleSettings())
+    return asyncio.get_running_loop().create_task(scheduler.run(), name="plan-scheduler")
+
+
+async def stop(task: asyncio.Task) -> None:
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+
+
+@asynccontextmanager
+async def lifespan(app):
+    """FastAPI lifespan: run the scheduler alongside the app unless WASTE_PLAN_IN_APP=0."""
+    settings = PlanScheduleSettings()
+    task = start(settings) if settings.in_app else None
+    yield
+    if task is not None:
+        await stop(task)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    migrate.ensure_schema()
+    router.ensure_default()
+    asyncio.run(PlanScheduler(PlanScheduleSettings()).run())
@@ -4,13 +4,32 @@ from typing import Optional, Literal
 from pydantic import BaseModel, Field
 
 Unit = Literal["pieces", "kg"]
-DashboardView = Literal["day", "week", "month"]
+DashboardView = Literal["day", "week", "month", "quarter", "year", "range"]
+TrendGrain = Literal["day", "week", "month"]
+# Keys of app.services.forecast.FORECASTERS
+ForecastModel = Literal["heuristic", "ses", "seasonal"]
+# app.services.report.GROUPS and app.analytics.ENGINES
+ReportGroupBy = Literal["item", "day", "week", "month", "weekday"]
+ReportEngine = Literal["auto", "sqlite", "columnar"]
+
+
+class SiteCreate(BaseModel):
+    name: str = Field(min_length=1, max_length=120)
+
+
+class SiteOut(BaseModel):
+    id: int
+    name: str
+
+    class Config:
+        from_attributes = True
 
 
 class ItemCreate(BaseModel):
     name: str = Field(min_length=1, max_length=120)
     unit: Unit
     is_active: bool = True
+    forecast_model: ForecastModel | None = None
 
 
 class ItemUpdate(BaseModel):
@@ -18,6 +37,8 @@ class ItemUpdate(BaseModel):
     name: str = Field(min_length=1, max_length=120)
     unit: Unit
     is_active: bool
+    # Left unchanged when omitted; null resets it to the default.
+    forecast_model: ForecastModel | None = None
 
 
 class ItemOut(BaseModel):
@@ -25,6 +46,7 @@ class ItemOut(BaseModel):
     name: str
     unit: Unit
     is_active: bool
+    forecast_model: ForecastModel | None = None
 
     class Config:
         from_attributes = True
@@ -49,7 +71,43 @@ class WasteOut(BaseModel):
 
 class WasteListOut(BaseModel):
     rows: list[WasteOut]
-    total: int
+    total: int | None
+    next_cursor: str | None = None
+
+
+class WasteBulkError(BaseModel):
+    index: int
+    detail: str
+
+
+class WasteBulkOut(BaseModel):
+    inserted: int
+    errors: list[WasteBulkError]
+
+
+class WasteUpload(WasteCreate):
+    # Generated on the device (a UUID, say); sending the same one again never adds a second entry.
+    client_id: str = Field(min_length=1, max_length=64)
+
+
+class WasteUploadResult(BaseModel):
+    client_id: str
+    id: int | None
+    status: Literal["created", "duplicate", "rejected"]
+    detail: str | None = None
+
+
+class WasteUploadOut(BaseModel):
+    results: list[WasteUploadResult]  # one per uploaded row, in order
+
+
+class SyncOut(BaseModel):
+    since: int
+    until: int  # the next request's since
+    more: bool  # another batch is waiting; ask again straight away
+    columns: dict[str, list[str]]  # field names of the rows in items and waste
+    items: list[list]
+    waste: list[list]
 
 
 class ByItemPoint(BaseModel):
@@ -79,10 +137,50 @@ class DashboardOut(BaseModel):
     range_end: str
     total_waste: float
     by_item: list[ByItemPoint]
+    trend: list[TrendPoint]  # one point per trend_grain bucket, dated by its first day in range
+    trend_grain: TrendGrain = "day"
+    comparisons: list[Comparison]
+
+
+class SiteTotal(BaseModel):
+    site_id: int
+    site_name: str
+    total_waste: float
+
+
+class SitesDashboardOut(BaseModel):
+    view: DashboardView
+    anchor_date: str
+    range_start: str
+    range_end: str
+    total_waste: float
+    by_site: list[SiteTotal]
     trend: list[TrendPoint]
+    trend_grain: TrendGrain = "day"
     comparisons: list[Comparison]
 
 
+class WasteReportRow(BaseModel):
+    key: int | str  # the item id, the bucket's first day, or the weekday (Monday=0)
+    item_name: str | None = None  # group_by=item only
+    unit: Unit | None = None
+    total_waste: float
+    entries: int
+    mean_qty: float
+    min_qty: float
+    max_qty: float
+
+
+class WasteReportOut(BaseModel):
+    start_date: str
+    end_date: str
+    group_by: ReportGroupBy
+    engine: Literal["sqlite", "columnar"]
+    total_waste: float
+    entries: int
+    rows: list[WasteReportRow]
+
+
 class TomorrowPlanItem(BaseModel):
     item_id: int
     item_name: str
@@ -97,3 +195,22 @@ class TomorrowPlanItem(BaseModel):
 class TomorrowPlanOut(BaseModel):
     target_date: str
     items: list[TomorrowPlanItem]
+    computed_at: str | None = None  # ISO 8601, UTC
+    source: Literal["live", "snapshot"] = "live"
+
+
+class PlanMatrixItem(BaseModel):
+    item_id: int
+    item_name: str
+    unit: Unit
+
+    # One entry per date in PlanMatrixOut.dates
+    recommended_cook_qty: list[float]
+    confidence: list[Literal["low", "medium", "high"]]
+    history_points_used: list[int]
+
+
+class PlanMatrixOut(BaseModel):
+    start_date: str
+    dates: list[str]
+    items: list[PlanMatrixItem]
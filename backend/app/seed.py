@@ -5,12 +5,15 @@ from datetime import date, timedelta
 from sqlalchemy.orm import Session
 from sqlalchemy import select
 
-from .db import SessionLocal, Base, engine
-from . import models
+from .db import SessionLocal, engine
+from .sites import router
+from . import models, changes, rollup, migrate, versions
+from .catalog import catalog
 
 
 def seed():
-    Base.metadata.create_all(bind=engine)
+    migrate.ensure_schema(engine)
+    router.ensure_default()
     db: Session = SessionLocal()
     try:
         items = [
@@ -21,13 +24,15 @@ def seed():
             ("Chicken Curry", "kg"),
         ]
 
-        existing = {i.name: i for i in db.execute(select(models.Item)).scalars().all()}
+        site_items = select(models.Item).where(models.Item.site_id == models.DEFAULT_SITE_ID)
+        existing = {i.name: i for i in db.execute(site_items).scalars().all()}
         for name, unit in items:
             if name not in existing:
                 db.add(models.Item(name=name, unit=unit, is_active=True))
         db.commit()
+        catalog.bump(db, models.DEFAULT_SITE_ID)
 
-        all_items = list(db.execute(select(models.Item)).scalars().all())
+        all_items = list(db.execute(site_items).scalars().all())
 
         today = date.today()
         for days_back in range(0, 30):
@@ -43,6 +48,9 @@ def seed():
                     if qty > 0.05:
                         db.add(models.WasteEntry(entry_date=ds, item_id=item.id, quantity=round(qty, 2), note=None))
         db.commit()
+        changes.stamp(db)
+        rollup.rebuild(db)
+        versions.waste.bump(versions.database_of(db), models.DEFAULT_SITE_ID)
         print("Seed complete: items + last 30 days waste entries")
     finally:
         db.close()
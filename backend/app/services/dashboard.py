@@ -1,11 +1,22 @@
 from __future__ import annotations
 
+import asyncio
+import contextvars
+from bisect import bisect_left, bisect_right
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 from datetime import date, timedelta
+from functools import lru_cache
+from typing import AsyncContextManager, Callable, ContextManager
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from sqlalchemy import select, func
+from sqlalchemy import case, func, literal, null, select, union_all
 
 from .. import models
+from ..analytics import choose_engine, mirror
+from ..catalog import CatalogItem, catalog
+from ..rollup import GRAINS
+from ..versions import database_of
 
 
 @dataclass
@@ -38,66 +49,44 @@ def _month_range(anchor: date) -> Range:
     return Range(start=start, end=end)
 
 
-def _get_range(view: str, anchor: date) -> Range:
+def _quarter_range(anchor: date) -> Range:
+    start = anchor.replace(month=(anchor.month - 1) // 3 * 3 + 1, day=1)
+    end = _month_range(start.replace(month=start.month + 2)).end
+    return Range(start=start, end=end)
+
+
+def _year_range(anchor: date) -> Range:
+    return Range(start=anchor.replace(month=1, day=1), end=anchor.replace(month=12, day=31))
+
+
+def _get_range(view: str, anchor: date, start: date | None = None, end: date | None = None) -> Range:
     if view == "day":
         return _day_range(anchor)
     if view == "week":
         return _week_range(anchor)
     if view == "month":
         return _month_range(anchor)
-    raise ValueError("Invalid view (use day/week/month)")
-
-
-def _sum_waste(db: Session, start: date, end: date) -> float:
-    stmt = (
-        select(func.coalesce(func.sum(models.WasteEntry.quantity), 0.0))
-        .where(models.WasteEntry.entry_date >= start.isoformat())
-        .where(models.WasteEntry.entry_date <= end.isoformat())
-    )
-    return float(db.execute(stmt).scalar_one())
+    if view == "quarter":
+        return _quarter_range(anchor)
+    if view == "year":
+        return _year_range(anchor)
+    if view == "range":
+        if start is None or end is None or start > end:
+            raise ValueError("The range view needs start_date <= end_date")
+        return Range(start=start, end=end)
+    raise ValueError("Invalid view (use day/week/month/quarter/year/range)")
 
 
-def _sum_waste_by_item(db: Session, start: date, end: date):
-    stmt = (
-        select(
-            models.Item.id,
-            models.Item.name,
-            models.Item.unit,
-            func.coalesce(func.sum(models.WasteEntry.quantity), 0.0).label("total_waste"),
-        )
-        .join(models.WasteEntry, models.WasteEntry.item_id == models.Item.id)
-        .where(models.WasteEntry.entry_date >= start.isoformat())
-        .where(models.WasteEntry.entry_date <= end.isoformat())
-        .group_by(models.Item.id, models.Item.name, models.Item.unit)
-        .order_by(func.sum(models.WasteEntry.quantity).desc())
-    )
-    return db.execute(stmt).all()
-
-
-def _daily_trend(db: Session, start: date, end: date):
-    days = []
-    cur = start
-    while cur <= end:
-        days.append(cur)
-        cur += timedelta(days=1)
-
-    stmt = (
-        select(
-            models.WasteEntry.entry_date,
-            func.coalesce(func.sum(models.WasteEntry.quantity), 0.0).label("total_waste"),
-        )
-        .where(models.WasteEntry.entry_date >= start.isoformat())
-        .where(models.WasteEntry.entry_date <= end.isoformat())
-        .group_by(models.WasteEntry.entry_date)
-        .order_by(models.WasteEntry.entry_date.asc())
-    )
-    rows = {r[0]: float(r[1]) for r in db.execute(stmt).all()}
-
-    out = []
-    for d in days:
-        ds = d.isoformat()
-        out.append({"date": ds, "total_waste": float(rows.get(ds, 0.0))})
-    return out
+def trend_grain(view: str, r: Range) -> str:
+    """Bucket size of the trend: days up to a month or so, then weeks, then months."""
+    if view in ("day", "week", "month"):
+        return "day"
+    if view == "quarter":
+        return "week"
+    if view == "year":
+        return "month"
+    days = (r.end - r.start).days + 1
+    return "day" if days <= 62 else "week" if days <= 366 else "month"
 
 
 def _comparison(label: str, current: float, previous: float):
@@ -114,38 +103,510 @@ def _comparison(label: str, current: float, previous: float):
     }
 
 
-def build_dashboard(db: Session, view: str, anchor_date_str: str):
-    anchor = _parse(anchor_date_str)
-    r = _get_range(view, anchor)
-
-    total = _sum_waste(db, r.start, r.end)
-    by_item_rows = _sum_waste_by_item(db, r.start, r.end)
-    by_item = [
-        {"item_id": int(i), "item_name": n, "unit": u, "total_waste": float(t)}
-        for (i, n, u, t) in by_item_rows
-    ]
-    trend = _daily_trend(db, r.start, r.end)
-
-    comps = []
+def _comparison_ranges(anchor: date) -> list[tuple[str, Range, Range]]:
     yesterday = anchor - timedelta(days=1)
-    comps.append(_comparison("Today vs Yesterday", _sum_waste(db, anchor, anchor), _sum_waste(db, yesterday, yesterday)))
 
     this_w = _week_range(anchor)
     last_w = Range(start=this_w.start - timedelta(days=7), end=this_w.end - timedelta(days=7))
-    comps.append(_comparison("This Week vs Last Week", _sum_waste(db, this_w.start, this_w.end), _sum_waste(db, last_w.start, last_w.end)))
 
     this_m = _month_range(anchor)
     last_month_anchor = this_m.start - timedelta(days=1)
     last_m = _month_range(last_month_anchor)
-    comps.append(_comparison("This Month vs Last Month", _sum_waste(db, this_m.start, this_m.end), _sum_waste(db, last_m.start, last_m.end)))
 
+    return [
+        ("Today vs Yesterday", Range(anchor, anchor), Range(yesterday, yesterday)),
+        ("This Week vs Last Week", this_w, last_w),
+        ("This Month vs Last Month", this_m, last_m),
+    ]
+
+
+def dashboard_span(view: str, anchor: date, start: date | None = None, end: date | None = None) -> Range:
+    """Every date a dashboard for (view, anchor[, start, end]) reads from."""
+    ranges = [_get_range(view, anchor, start, end)]
+    for _, cur, prev in _comparison_ranges(anchor):
+        ranges += [cur, prev]
+    return Range(start=min(r.start for r in ranges), end=max(r.end for r in ranges))
+
+
+# ---- Reading: every range as a few pre-summed pieces ----
+
+Piece = tuple[str, str]  # (grain, ISO start): a day of daily_item_totals or a period_item_totals bucket
+
+
+@lru_cache(maxsize=4096)
+def _cover(start: date, end: date) -> tuple[Piece, ...]:
+    """[start, end] as whole years, months, ISO weeks and single days, largest first.
+
+    A week is only taken if it stays inside its month or the month it runs
+    into is not wholly in range, so months are not broken up for it.
+    """
+    out = []
+    d = start
+    while d <= end:
+        month = _month_range(d)
+        if d.month == 1 and d.day == 1 and d.replace(month=12, day=31) <= end:
+            out.append(("year", d.isoformat()))
+            d = d.replace(year=d.year + 1)
+        elif d.day == 1 and month.end <= end:
+            out.append(("month", d.isoformat()))
+            d = month.end + timedelta(days=1)
+        elif d.weekday() == 0 and d + timedelta(days=6) <= end and (
+            d + timedelta(days=6) <= month.end or _month_range(month.end + timedelta(days=1)).end > end
+        ):
+            out.append(("week", d.isoformat()))
+            d += timedelta(days=7)
+        else:
+            out.append(("day", d.isoformat()))
+            d += timedelta(days=1)
+    return tuple(out)
+
+
+def _buckets(r: Range, grain: str) -> list[Range]:
+    """r cut at `grain` boundaries (days, Mondays or 1sts of months)."""
+    out = []
+    d = r.start
+    while d <= r.end:
+        if grain == "day":
+            nxt = d + timedelta(days=1)
+        elif grain == "week":
+            nxt = d - timedelta(days=d.weekday()) + timedelta(days=7)
+        else:
+            nxt = _month_range(d).end + timedelta(days=1)
+        out.append(Range(d, min(nxt - timedelta(days=1), r.end)))
+        d = nxt
+    return out
+
+
+def _pieces_needed(anchor: date, r: Range, grain: str) -> set[Piece]:
+    ranges = [r, *_buckets(r, grain)]
+    for _, cur, prev in _comparison_ranges(anchor):
+        ranges += [cur, prev]
+    return {p for x in ranges for p in _cover(x.start, x.end)}
+
+
+def _pieces_union(pieces: set[Piece], site_id: int):
+    """Subquery (grain, period_start, item_id, total) over the pieces, from both rollup tables."""
+    t, c = models.DailyItemTotal, models.PeriodItemTotal
+    parts = []
+    days = sorted(p for g, p in pieces if g == "day")
+    if days:
+        parts.append(
+            select(literal("day").label("grain"), t.entry_date.label("period_start"), t.item_id, t.total)
+            .where(t.site_id == site_id)
+            .where(t.entry_date.in_(days))
+        )
+    for grain in GRAINS:
+        starts = sorted(p for g, p in pieces if g == grain)
+        if starts:
+            parts.append(
+                select(c.grain, c.period_start, c.item_id, c.total)
+                .where(c.site_id == site_id)
+                .where(c.grain == grain)
+                .where(c.period_start.in_(starts))
+            )
+    return union_all(*parts).subquery()
+
+
+def _items_stmt(pieces: set[Piece], site_id: int):
+    u = _pieces_union(pieces, site_id)
+    return select(u.c.grain, u.c.period_start, u.c.item_id, models.Item.name, models.Item.unit, u.c.total).join(
+        models.Item, models.Item.id == u.c.item_id
+    )
+
+
+def _payload(
+    view: str,
+    anchor: date,
+    r: Range,
+    grain: str,
+    by_item: dict[int, float],
+    names: dict[int, tuple[str, str]],
+    total: Callable[[Range], float],
+) -> dict:
+    ranked = sorted(by_item.items(), key=lambda kv: kv[1], reverse=True)
     return {
         "view": view,
         "anchor_date": anchor.isoformat(),
         "range_start": r.start.isoformat(),
         "range_end": r.end.isoformat(),
-        "total_waste": float(total),
-        "by_item": by_item,
-        "trend": trend,
-        "comparisons": comps,
+        "total_waste": float(total(r)),
+        "by_item": [
+            {"item_id": int(i), "item_name": names[i][0], "unit": names[i][1], "total_waste": float(t)}
+            for i, t in ranked
+        ],
+        "trend": [{"date": b.start.isoformat(), "total_waste": float(total(b))} for b in _buckets(r, grain)],
+        "trend_grain": grain,
+        "comparisons": [
+            _comparison(label, total(cur), total(prev)) for label, cur, prev in _comparison_ranges(anchor)
+        ],
     }
+
+
+def _assemble(view: str, anchor: date, r: Range, grain: str, rows):
+    """The dashboard from (grain, period_start, item_id, name, unit, total) piece rows."""
+    pieces: dict[Piece, list[tuple[int, float]]] = {}
+    items: dict[int, tuple[str, str]] = {}
+    for g, p, item_id, name, unit, total in rows:
+        pieces.setdefault((g, p), []).append((item_id, float(total)))
+        items.setdefault(item_id, (name, unit))
+
+    # Pieces are added oldest first with plain float sums, as report._fold adds days.
+    def total(x: Range) -> float:
+        return sum(t for p in _cover(x.start, x.end) for _, t in pieces.get(p, ()))
+
+    by_item: dict[int, float] = {}
+    for p in _cover(r.start, r.end):
+        for item_id, t in pieces.get(p, ()):
+            by_item[item_id] = by_item.get(item_id, 0.0) + t
+    return _payload(view, anchor, r, grain, by_item, items, total)
+
+
+# ---- Reading: views with a daily trend, from the entries themselves ----
+#
+# Pieces are running sums, so adding them up gives a slightly different float
+# from adding the entries. Views of up to two months or so (the day, week and
+# month views the dashboard always had) are instead summed in SQL over
+# waste_entries, every figure one SUM over its rows in index order, as the
+# per-range queries did: the same numbers to the last bit, from one scan.
+
+
+def _entry_ranges(anchor: date, r: Range, grain: str) -> list[tuple[date, date]]:
+    """(start, end) of the range, each trend bucket and each comparison period, without repeats."""
+    ranges = [r, *_buckets(r, grain)]
+    for _, cur, prev in _comparison_ranges(anchor):
+        ranges += [cur, prev]
+    return list(dict.fromkeys((x.start, x.end) for x in ranges))
+
+
+def _entries_stmt(site_id: int, r: Range, ranges: list[tuple[date, date]]):
+    """One statement: a row of (archived months, SUM per range), then (item, name, unit, SUM over r) per item.
+
+    Rows share columns (item_id, name, unit, archived, sum per range); a
+    shape leaves the other's NULL.
+    """
+    e, a, i = models.WasteEntry, models.WasteArchive, models.Item
+    lo, hi = min(s for s, _ in ranges), max(t for _, t in ranges)
+    archived = (
+        select(func.count())
+        .where(a.site_id == site_id)
+        .where(a.month >= lo.replace(day=1).isoformat())
+        .where(a.month <= hi.isoformat())
+        .scalar_subquery()
+    )
+    sums = [func.sum(case((e.entry_date.between(s.isoformat(), t.isoformat()), e.quantity))) for s, t in ranges]
+    totals = (
+        select(null(), null(), null(), archived, *sums)
+        .where(e.site_id == site_id)
+        .where(e.entry_date >= lo.isoformat())
+        .where(e.entry_date <= hi.isoformat())
+    )
+    per_item = (
+        select(i.id, i.name, i.unit, null(), func.sum(e.quantity), *[null()] * (len(ranges) - 1))
+        .join(e, e.item_id == i.id)
+        .where(e.site_id == site_id)
+        .where(e.entry_date >= r.start.isoformat())
+        .where(e.entry_date <= r.end.isoformat())
+        .group_by(i.id, i.name, i.unit)
+    )
+    return union_all(totals, per_item)
+
+
+def _from_entries(view: str, anchor: date, r: Range, grain: str, ranges: list[tuple[date, date]], rows) -> dict | None:
+    """The dashboard from _entries_stmt rows, or None if part of its span is archived (read the rollups then)."""
+    sums: dict[tuple[date, date], float] = {}
+    by_item: dict[int, float] = {}
+    names: dict[int, tuple[str, str]] = {}
+    for item_id, name, unit, archived, *totals in rows:
+        if item_id is None:
+            if archived:
+                return None
+            sums = {x: t or 0.0 for x, t in zip(ranges, totals)}
+        else:
+            by_item[item_id] = totals[0]
+            names[item_id] = (name, unit)
+    return _payload(view, anchor, r, grain, by_item, names, lambda x: sums[x.start, x.end])
+
+
+def _from_mirror(
+    database: str | None, site_id: int, view: str, anchor: date, r: Range, grain: str, items: dict[int, CatalogItem]
+) -> dict:
+    """The dashboard from the columnar mirror: item totals over the range, day totals over everything it shows.
+
+    Two grouped scans answer it with one row per item and one per day,
+    however many pieces times items the rollups would have returned.
+    """
+    span = dashboard_span(view, anchor, r.start, r.end)
+    per_item = mirror.scan(database, site_id, r.start.isoformat(), r.end.isoformat(), by_item=True)
+    per_day = sorted(mirror.scan(database, site_id, span.start.isoformat(), span.end.isoformat()))
+    days = [d for d, *_ in per_day]
+    day_totals = [t for _, t, *_ in per_day]
+
+    def total(x: Range) -> float:
+        lo, hi = bisect_left(days, x.start.isoformat()), bisect_right(days, x.end.isoformat())
+        return sum(day_totals[lo:hi])
+
+    by_item = {i: t for i, t, *_ in per_item if i in items}
+    names = {i: (items[i].name, items[i].unit) for i in by_item}
+    return _payload(view, anchor, r, grain, by_item, names, total)
+
+
+def build_dashboard(
+    db: Session,
+    view: str,
+    anchor_date_str: str,
+    site_id: int = models.DEFAULT_SITE_ID,
+    start: str | None = None,
+    end: str | None = None,
+    engine: str = "auto",
+):
+    anchor = _parse(anchor_date_str)
+    r = _get_range(view, anchor, start and _parse(start), end and _parse(end))
+    grain = trend_grain(view, r)
+    if choose_engine(r.start, r.end, engine) == "columnar":
+        mirror.refresh(db, site_id)
+        return _from_mirror(database_of(db), site_id, view, anchor, r, grain, catalog.items(db, site_id).by_id)
+    if grain == "day":
+        ranges = _entry_ranges(anchor, r, grain)
+        payload = _from_entries(view, anchor, r, grain, ranges, db.execute(_entries_stmt(site_id, r, ranges)).all())
+        if payload is not None:
+            return payload
+    # The view range, each trend bucket and every comparison period are read
+    # as whole weeks, months and years where they can be, in one query: a
+    # year view is a few dozen buckets per item rather than 365 days.
+    rows = db.execute(_items_stmt(_pieces_needed(anchor, r, grain), site_id)).all()
+    return _assemble(view, anchor, r, grain, rows)
+
+
+async def build_dashboard_async(
+    db: AsyncSession,
+    view: str,
+    anchor_date_str: str,
+    site_id: int = models.DEFAULT_SITE_ID,
+    start: str | None = None,
+    end: str | None = None,
+    engine: str = "auto",
+):
+    """build_dashboard for the async app: the read is awaited, the in-memory
+    pass runs in a worker thread so it does not hold up the event loop."""
+    anchor = _parse(anchor_date_str)
+    r = _get_range(view, anchor, start and _parse(start), end and _parse(end))
+    grain = trend_grain(view, r)
+    if choose_engine(r.start, r.end, engine) == "columnar":
+        await db.run_sync(mirror.refresh, site_id)
+        items = (await catalog.items_async(db, site_id)).by_id
+        return await asyncio.to_thread(_from_mirror, database_of(db), site_id, view, anchor, r, grain, items)
+    if grain == "day":
+        ranges = _entry_ranges(anchor, r, grain)
+        rows = (await db.execute(_entries_stmt(site_id, r, ranges))).all()
+        payload = _from_entries(view, anchor, r, grain, ranges, rows)
+        if payload is not None:
+            return payload
+    rows = (await db.execute(_items_stmt(_pieces_needed(anchor, r, grain), site_id))).all()
+    return await asyncio.to_thread(_assemble, view, anchor, r, grain, rows)
+
+
+# ---- Keeping a built dashboard current (app.live) ----
+
+Entry = tuple[str, int, str, str, float]  # (entry_date, item_id, item_name, unit, quantity)
+
+
+def _close(a: float, b: float) -> bool:
+    return abs(a - b) <= 1e-9 * max(1.0, abs(a), abs(b))
+
+
+def fold_entries(payload: dict, entries: list[Entry]) -> dict:
+    """The changes new waste entries make to a built dashboard, as a delta (see apply_delta).
+
+    Everything needed is in the payload itself: its range, trend bucket
+    dates and anchor (for the comparison periods). Values in the delta are
+    the new totals, not increments, so applying one twice is harmless.
+    """
+    start, end = payload["range_start"], payload["range_end"]
+    bucket_starts = [p["date"] for p in payload["trend"]]
+    anchor = _parse(payload["anchor_date"])
+    comparisons = {c["label"]: c for c in payload["comparisons"]}
+    rows = {row["item_id"]: row for row in payload["by_item"]}
+
+    total = payload["total_waste"]
+    items: dict[int, dict] = {}
+    trend: dict[str, dict] = {}
+    periods: dict[str, list[float]] = {}
+    for entry_date, item_id, name, unit, qty in entries:
+        if start <= entry_date <= end:
+            total += qty
+            row = items.get(item_id) or dict(
+                rows.get(item_id) or {"item_id": item_id, "item_name": name, "unit": unit, "total_waste": 0.0}
+            )
+            row["total_waste"] += qty
+            items[item_id] = row
+            b = bucket_starts[bisect_right(bucket_starts, entry_date) - 1]
+            point = trend.get(b) or dict(payload["trend"][bucket_starts.index(b)])
+            point["total_waste"] += qty
+            trend[b] = point
+        d = _parse(entry_date)
+        for label, cur, prev in _comparison_ranges(anchor):
+            in_cur, in_prev = cur.start <= d <= cur.end, prev.start <= d <= prev.end
+            if in_cur or in_prev:
+                c = comparisons[label]
+                totals = periods.setdefault(label, [c["current_total"], c["previous_total"]])
+                totals[0] += qty if in_cur else 0.0
+                totals[1] += qty if in_prev else 0.0
+
+    delta: dict = {}
+    if items:
+        delta["total_waste"] = total
+        delta["by_item"] = list(items.values())
+        delta["trend"] = list(trend.values())
+    if periods:
+        delta["comparisons"] = [_comparison(label, cur, prev) for label, (cur, prev) in periods.items()]
+    return delta
+
+
+def diff_dashboards(old: dict, new: dict) -> dict:
+    """A delta taking old to new (empty if they match), for changes that were not folded in."""
+    delta: dict = {}
+    for key, value in new.items():
+        if key in ("by_item", "trend", "comparisons"):
+            continue
+        before = old.get(key)
+        if isinstance(value, float) and isinstance(before, float) and _close(before, value):
+            continue
+        if before != value:
+            delta[key] = value
+
+    def changed(rows_old: list[dict], rows_new: list[dict], key: str) -> list[dict]:
+        by_key = {row[key]: row for row in rows_old}
+        out = []
+        for row in rows_new:
+            was = by_key.get(row[key])
+            if was is None or any(
+                not (_close(was[k], v) if isinstance(v, float) and isinstance(was[k], float) else was[k] == v)
+                for k, v in row.items()
+            ):
+                out.append(row)
+        return out
+
+    for key, match in (("by_item", "item_id"), ("trend", "date"), ("comparisons", "label")):
+        rows = changed(old[key], new[key], match)
+        if rows:
+            delta[key] = rows
+    removed = {row["item_id"] for row in old["by_item"]} - {row["item_id"] for row in new["by_item"]}
+    if removed:
+        delta["by_item_removed"] = sorted(removed)
+    return delta
+
+
+def apply_delta(payload: dict, delta: dict) -> dict:
+    """payload with a delta applied, as a new dict.
+
+    Top-level values are replaced; by_item, trend and comparisons rows replace
+    the row with the same item_id, date or label (new ones are added), and
+    by_item is ranked again. Clients of /dashboard/stream do the same.
+    """
+    rowed = ("by_item", "trend", "comparisons", "by_item_removed")
+    out = {**payload, **{k: v for k, v in delta.items() if k not in rowed}}
+    for key, match in (("by_item", "item_id"), ("trend", "date"), ("comparisons", "label")):
+        if key in delta:
+            rows = {row[match]: row for row in payload[key]}
+            rows.update((row[match], row) for row in delta[key])
+            out[key] = list(rows.values())
+    if "by_item_removed" in delta:
+        gone = set(delta["by_item_removed"])
+        out["by_item"] = [row for row in out["by_item"] if row["item_id"] not in gone]
+    if "by_item" in delta or "by_item_removed" in delta:
+        out["by_item"].sort(key=lambda row: row["total_waste"], reverse=True)
+    if "trend" in delta:
+        out["trend"].sort(key=lambda p: p["date"])
+    return out
+
+
+# ---- Across sites ----
+
+FANOUT_WORKERS = 8
+
+
+def _site_pieces_stmt(pieces: set[Piece], site_id: int):
+    """(grain, period_start, total) per piece for one site: the cross-site view needs no per-item rows."""
+    u = _pieces_union(pieces, site_id)
+    return select(u.c.grain, u.c.period_start, func.sum(u.c.total)).group_by(u.c.grain, u.c.period_start)
+
+
+def _combine(view: str, anchor: date, r: Range, grain: str, sites: dict[int, str], per_site: list[dict[Piece, float]]):
+    """One dashboard from each site's piece totals, with a per-site total breakdown."""
+    def total(x: Range, of: list[dict[Piece, float]] = per_site) -> float:
+        return sum(site_pieces.get(p, 0.0) for p in _cover(x.start, x.end) for site_pieces in of)
+
+    by_site = [
+        {"site_id": site_id, "site_name": sites[site_id], "total_waste": float(total(r, [site_pieces]))}
+        for site_id, site_pieces in zip(sites, per_site)
+    ]
+    by_site.sort(key=lambda s: s["total_waste"], reverse=True)
+    return {
+        "view": view,
+        "anchor_date": anchor.isoformat(),
+        "range_start": r.start.isoformat(),
+        "range_end": r.end.isoformat(),
+        "total_waste": float(total(r)),
+        "by_site": by_site,
+        "trend": [{"date": b.start.isoformat(), "total_waste": float(total(b))} for b in _buckets(r, grain)],
+        "trend_grain": grain,
+        "comparisons": [
+            _comparison(label, total(cur), total(prev)) for label, cur, prev in _comparison_ranges(anchor)
+        ],
+    }
+
+
+def build_sites_dashboard(
+    sites: dict[int, str],
+    view: str,
+    anchor_date_str: str,
+    open_session: Callable[[int], ContextManager[Session]],
+    workers: int = FANOUT_WORKERS,
+    start: str | None = None,
+    end: str | None = None,
+):
+    """One dashboard over several sites ({site_id: name}).
+
+    Each site is read through its own session (open_session(site_id), so
+    sharded sites hit their own file) on a pool of up to `workers` threads;
+    SQLite releases the GIL while it reads, so the per-site queries overlap.
+    Pieces are summed over items in SQL, so a site costs a few dozen rows
+    whatever the view.
+    """
+    anchor = _parse(anchor_date_str)
+    r = _get_range(view, anchor, start and _parse(start), end and _parse(end))
+    grain = trend_grain(view, r)
+    pieces = _pieces_needed(anchor, r, grain)
+
+    def one(site_id: int) -> dict[Piece, float]:
+        with open_session(site_id) as db:
+            return {(g, p): float(t) for g, p, t in db.execute(_site_pieces_stmt(pieces, site_id))}
+
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(sites)))) as pool:
+        # Each task runs in a copy of the caller's context, so per-request
+        # state (app.metrics) follows the reads onto the pool.
+        per_site = [f.result() for f in [pool.submit(contextvars.copy_context().run, one, s) for s in sites]]
+    return _combine(view, anchor, r, grain, sites, per_site)
+
+
+async def build_sites_dashboard_async(
+    sites: dict[int, str],
+    view: str,
+    anchor_date_str: str,
+    open_session: Callable[[int], AsyncContextManager[AsyncSession]],
+    start: str | None = None,
+    end: str | None = None,
+):
+    """build_sites_dashboard for the async app: the per-site reads are gathered."""
+    anchor = _parse(anchor_date_str)
+    r = _get_range(view, anchor, start and _parse(start), end and _parse(end))
+    grain = trend_grain(view, r)
+    pieces = _pieces_needed(anchor, r, grain)
+
+    async def one(site_id: int) -> dict[Piece, float]:
+        async with open_session(site_id) as db:
+            result = await db.execute(_site_pieces_stmt(pieces, site_id))
+            return {(g, p): float(t) for g, p, t in result}
+
+    per_site = await asyncio.gather(*(one(site_id) for site_id in sites))
+    return await asyncio.to_thread(_combine, view, anchor, r, grain, sites, list(per_site))
@@ -0,0 +1,128 @@
+"""Waste over any date range, grouped by item, day, week, month or weekday (GET /reports/waste).
+
+Besides totals, each group has per-entry statistics (entry count, mean,
+smallest and largest entry), which the rollups do not keep, so a report
+reads the entries themselves. Two engines give the same answer:
+
+    sqlite     GROUP BY over the covering (site, date, item, quantity) index,
+               and over the month files of archived months (app.archive)
+    columnar   the Parquet mirror (app.analytics)
+
+engine="auto" takes the mirror for ranges of WASTE_ANALYTICS_MIN_DAYS days
+or more when it is enabled, SQLite otherwise (analytics.choose_engine).
+Either way the entries are first summed per day (or per item), and the
+days folded into weeks, months or weekdays here, oldest first. Totals are
+plain float sums, never rounded, the rule the dashboard follows too.
+"""
+from __future__ import annotations
+
+from datetime import date, timedelta
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from .. import models
+from ..analytics import choose_engine, mirror
+from ..archive import archives
+from ..catalog import catalog
+
+GROUPS = ("item", "day", "week", "month", "weekday")
+
+Part = tuple  # (entry_date ISO or item_id, total, count, min, max)
+
+
+def _sqlite_parts(
+    db: Session, site_id: int, start: str, end: str, item_id: int | None, by_item: bool
+) -> list[Part]:
+    w = models.WasteEntry
+    key = w.item_id if by_item else w.entry_date
+    stmt = (
+        select(key, func.sum(w.quantity), func.count(), func.min(w.quantity), func.max(w.quantity))
+        .where(w.site_id == site_id, w.entry_date >= start, w.entry_date <= end)
+        .group_by(key)
+    )
+    if item_id:
+        stmt = stmt.where(w.item_id == item_id)
+    months = archives.months(db, site_id, start, end)
+    parts = [tuple(row) for row in db.execute(stmt).all()]
+    # A day or item in both tiers gives two parts; _fold adds them up.
+    for month in months:
+        parts += archives.parts(month, start, end, item_id, by_item)
+    return parts
+
+
+def _group_key(group_by: str, day: str):
+    if group_by == "day":
+        return day
+    d = date.fromisoformat(day)
+    if group_by == "week":
+        return (d - timedelta(days=d.weekday())).isoformat()
+    if group_by == "month":
+        return d.replace(day=1).isoformat()
+    return d.weekday()
+
+
+def _fold(parts: list[Part], group_by: str) -> dict:
+    groups: dict = {}
+    # In key order, so a group adds up the same however its days are split between the two tiers.
+    for key, total, count, lo, hi in sorted(parts, key=lambda part: part[0]):
+        k = key if group_by == "item" else _group_key(group_by, key)
+        if k in groups:
+            g_total, g_count, g_lo, g_hi = groups[k]
+            groups[k] = (g_total + total, g_count + count, min(g_lo, lo), max(g_hi, hi))
+        else:
+            groups[k] = (total, count, lo, hi)
+    return groups
+
+
+def build_report(
+    db: Session,
+    start: str,
+    end: str,
+    group_by: str = "day",
+    item_id: int | None = None,
+    site_id: int = models.DEFAULT_SITE_ID,
+    engine: str = "auto",
+) -> dict:
+    """A WasteReportOut for [start, end]. Raises ValueError for an empty range or an unavailable engine."""
+    if group_by not in GROUPS:
+        raise ValueError(f"Invalid group_by (use {'/'.join(GROUPS)})")
+    if start > end:
+        raise ValueError("start_date must be on or before end_date")
+    used = choose_engine(date.fromisoformat(start), date.fromisoformat(end), engine)
+    by_item = group_by == "item"
+    if used == "columnar":
+        parts = mirror.aggregate(db, site_id, start, end, item_id, by_item)
+    else:
+        parts = _sqlite_parts(db, site_id, start, end, item_id, by_item)
+    groups = _fold(parts, group_by)
+
+    items = catalog.items(db, site_id).by_id if by_item else {}
+    rows = []
+    for key, (total, count, lo, hi) in groups.items():
+        item = items.get(key)
+        rows.append(
+            {
+                "key": key,
+                "item_name": item.name if item is not None else None,
+                "unit": item.unit if item is not None else None,
+                "total_waste": float(total),
+                "entries": int(count),
+                "mean_qty": float(total) / count,
+                "min_qty": float(lo),
+                "max_qty": float(hi),
+            }
+        )
+    if by_item:
+        rows.sort(key=lambda r: (-r["total_waste"], r["key"]))
+    else:
+        rows.sort(key=lambda r: r["key"])
+    return {
+        "start_date": start,
+        "end_date": end,
+        "group_by": group_by,
+        "engine": used,
+        "total_waste": float(sum(r["total_waste"] for r in rows)),
+        "entries": sum(r["entries"] for r in rows),
+        "rows": rows,
+    }
@@ -1,17 +1,24 @@
 from __future__ import annotations
 
+import asyncio
 from dataclasses import dataclass
-from datetime import date, timedelta
+from datetime import date, datetime, timedelta, timezone
+from typing import Iterable
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from sqlalchemy import select, func
 
 from .. import models
+from . import forecast
+from .forecast import FALLBACK_DAYS
 
 # Waste-only conversion assumption:
 # We assume "waste is about 15% of cooked quantity".
 # Then cooked ~= waste / 0.15.
 ASSUMED_WASTE_RATE = 0.15  # 15%
 
+HISTORY_DAYS = 90
+
 
 @dataclass
 class Stats:
@@ -19,54 +26,86 @@ class Stats:
     n: int
 
 
-def _weekday_average_last_n(db: Session, item_id: int, target_weekday: int, n_occurrences: int = 4) -> Stats:
-    today = date.today()
-    start = today - timedelta(days=90)
-
-    stmt = (
-        select(models.WasteEntry.entry_date, func.sum(models.WasteEntry.quantity))
-        .where(models.WasteEntry.item_id == item_id)
-        .where(models.WasteEntry.entry_date >= start.isoformat())
-        .where(models.WasteEntry.entry_date <= today.isoformat())
-        .group_by(models.WasteEntry.entry_date)
-        .order_by(models.WasteEntry.entry_date.desc())
+def history_span(today: date) -> tuple[date, date]:
+    """Every date a plan computed on `today` reads from."""
+    return today - timedelta(days=HISTORY_DAYS), today
+
+
+def weekday_stats(
+    start: date,
+    end: date,
+    n_occurrences: int = 4,
+    weekday: int | Iterable[int] | None = None,
+    site_id: int = models.DEFAULT_SITE_ID,
+):
+    """Subquery (item_id, weekday, avg, n): mean of each of a site's items' last
+    n_occurrences daily totals per weekday in [start, end], ranked and averaged in SQL.
+
+    weekday may be one weekday, several, or None for all seven (up to 7 rows per item).
+    """
+    t = models.DailyItemTotal
+    rn = func.row_number().over(partition_by=(t.item_id, t.weekday), order_by=t.entry_date.desc())
+    ranked = (
+        select(t.item_id, t.weekday, t.total, rn.label("rn"))
+        .where(t.site_id == site_id)
+        .where(t.entry_date >= start.isoformat())
+        .where(t.entry_date <= end.isoformat())
+    )
+    if isinstance(weekday, int):
+        ranked = ranked.where(t.weekday == weekday)
+    elif weekday is not None:
+        wanted = sorted(set(weekday))
+        if len(wanted) < 7:
+            ranked = ranked.where(t.weekday.in_(wanted))
+    ranked = ranked.subquery()
+    return (
+        select(
+            ranked.c.item_id,
+            ranked.c.weekday,
+            func.avg(ranked.c.total).label("avg"),
+            func.count().label("n"),
+        )
+        .where(ranked.c.rn <= n_occurrences)
+        .group_by(ranked.c.item_id, ranked.c.weekday)
+        .subquery()
     )
-    rows = db.execute(stmt).all()
-
-    vals: list[float] = []
-    for d_str, total in rows:
-        d = date.fromisoformat(d_str)
-        if d.weekday() == target_weekday:
-            vals.append(float(total))
-            if len(vals) >= n_occurrences:
-                break
-
-    if not vals:
-        return Stats(avg=0.0, n=0)
-    return Stats(avg=sum(vals) / len(vals), n=len(vals))
-
-
-def _average_last_days(db: Session, item_id: int, days: int = 14) -> Stats:
-    end = date.today()
-    start = end - timedelta(days=days - 1)
-
-    stmt = (
-        select(func.coalesce(func.sum(models.WasteEntry.quantity), 0.0))
-        .where(models.WasteEntry.item_id == item_id)
-        .where(models.WasteEntry.entry_date >= start.isoformat())
-        .where(models.WasteEntry.entry_date <= end.isoformat())
+
+
+def recent_totals(since: date, end: date, site_id: int = models.DEFAULT_SITE_ID):
+    """Subquery (item_id, total, n): each of a site's items' summed daily totals in [since, end]."""
+    t = models.DailyItemTotal
+    return (
+        select(t.item_id, func.sum(t.total).label("total"), func.count().label("n"))
+        .where(t.site_id == site_id)
+        .where(t.entry_date >= since.isoformat())
+        .where(t.entry_date <= end.isoformat())
+        .group_by(t.item_id)
+        .subquery()
     )
-    total = float(db.execute(stmt).scalar_one())
-    avg = total / float(days)
-
-    n_stmt = (
-        select(func.count(func.distinct(models.WasteEntry.entry_date)))
-        .where(models.WasteEntry.item_id == item_id)
-        .where(models.WasteEntry.entry_date >= start.isoformat())
-        .where(models.WasteEntry.entry_date <= end.isoformat())
+
+
+def _plan_inputs_stmt(target_weekday: int, today: date, site_id: int):
+    """One row per active item, by name: (id, name, unit, model, wd_avg, wd_n, recent_total, recent_n)."""
+    start, end = history_span(today)
+    wd = weekday_stats(start, end, n_occurrences=4, weekday=target_weekday, site_id=site_id)
+    fb = recent_totals(today - timedelta(days=FALLBACK_DAYS - 1), end, site_id)
+    return (
+        select(
+            models.Item.id,
+            models.Item.name,
+            models.Item.unit,
+            models.Item.forecast_model,
+            wd.c.avg,
+            wd.c.n,
+            fb.c.total,
+            fb.c.n,
+        )
+        .outerjoin(wd, wd.c.item_id == models.Item.id)
+        .outerjoin(fb, fb.c.item_id == models.Item.id)
+        .where(models.Item.site_id == site_id)
+        .where(models.Item.is_active.is_(True))
+        .order_by(models.Item.name.asc())
     )
-    n = int(db.execute(n_stmt).scalar_one())
-    return Stats(avg=avg, n=n)
 
 
 def _confidence(used_points: int) -> str:
@@ -95,41 +134,219 @@ def _apply_minimum(unit: str, qty: float) -> float:
     return float(max(0.1, qty))
 
 
-def build_tomorrow_plan(db: Session, target_date: date):
-    items = db.execute(
-        select(models.Item).where(models.Item.is_active.is_(True)).order_by(models.Item.name.asc())
-    ).scalars().all()
+def _cook_qty(unit: str, pred_waste: float) -> float:
+    # Convert predicted waste -> cook qty using assumed waste rate
+    if pred_waste <= 0:
+        cook = 0.0
+    else:
+        cook = pred_waste / ASSUMED_WASTE_RATE
+
+    cook = _apply_minimum(unit, cook)
+    cook = _round_qty(unit, cook)
+    return float(cook)
+
 
+def _recommend(unit: str, wd: Stats, recent_total: float, recent_n: int) -> tuple[float, int]:
+    """(cook qty, history points used) from the weekday stats, else the fallback window."""
+    if wd.n >= 2:
+        pred_waste = wd.avg
+        used = wd.n
+    else:
+        fb = Stats(avg=recent_total / float(FALLBACK_DAYS), n=recent_n)
+        pred_waste = fb.avg
+        used = fb.n
+    return _cook_qty(unit, pred_waste), int(used)
+
+
+def _models(rows, model: str | None) -> dict[int, str]:
+    """Item id -> forecaster for items that need one other than the SQL heuristic.
+
+    A model named in the request applies to every item; otherwise each item's
+    own forecast_model, defaulting to the heuristic.
+    """
+    out = {}
+    for row in rows:
+        name = model or row[3] or forecast.DEFAULT_MODEL
+        if name != forecast.DEFAULT_MODEL:
+            out[row[0]] = name
+    return out
+
+
+def _forecast(hist: forecast.History, by_item: dict[int, str], targets: list[date]):
+    """Item id -> (predicted waste, points used) per target, one vectorized pass per model."""
+    groups: dict[str, list[int]] = {}
+    for item_id, name in by_item.items():
+        groups.setdefault(name, []).append(item_id)
+    out = {}
+    for name, item_ids in groups.items():
+        sub = hist.subset(item_ids)
+        pred, used = forecast.get_forecaster(name).predict(sub, targets)
+        for k, item_id in enumerate(sub.item_ids.tolist()):
+            out[item_id] = (pred[k].tolist(), used[k].tolist())
+    return out
+
+
+def _plan(rows, target_date: date, forecasts=None):
+    forecasts = forecasts or {}
     out_items = []
-    for item in items:
-        wd = _weekday_average_last_n(db, item.id, target_date.weekday(), n_occurrences=4)
-        if wd.n >= 2:
-            pred_waste = wd.avg
-            used = wd.n
+    for item_id, name, unit, _, wd_avg, wd_n, recent_total, recent_n in rows:
+        if item_id in forecasts:
+            pred, n = forecasts[item_id]
+            cook, used = _cook_qty(unit, pred[0]), int(n[0])
         else:
-            fb = _average_last_days(db, item.id, days=14)
-            pred_waste = fb.avg
-            used = fb.n
+            wd = Stats(avg=float(wd_avg or 0.0), n=int(wd_n or 0))
+            cook, used = _recommend(unit, wd, float(recent_total or 0.0), int(recent_n or 0))
+        out_items.append(
+            {
+                "item_id": item_id,
+                "item_name": name,
+                "unit": unit,
+                "target_date": target_date.isoformat(),
+                "recommended_cook_qty": cook,
+                "confidence": _confidence(used),
+                "history_points_used": used,
+            }
+        )
 
-        # Convert predicted waste -> cook qty using assumed waste rate
-        if pred_waste <= 0:
-            cook = 0.0
-        else:
-            cook = pred_waste / ASSUMED_WASTE_RATE
+    return {
+        "target_date": target_date.isoformat(),
+        "items": out_items,
+        "computed_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "source": "live",
+    }
 
-        cook = _apply_minimum(item.unit, cook)
-        cook = _round_qty(item.unit, cook)
 
+def _plan_range_inputs_stmt(weekdays: set[int], today: date, site_id: int):
+    """Like _plan_inputs_stmt but for several weekdays: a row per active item and
+    weekday with history (one with weekday NULL if the item has none)."""
+    start, end = history_span(today)
+    wd = weekday_stats(start, end, n_occurrences=4, weekday=weekdays, site_id=site_id)
+    fb = recent_totals(today - timedelta(days=FALLBACK_DAYS - 1), end, site_id)
+    return (
+        select(
+            models.Item.id,
+            models.Item.name,
+            models.Item.unit,
+            models.Item.forecast_model,
+            wd.c.weekday,
+            wd.c.avg,
+            wd.c.n,
+            fb.c.total,
+            fb.c.n,
+        )
+        .outerjoin(wd, wd.c.item_id == models.Item.id)
+        .outerjoin(fb, fb.c.item_id == models.Item.id)
+        .where(models.Item.site_id == site_id)
+        .where(models.Item.is_active.is_(True))
+        .order_by(models.Item.name.asc(), models.Item.id.asc())
+    )
+
+
+def _weekdays(start: date, days: int) -> set[int]:
+    return {(start.weekday() + k) % 7 for k in range(min(days, 7))}
+
+
+def _dates(start: date, days: int) -> list[date]:
+    return [start + timedelta(days=k) for k in range(days)]
+
+
+def _plan_range(rows, start: date, days: int, forecasts=None):
+    forecasts = forecasts or {}
+    dates = _dates(start, days)
+
+    items: dict[int, dict] = {}
+    for item_id, name, unit, _, weekday, wd_avg, wd_n, recent_total, recent_n in rows:
+        it = items.get(item_id)
+        if it is None:
+            it = items[item_id] = {
+                "name": name,
+                "unit": unit,
+                "weekdays": {},
+                "recent": (float(recent_total or 0.0), int(recent_n or 0)),
+            }
+        if weekday is not None:
+            it["weekdays"][weekday] = Stats(avg=float(wd_avg), n=int(wd_n))
+
+    out_items = []
+    for item_id, it in items.items():
+        qty, conf, used = [], [], []
+        for k, d in enumerate(dates):
+            if item_id in forecasts:
+                pred, points = forecasts[item_id]
+                cook, n = _cook_qty(it["unit"], pred[k]), int(points[k])
+            else:
+                wd = it["weekdays"].get(d.weekday(), Stats(avg=0.0, n=0))
+                cook, n = _recommend(it["unit"], wd, *it["recent"])
+            qty.append(cook)
+            conf.append(_confidence(n))
+            used.append(n)
         out_items.append(
             {
-                "item_id": item.id,
-                "item_name": item.name,
-                "unit": item.unit,
-                "target_date": target_date.isoformat(),
-                "recommended_cook_qty": float(cook),
-                "confidence": _confidence(int(used)),
-                "history_points_used": int(used),
+                "item_id": item_id,
+                "item_name": it["name"],
+                "unit": it["unit"],
+                "recommended_cook_qty": qty,
+                "confidence": conf,
+                "history_points_used": used,
             }
         )
 
-    return {"target_date": target_date.isoformat(), "items": out_items}
+    return {"start_date": start.isoformat(), "dates": [d.isoformat() for d in dates], "items": out_items}
+
+
+def build_tomorrow_plan(db: Session, target_date: date, model: str | None = None, site_id: int = models.DEFAULT_SITE_ID):
+    # Same-weekday averages and the fallback window are ranked and averaged
+    # in SQL, so one row per active item comes back. Items on another
+    # forecaster get their history loaded as a matrix and predicted in NumPy.
+    today = date.today()
+    rows = db.execute(_plan_inputs_stmt(target_date.weekday(), today, site_id)).all()
+    by_item = _models(rows, model)
+    forecasts = None
+    if by_item:
+        hist = forecast.load_history(db, list(by_item), *history_span(today), site_id=site_id)
+        forecasts = _forecast(hist, by_item, [target_date])
+    return _plan(rows, target_date, forecasts)
+
+
+async def build_tomorrow_plan_async(
+    db: AsyncSession, target_date: date, model: str | None = None, site_id: int = models.DEFAULT_SITE_ID
+):
+    """build_tomorrow_plan for the async app; the per-item pass runs in a worker thread."""
+    today = date.today()
+    rows = (await db.execute(_plan_inputs_stmt(target_date.weekday(), today, site_id))).all()
+    by_item = _models(rows, model)
+    forecasts = None
+    if by_item:
+        hist = await forecast.load_history_async(db, list(by_item), *history_span(today), site_id=site_id)
+        forecasts = await asyncio.to_thread(_forecast, hist, by_item, [target_date])
+    return await asyncio.to_thread(_plan, rows, target_date, forecasts)
+
+
+def build_plan_range(db: Session, start: date, days: int, model: str | None = None, site_id: int = models.DEFAULT_SITE_ID):
+    """Plans for `days` consecutive dates from `start` as an items x dates matrix.
+
+    Each entry matches build_tomorrow_plan for that date; the history is read
+    once, ranking only the weekdays the range covers, so two weeks cost the
+    same as one and a week costs one SQL pass rather than seven.
+    """
+    today = date.today()
+    rows = db.execute(_plan_range_inputs_stmt(_weekdays(start, days), today, site_id)).all()
+    by_item = _models(rows, model)
+    forecasts = None
+    if by_item:
+        hist = forecast.load_history(db, list(by_item), *history_span(today), site_id=site_id)
+        forecasts = _forecast(hist, by_item, _dates(start, days))
+    return _plan_range(rows, start, days, forecasts)
+
+
+async def build_plan_range_async(
+    db: AsyncSession, start: date, days: int, model: str | None = None, site_id: int = models.DEFAULT_SITE_ID
+):
+    today = date.today()
+    rows = (await db.execute(_plan_range_inputs_stmt(_weekdays(start, days), today, site_id))).all()
+    by_item = _models(rows, model)
+    forecasts = None
+    if by_item:
+        hist = await forecast.load_history_async(db, list(by_item), *history_span(today), site_id=site_id)
+        forecasts = await asyncio.to_thread(_forecast, hist, by_item, _dates(start, days))
+    return await asyncio.to_thread(_plan_range, rows, start, days, forecasts)
@@ -0,0 +1,163 @@
+from __future__ import annotations
+
+import csv
+import heapq
+import io
+import itertools
+import json
+from typing import Iterator
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from .. import crud, models
+from ..archive import Month, archives, segments
+from ..catalog import catalog
+
+BATCH_ROWS = 5000
+
+COLUMNS = ["id", "entry_date", "item_id", "item_name", "unit", "quantity", "note"]
+
+MEDIA_TYPES = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+
+def require_format(fmt: str) -> None:
+    """Fail before streaming starts if the format needs an optional package that is missing."""
+    if fmt == "parquet":
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise ValueError("Parquet export needs pyarrow installed")
+
+
+def _hot_stmt(start_date: str | None, end_date: str | None, item_id: int | None, site_id: int):
+    stmt = (
+        select(
+            models.WasteEntry.id,
+            models.WasteEntry.entry_date,
+            models.WasteEntry.item_id,
+            models.Item.name,
+            models.Item.unit,
+            models.WasteEntry.quantity,
+            models.WasteEntry.note,
+        )
+        .outerjoin(models.Item, models.Item.id == models.WasteEntry.item_id)
+        .order_by(models.WasteEntry.entry_date.asc(), models.WasteEntry.id.asc())
+    )
+    return crud.filter_waste(stmt, start_date, end_date, item_id, site_id)
+
+
+def _archived_rows(db: Session, month: Month, start: str, end: str, item_id: int | None, site_id: int) -> Iterator[tuple]:
+    """An archived month's rows oldest first: its file merged with any entries written into it since."""
+    items = catalog.items(db, site_id).by_id
+    late = [tuple(r) for r in db.execute(_hot_stmt(start, end, item_id, site_id)).all()]
+    cold = (
+        (e_id, day, i_id, *((items[i_id].name, items[i_id].unit) if i_id in items else (None, None)), qty, note)
+        for e_id, day, _, i_id, qty, note, _, _ in archives.entries(month, start, end, item_id)
+    )
+    return heapq.merge(late, cold, key=lambda r: (r[1], r[0]))
+
+
+def _batches(
+    db: Session, start_date: str | None, end_date: str | None, item_id: int | None, site_id: int
+) -> Iterator[list[tuple]]:
+    """Rows oldest first, BATCH_ROWS at a time off one open cursor per span of the range.
+
+    A range reaching into archived months (app.archive) is read span by span.
+    """
+    for lo, hi, month in segments(start_date, end_date, archives.months(db, site_id, start_date, end_date)):
+        if month is None:
+            result = db.execute(_hot_stmt(lo, hi, item_id, site_id).execution_options(yield_per=BATCH_ROWS))
+            for part in result.partitions():
+                yield [tuple(r) for r in part]
+        else:
+            rows = _archived_rows(db, month, lo, hi, item_id, site_id)
+            while batch := list(itertools.islice(rows, BATCH_ROWS)):
+                yield batch
+
+
+def _csv(batches: Iterator[list[tuple]]) -> Iterator[bytes]:
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(COLUMNS)
+    for rows in batches:
+        writer.writerows(rows)
+        yield buf.getvalue().encode()
+        buf.seek(0)
+        buf.truncate()
+    if buf.tell():
+        yield buf.getvalue().encode()
+
+
+def _ndjson(batches: Iterator[list[tuple]]) -> Iterator[bytes]:
+    for rows in batches:
+        yield "".join(json.dumps(dict(zip(COLUMNS, r))) + "\n" for r in rows).encode()
+
+
+def _parquet(batches: Iterator[list[tuple]]) -> Iterator[bytes]:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema(
+        [
+            ("id", pa.int64()),
+            ("entry_date", pa.string()),
+            ("item_id", pa.int64()),
+            ("item_name", pa.string()),
+            ("unit", pa.string()),
+            ("quantity", pa.float64()),
+            ("note", pa.string()),
+        ]
+    )
+    # One row group per batch; the sink hands on whatever the writer has flushed.
+    sink = _DrainSink()
+    with pq.ParquetWriter(sink, schema) as writer:
+        for rows in batches:
+            writer.write_table(pa.Table.from_pylist([dict(zip(COLUMNS, r)) for r in rows], schema=schema))
+            yield sink.drain()
+    yield sink.drain()
+
+
+class _DrainSink(io.RawIOBase):
+    """Write-only file whose buffered bytes can be taken out; tell() keeps the running
+    offset, which the Parquet footer records."""
+
+    def __init__(self):
+        self._chunks: list[bytes] = []
+        self._pos = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, b) -> int:
+        data = bytes(b)
+        self._chunks.append(data)
+        self._pos += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._pos
+
+    def drain(self) -> bytes:
+        out = b"".join(self._chunks)
+        self._chunks.clear()
+        return out
+
+
+_WRITERS = {"csv": _csv, "ndjson": _ndjson, "parquet": _parquet}
+
+
+def stream_waste(
+    db: Session,
+    fmt: str,
+    start_date: str | None,
+    end_date: str | None,
+    item_id: int | None,
+    site_id: int = models.DEFAULT_SITE_ID,
+) -> Iterator[bytes]:
+    """Encoded export chunks; memory stays at one batch whatever the row count."""
+    return _WRITERS[fmt](_batches(db, start_date, end_date, item_id, site_id))
@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+import csv
+import io
+import json
+from dataclasses import dataclass
+
+from pydantic import ValidationError
+
+from .. import schemas
+
+CSV_FIELDS = ["entry_date", "item_id", "quantity", "note"]
+
+
+@dataclass(frozen=True)
+class Unparsed:
+    """A row that could not be parsed (an NDJSON line that is not JSON).
+
+    parse_rows keeps it in place so validate_rows reports it at its index
+    and the other rows still go in.
+    """
+
+    detail: str
+
+
+def _ndjson_row(line: str) -> dict | Unparsed:
+    try:
+        return json.loads(line)
+    except json.JSONDecodeError as e:
+        return Unparsed(f"Invalid JSON: {e.msg} (column {e.colno})")
+
+
+def parse_rows(body: bytes, content_type: str) -> list[dict | Unparsed]:
+    """Raw row dicts from a JSON array, NDJSON or CSV (with header) body.
+
+    An NDJSON line that is not JSON becomes an Unparsed row rather than
+    failing the whole body.
+    """
+    media = content_type.split(";")[0].strip().lower()
+    text = body.decode("utf-8-sig")
+
+    if media in ("", "application/json"):
+        rows = json.loads(text)
+        if not isinstance(rows, list):
+            raise ValueError("Expected a JSON array of waste entries")
+        return rows
+
+    if media in ("application/x-ndjson", "application/ndjson", "application/jsonl"):
+        return [_ndjson_row(line) for line in text.splitlines() if line.strip()]
+
+    if media == "text/csv":
+        reader = csv.DictReader(io.StringIO(text))
+        missing = [f for f in CSV_FIELDS[:3] if f not in (reader.fieldnames or [])]
+        if missing:
+            raise ValueError(f"CSV header missing: {', '.join(missing)}")
+        return [{k: (v or None) if k == "note" else v for k, v in row.items() if k in CSV_FIELDS} for row in reader]
+
+    raise LookupError(f"Unsupported content type: {media}")
+
+
+def validate_rows(raw: list) -> tuple[list[tuple[int, schemas.WasteCreate]], list[tuple[int, str]]]:
+    """Validate each row on its own; returns (index, row) pairs and (index, message) errors."""
+    valid: list[tuple[int, schemas.WasteCreate]] = []
+    errors: list[tuple[int, str]] = []
+    for idx, row in enumerate(raw):
+        if isinstance(row, Unparsed):
+            errors.append((idx, row.detail))
+            continue
+        try:
+            valid.append((idx, schemas.WasteCreate.model_validate(row)))
+        except ValidationError as e:
+            first = e.errors()[0]
+            where = ".".join(str(p) for p in first["loc"])
+            errors.append((idx, f"{where}: {first['msg']}" if where else first["msg"]))
+    return valid, errors
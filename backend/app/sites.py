@@ -0,0 +1,316 @@
+"""Sites (shops) and where their data lives.
+
+By default every site shares the main SQLite file and rows are scoped by
+site_id. With WASTE_DB_SHARD_DIR set, each site gets its own file there
+(site-<id>.sqlite, created on first use) and the main file keeps only the
+sites table. Either way, code asks `router` for a session by site.
+
+    cd backend && python -m app.sites list
+    cd backend && python -m app.sites add "Dun Laoghaire"
+    cd backend && python -m app.sites import "Dun Laoghaire" /path/to/that/shop/data.sqlite
+"""
+from __future__ import annotations
+
+import argparse
+import shutil
+import sqlite3
+import tempfile
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+
+from fastapi import Depends, HTTPException, Query
+from sqlalchemy import func, insert, select
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+
+from . import db as storage
+from . import changes, migrate, models, rollup, versions
+from .db import StorageSettings, make_async_engine, make_engine
+from .catalog import catalog
+
+
+@dataclass
+class _Shard:
+    engine: Engine
+    read_engine: Engine
+    async_engine: AsyncEngine
+    async_read_engine: AsyncEngine
+    session: sessionmaker[Session]
+    read_session: sessionmaker[Session]
+    async_session: async_sessionmaker[AsyncSession]
+    async_read_session: async_sessionmaker[AsyncSession]
+
+
+class SiteRouter:
+    """Session factories per site, plus the site registry in the main file."""
+
+    def __init__(self, settings: StorageSettings):
+        self.settings = settings
+        self._shards: dict[int, _Shard] = {}
+        self._sites: dict[int, str] | None = None
+        self._lock = threading.Lock()
+
+    @property
+    def sharded(self) -> bool:
+        return self.settings.shard_dir is not None
+
+    def shard_path(self, site_id: int) -> Path:
+        return Path(self.settings.shard_dir) / f"site-{site_id}.sqlite"
+
+    def _shard(self, site_id: int) -> _Shard:
+        shard = self._shards.get(site_id)
+        if shard is not None:
+            return shard
+        with self._lock:
+            shard = self._shards.get(site_id)
+            if shard is None:
+                self.shard_path(site_id).parent.mkdir(parents=True, exist_ok=True)
+                settings = self.settings.model_copy(update={"path": self.shard_path(site_id)})
+                engine = make_engine(settings)
+                migrate.ensure_schema(engine)
+                read_engine = make_engine(settings, readonly=True)
+                async_engine = make_async_engine(settings)
+                async_read_engine = make_async_engine(settings, readonly=True)
+                shard = _Shard(
+                    engine,
+                    read_engine,
+                    async_engine,
+                    async_read_engine,
+                    sessionmaker(autocommit=False, autoflush=False, bind=engine),
+                    sessionmaker(autocommit=False, autoflush=False, bind=read_engine),
+                    async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False),
+                    async_sessionmaker(async_read_engine, autoflush=False, expire_on_commit=False),
+                )
+                self._shards[site_id] = shard
+        return shard
+
+    def engine(self, site_id: int) -> Engine:
+        return self._shard(site_id).engine if self.sharded else storage.engine
+
+    def session(self, site_id: int, readonly: bool = False) -> Session:
+        if not self.sharded:
+            return (storage.ReadSessionLocal if readonly else storage.SessionLocal)()
+        shard = self._shard(site_id)
+        return (shard.read_session if readonly else shard.session)()
+
+    def async_session(self, site_id: int, readonly: bool = False) -> AsyncSession:
+        if not self.sharded:
+            return (storage.AsyncReadSessionLocal if readonly else storage.AsyncSessionLocal)()
+        shard = self._shard(site_id)
+        return (shard.async_read_session if readonly else shard.async_session)()
+
+    # ---- Registry (always the main file) ----
+
+    def sites(self, reload: bool = False) -> dict[int, str]:
+        """{site_id: name}, cached until a miss or a create."""
+        if self._sites is None or reload:
+            with storage.SessionLocal() as db:
+                rows = db.execute(select(models.Site.id, models.Site.name).order_by(models.Site.id)).all()
+            self._sites = {site_id: name for site_id, name in rows}
+        return self._sites
+
+    def require(self, site_id: int) -> None:
+        # Another process may have added the site since the registry was cached.
+        if site_id not in self.sites() and site_id not in self.sites(reload=True):
+            raise LookupError("Site not found")
+
+    def create(self, name: str, site_id: int | None = None) -> models.Site:
+        with storage.SessionLocal() as db:
+            site = models.Site(id=site_id, name=name.strip())
+            db.add(site)
+            db.commit()
+            db.refresh(site)
+        self._sites = None
+        if self.sharded:
+            self._shard(site.id)
+        return site
+
+    def ensure_default(self) -> None:
+        """Give a fresh install its one site, so single-shop clients work unchanged."""
+        if not self.sites(reload=True):
+            with storage.SessionLocal() as db:
+                db.execute(insert(models.Site).prefix_with("OR IGNORE"), [{"id": models.DEFAULT_SITE_ID, "name": "Main"}])
+                db.commit()
+            self._sites = None
+
+    def dispose(self) -> None:
+        for shard in self._shards.values():
+            shard.engine.dispose()
+            shard.read_engine.dispose()
+        self._shards.clear()
+
+
+router = SiteRouter(storage.settings)
+
+
+# ---- FastAPI dependencies: ?site_id=, defaulting to the original single site ----
+
+
+def site_param(site_id: int = Query(models.DEFAULT_SITE_ID, ge=1)) -> int:
+    try:
+        router.require(site_id)
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return site_id
+
+
+def sites_param(site_ids: list[int] | None = Query(None, alias="site_id")) -> dict[int, str]:
+    """?site_id=1&site_id=3 on cross-site routes: {site_id: name}, every site when omitted.
+
+    Served from the cached registry, reloaded (as site_param does) only when
+    an id asked for is not in it; a site another process adds is listed here
+    once this one reloads (a miss, a create, GET /sites).
+    """
+    known = router.sites()
+    if site_ids and not known.keys() >= set(site_ids):
+        known = router.sites(reload=True)
+    if not site_ids:
+        return dict(known)
+    unknown = [s for s in site_ids if s not in known]
+    if unknown:
+        raise HTTPException(status_code=404, detail=f"Site not found: {unknown[0]}")
+    return {s: known[s] for s in sorted(set(site_ids))}
+
+
+def get_site_db(site_id: int = Depends(site_param)):
+    db = router.session(site_id)
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def get_site_read_db(site_id: int = Depends(site_param)):
+    db = router.session(site_id, readonly=True)
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+async def get_async_site_db(site_id: int = Depends(site_param)):
+    async with router.async_session(site_id) as db:
+        yield db
+
+
+async def get_async_site_read_db(site_id: int = Depends(site_param)):
+    async with router.async_session(site_id, readonly=True) as db:
+        yield db
+
+
+# ---- Importing a single-shop database ----
+
+
+def import_site(name: str, source: Path, from_site: int = models.DEFAULT_SITE_ID) -> tuple[int, int, int]:
+    """Copy one site's items and waste from another database file into a new site.
+
+    The source is copied (with SQLite's backup API, so a WAL file is included)
+    and migrated in the copy; item ids are remapped by name. Returns
+    (site id, items, entries). Raises ValueError if the source site has
+    archived months (app.archive).
+    """
+    tmp = Path(tempfile.mkdtemp(prefix="waste-import-")) / "source.sqlite"
+    try:
+        with sqlite3.connect(source) as src, sqlite3.connect(tmp) as dst:
+            src.backup(dst)
+        src_engine = make_engine(StorageSettings(path=tmp))
+        migrate.ensure_schema(src_engine)
+        with src_engine.connect() as conn:
+            archived = conn.execute(
+                select(func.count()).select_from(models.WasteArchive).where(models.WasteArchive.site_id == from_site)
+            ).scalar_one()
+        src_engine.dispose()
+        if archived:
+            # Only waste_entries is copied below; the months in the source's archive files would be lost.
+            raise ValueError(f"{source} has {archived} archived months for site {from_site}; import it before archiving")
+
+        site = router.create(name)
+        raw = router.engine(site.id).raw_connection()
+        try:
+            dbapi = raw.driver_connection
+            saved = dbapi.isolation_level
+            dbapi.isolation_level = None
+            cur = dbapi.cursor()
+            cur.execute("ATTACH DATABASE ? AS src", (str(tmp),))
+            try:
+                cur.execute("BEGIN IMMEDIATE")
+                try:
+                    params = {"site": site.id, "from": from_site}
+                    n_items = cur.execute(
+                        """
+                        INSERT INTO items (site_id, name, unit, is_active, forecast_model)
+                        SELECT :site, name, unit, is_active, forecast_model FROM src.items WHERE site_id = :from
+                        """,
+                        params,
+                    ).rowcount
+                    n_entries = cur.execute(
+                        """
+                        INSERT INTO waste_entries (site_id, entry_date, weekday, item_id, quantity, note)
+                        SELECT :site, w.entry_date, w.weekday, i.id, w.quantity, w.note
+                        FROM src.waste_entries w
+                        JOIN src.items s ON s.id = w.item_id
+                        JOIN items i ON i.site_id = :site AND i.name = s.name
+                        WHERE w.site_id = :from
+                        ORDER BY w.entry_date, w.id
+                        """,
+                        params,
+                    ).rowcount
+                    cur.execute(
+                        """
+                        INSERT INTO daily_item_totals (site_id, entry_date, item_id, weekday, total, entry_count)
+                        SELECT site_id, entry_date, item_id, MIN(weekday), SUM(quantity), COUNT(*)
+                        FROM waste_entries WHERE site_id = :site
+                        GROUP BY site_id, entry_date, item_id
+                        """,
+                        params,
+                    )
+                    cur.execute(rollup.cube_fill_sql("WHERE site_id = :site"), params)
+                    for sql in changes.STAMP_SQL:
+                        cur.execute(sql)
+                    cur.execute("COMMIT")
+                except BaseException:
+                    cur.execute("ROLLBACK")
+                    raise
+            finally:
+                cur.execute("DETACH DATABASE src")
+                dbapi.isolation_level = saved
+        finally:
+            raw.close()
+        with router.session(site.id) as db:
+            catalog.bump(db, site.id)
+            versions.waste.bump(versions.database_of(db), site.id)
+        return site.id, n_items, n_entries
+    finally:
+        shutil.rmtree(tmp.parent, ignore_errors=True)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Manage sites")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("list")
+    add = sub.add_parser("add")
+    add.add_argument("name")
+    imp = sub.add_parser("import", help="create a site from another (single-shop) database file")
+    imp.add_argument("name")
+    imp.add_argument("source", type=Path)
+    imp.add_argument("--from-site", type=int, default=models.DEFAULT_SITE_ID)
+    args = parser.parse_args()
+
+    migrate.ensure_schema(storage.engine)
+    router.ensure_default()
+    if args.command == "list":
+        for site_id, name in router.sites().items():
+            where = router.shard_path(site_id) if router.sharded else storage.DB_PATH
+            print(f"{site_id:>4}  {name}  ({where})")
+    elif args.command == "add":
+        site = router.create(args.name)
+        print(f"Added site {site.id}: {site.name}")
+    else:
+        site_id, n_items, n_entries = import_site(args.name, args.source, args.from_site)
+        print(f"Imported {n_items} items and {n_entries} entries into site {site_id}")
+
+
+if __name__ == "__main__":
+    main()
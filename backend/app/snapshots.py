@@ -0,0 +1,143 @@
+from __future__ import annotations
+
+from datetime import date, datetime, timedelta, timezone
+from typing import Callable
+
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from . import changes, models, schemas
+
+# Called after a commit that dropped snapshots (see app.scheduler).
+listeners: list[Callable[[], None]] = []
+
+
+def notify() -> None:
+    for listener in listeners:
+        listener()
+
+
+def _invalidate_stmt(site_id: int, start: str | None = None, end: str | None = None):
+    """A site's snapshots whose history window overlaps [start, end]; all of them without a span."""
+    stmt = delete(models.PlanSnapshot).where(models.PlanSnapshot.site_id == site_id)
+    if start is not None:
+        stmt = stmt.where(models.PlanSnapshot.history_start <= end).where(models.PlanSnapshot.history_end >= start)
+    return stmt
+
+
+def invalidate(db: Session, site_id: int, start: str | None = None, end: str | None = None) -> None:
+    """Drop the snapshots a write to [start, end] at a site makes stale, inside the caller's transaction.
+
+    Without a span (item changes) every snapshot for the site goes. The
+    caller commits, then calls notify().
+    """
+    db.execute(_invalidate_stmt(site_id, start, end))
+
+
+async def invalidate_async(db: AsyncSession, site_id: int, start: str | None = None, end: str | None = None) -> None:
+    """invalidate for an AsyncSession."""
+    await db.execute(_invalidate_stmt(site_id, start, end))
+
+
+def _load_stmt(target: date, today: date, site_id: int):
+    return (
+        select(models.PlanSnapshot.payload)
+        .where(models.PlanSnapshot.site_id == site_id)
+        .where(models.PlanSnapshot.target_date == target.isoformat())
+        .where(models.PlanSnapshot.computed_on == today.isoformat())
+    )
+
+
+def load(db: Session, target: date, today: date, site_id: int = models.DEFAULT_SITE_ID) -> str | None:
+    """The stored TomorrowPlanOut JSON for target at a site as computed today, if still valid."""
+    return db.execute(_load_stmt(target, today, site_id)).scalar_one_or_none()
+
+
+async def load_async(db: AsyncSession, target: date, today: date, site_id: int = models.DEFAULT_SITE_ID) -> str | None:
+    return (await db.execute(_load_stmt(target, today, site_id))).scalar_one_or_none()
+
+
+def missing(db: Session, days: int, today: date | None = None, site_id: int = models.DEFAULT_SITE_ID) -> bool:
+    """True if any of a site's next `days` plans has no valid snapshot."""
+    today = today or date.today()
+    have = db.execute(
+        select(func.count())
+        .select_from(models.PlanSnapshot)
+        .where(models.PlanSnapshot.site_id == site_id)
+        .where(models.PlanSnapshot.computed_on == today.isoformat())
+        .where(models.PlanSnapshot.target_date > today.isoformat())
+        .where(models.PlanSnapshot.target_date <= (today + timedelta(days=days)).isoformat())
+    ).scalar_one()
+    return have < days
+
+
+def materialize(db: Session, days: int, today: date | None = None, site_id: int = models.DEFAULT_SITE_ID) -> int:
+    """Replace a site's plan_snapshots with its default plans for the `days` dates after today.
+
+    The plans are computed in a read transaction, so writers do not wait on
+    the planner; only the swap takes the write lock. A write committed in
+    between has already dropped the snapshots it made stale and moved the
+    change sequence (app.changes) on, which every crud write takes inside
+    its transaction: if the head is no longer the one the plans were read
+    at, nothing is written, and that write's notify() brings the next run.
+    Returns the number of snapshots written.
+    """
+    # The planner brings NumPy; importing it here keeps crud (which only
+    # needs invalidate) light to import.
+    from .services.tomorrow_plan import build_plan_range, history_span
+
+    today = today or date.today()
+    h_start, h_end = history_span(today)
+    # One snapshot for the head and every read behind the plans.
+    db.connection().exec_driver_sql("BEGIN")
+    try:
+        head = changes.head(db)
+        plan = build_plan_range(db, today + timedelta(days=1), days, site_id=site_id)
+        computed_at = datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+        rows = []
+        for k, target in enumerate(plan["dates"]):
+            out = schemas.TomorrowPlanOut(
+                target_date=target,
+                items=[
+                    {
+                        "item_id": it["item_id"],
+                        "item_name": it["item_name"],
+                        "unit": it["unit"],
+                        "target_date": target,
+                        "recommended_cook_qty": it["recommended_cook_qty"][k],
+                        "confidence": it["confidence"][k],
+                        "history_points_used": it["history_points_used"][k],
+                    }
+                    for it in plan["items"]
+                ],
+                computed_at=computed_at,
+                source="snapshot",
+            )
+            rows.append(
+                {
+                    "site_id": site_id,
+                    "target_date": target,
+                    "computed_on": today.isoformat(),
+                    "history_start": h_start.isoformat(),
+                    "history_end": h_end.isoformat(),
+                    "computed_at": computed_at,
+                    "payload": out.model_dump_json(),
+                }
+            )
+    finally:
+        db.rollback()
+
+    db.connection().exec_driver_sql("BEGIN IMMEDIATE")
+    try:
+        if changes.head(db) != head:
+            db.rollback()
+            return 0
+        db.execute(_invalidate_stmt(site_id))
+        db.execute(insert(models.PlanSnapshot), rows)
+        db.commit()
+    except BaseException:
+        db.rollback()
+        raise
+    return len(rows)
@@ -0,0 +1,84 @@
+"""Per-site data versions: a token that changes whenever a write commits.
+
+Two kinds are kept: "items" (bumped by catalog.bump) and "waste" (bumped by
+crud's waste writes). Readers compare tokens to tell whether what they hold
+is still current: the item catalogue reloads on a new items token, and the
+read endpoints' ETags are built from both (app.responses).
+
+Tokens are keyed by database file and site, so shards and temp files never
+share one. With WASTE_VERSIONS_SHARED on (the default) a token lives in a
+small file next to the database (<file>.<kind>-<site>.version), replaced
+atomically on a bump, so every worker process reads the same one; reading
+it is a small file read, not a query. Turn it off for single-process
+deploys to keep tokens in memory. Writes that bypass crud (raw SQL, other
+tools) do not bump anything.
+"""
+from __future__ import annotations
+
+import os
+import secrets
+import threading
+from pathlib import Path
+
+from pydantic_settings import BaseSettings, SettingsConfigDict
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+BOOT = secrets.token_hex(4)  # in-memory tokens from an earlier process must not match
+
+
+class VersionSettings(BaseSettings):
+    """Data version options, overridable with WASTE_VERSIONS_* environment variables."""
+
+    model_config = SettingsConfigDict(env_prefix="WASTE_VERSIONS_")
+
+    shared: bool = True  # keep tokens in files, so other processes see this one's writes
+
+
+def database_of(db: Session | AsyncSession) -> str | None:
+    """The database file a session reads, which (with the site) keys its versions."""
+    bind = db.get_bind() if isinstance(db, Session) else db.bind.sync_engine
+    return bind.url.database
+
+
+class Versions:
+    def __init__(self, kind: str, settings: VersionSettings | None = None):
+        self.kind = kind
+        self.settings = settings or VersionSettings()
+        self._counts: dict[tuple[str | None, int], int] = {}
+        self._lock = threading.Lock()
+
+    def _path(self, database: str | None, site_id: int) -> Path | None:
+        if not self.settings.shared or not database or database == ":memory:":
+            return None
+        return Path(f"{database}.{self.kind}-{site_id}.version")
+
+    def _write(self, path: Path) -> str:
+        token = secrets.token_hex(8)
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}")
+        tmp.write_text(token)
+        os.replace(tmp, path)
+        return token
+
+    def current(self, database: str | None, site_id: int) -> str:
+        path = self._path(database, site_id)
+        if path is None:
+            return f"{BOOT}-{self._counts.get((database, site_id), 0)}"
+        try:
+            return path.read_text()
+        except FileNotFoundError:
+            # First reader starts the file; if two race, the last replace wins for everyone.
+            with self._lock:
+                return self._write(path)
+
+    def bump(self, database: str | None, site_id: int) -> None:
+        """Call after committing a write of this kind for site_id."""
+        path = self._path(database, site_id)
+        with self._lock:
+            self._counts[(database, site_id)] = self._counts.get((database, site_id), 0) + 1
+            if path is not None:
+                self._write(path)
+
+
+items = Versions("items")
+waste = Versions("waste")
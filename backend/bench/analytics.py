@@ -0,0 +1,107 @@
+"""Reports and dashboards on SQLite against the columnar mirror (app.analytics) at 1M, 10M and 50M entries.
+
+Each size is one site of bench.generate data over --years years, with as many
+items as it takes. For a month, a quarter, a year and the whole history it
+times build_report grouped by day and by item, and build_dashboard's range
+view, on both engines, and checks they agree. On SQLite a report scans the
+entries' covering index and a dashboard reads the rollups; on the mirror
+both are grouped Parquet scans. Also timed: the first mirror build, and a
+refresh after a 1000-row batch.
+
+    cd backend && python -m bench.analytics --rows 1000000
+    cd backend && python -m bench.analytics --rows 1000000 10000000 50000000 --repeat 3
+"""
+from __future__ import annotations
+
+import argparse
+import math
+import time
+from datetime import date, timedelta
+
+from app import crud, schemas
+from app.analytics import AnalyticsSettings, mirror
+from app.services.dashboard import build_dashboard, diff_dashboards
+from app.services.report import build_report
+
+from .common import best_of, session_factory, temp_engine, temp_path
+from .generate import generate
+
+ENTRIES_PER_ITEM_YEAR = 273  # 364 days at generate's mean presence of 0.75
+
+
+def _same(a: dict, b: dict) -> bool:
+    if "rows" not in a:
+        return not diff_dashboards(a, b)
+    rows = {x["key"]: x for x in b["rows"]}
+    return len(a["rows"]) == len(rows) and all(
+        x["key"] in rows
+        and x["entries"] == rows[x["key"]]["entries"]
+        and math.isclose(x["total_waste"], rows[x["key"]]["total_waste"])
+        for x in a["rows"]
+    )
+
+
+def run(row_counts: list[int], years: int, repeat: int) -> None:
+    print(f"{'entries':>10} {'range':>8} {'read':>12} {'sqlite ms':>10} {'columnar ms':>12} {'x':>6} {'same':>5}")
+    mirror.settings = AnalyticsSettings(enabled=True, dir=temp_path("mirror"))
+    for target in row_counts:
+        items = max(1, round(target / (ENTRIES_PER_ITEM_YEAR * years)))
+        engine = temp_engine()
+        t0 = time.perf_counter()
+        data = generate(engine, sites=1, items=items, years=years)
+        gen_s = time.perf_counter() - t0
+
+        SessionLocal = session_factory(engine)
+        with SessionLocal() as db:
+            t0 = time.perf_counter()
+            mirror.refresh(db, 1)
+            build_s = time.perf_counter() - t0
+            crud.create_waste_bulk(
+                db, [schemas.WasteCreate(entry_date=data.end, item_id=1 + k % items, quantity=1.0) for k in range(1000)], 1
+            )
+            t0 = time.perf_counter()
+            mirror.refresh(db, 1)
+            refresh_ms = (time.perf_counter() - t0) * 1000.0
+            print(
+                f"# {data.entries + 1000} entries ({items} items x {years} years): generated in {gen_s:.0f}s, "
+                f"mirror built in {build_s:.1f}s, refreshed after 1000 new in {refresh_ms:.0f} ms"
+            )
+
+            end = date.fromisoformat(data.end)
+            ranges = {
+                "month": end - timedelta(days=30),
+                "quarter": end - timedelta(days=91),
+                "year": end - timedelta(days=364),
+                "all": date.fromisoformat(data.start),
+            }
+            for label, start in ranges.items():
+                s, e = start.isoformat(), data.end
+                reads = {
+                    "report/day": lambda name: build_report(db, s, e, "day", site_id=1, engine=name),
+                    "report/item": lambda name: build_report(db, s, e, "item", site_id=1, engine=name),
+                    "dashboard": lambda name: build_dashboard(db, "range", e, site_id=1, start=s, end=e, engine=name),
+                }
+                for what, read in reads.items():
+                    results, times = {}, {}
+                    for name in ("sqlite", "columnar"):
+                        results[name] = read(name)
+                        times[name], _ = best_of(lambda: read(name), repeat)
+                    print(
+                        f"{data.entries + 1000:>10} {label:>8} {what:>12} {times['sqlite']:>10.1f} "
+                        f"{times['columnar']:>12.1f} {times['sqlite'] / times['columnar']:>6.1f} "
+                        f"{'yes' if _same(results['sqlite'], results['columnar']) else 'NO':>5}"
+                    )
+        engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[1_000_000, 10_000_000, 50_000_000])
+    parser.add_argument("--years", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    run(args.rows, args.years, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""Raw-entry reads and writes before and after moving old months to archive files (app.archive).
+
+One site of bench.generate data over --years years. Each case is timed on
+the full waste_entries, then again after archive_site has moved every month
+older than --horizon-days out, and the two answers are checked to match:
+recent reads (the first GET /waste page, a recent export and report) should
+get no slower as history leaves the main file, reads into archived months
+pay for opening their files, and writes maintain smaller indexes. Also
+reported: the archive run itself and the main file's size before and after
+VACUUM.
+
+    cd backend && python -m bench.archive
+    cd backend && python -m bench.archive --items 1000 --years 5 --horizon-days 365
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import time
+from datetime import date, timedelta
+
+from app import crud, schemas
+from app.archive import ArchiveSettings, archives
+from app.services import waste_export
+from app.services.report import build_report
+
+from .common import best_of, session_factory, temp_engine
+from .generate import generate
+
+
+def _size_mib(path: str) -> float:
+    return sum(os.path.getsize(p) for p in (path, f"{path}-wal") if os.path.exists(p)) / 2**20
+
+
+def _page_at(db, day: str) -> list:
+    """GET /waste's 200 entries just before `day`, by cursor."""
+    rows, _ = crud.list_waste(db, None, day, None, 200, cursor=f"{day}:0", with_total=False, site_id=1)
+    return [(e.id, e.entry_date, e.quantity) for e, _, _ in rows]
+
+
+def _report(db, start: str, end: str, group_by: str) -> list:
+    rows = build_report(db, start, end, group_by, site_id=1, engine="sqlite")["rows"]
+    return [(r["key"], r["entries"], round(r["total_waste"], 6)) for r in rows]
+
+
+def run(items: int, years: int, horizon_days: int, repeat: int) -> None:
+    engine = temp_engine()
+    t0 = time.perf_counter()
+    data = generate(engine, sites=1, items=items, years=years)
+    print(f"# {data.entries} entries ({items} items x {years} years), generated in {time.perf_counter() - t0:.0f}s")
+    db_path = engine.url.database
+    archives.settings = ArchiveSettings(horizon_days=horizon_days)
+
+    end = date.fromisoformat(data.end)
+    recent, old = (end - timedelta(days=90)).isoformat(), (end - timedelta(days=horizon_days + 400)).isoformat()
+    old_end = (date.fromisoformat(old) + timedelta(days=364)).isoformat()
+    cases = {
+        "list first page": lambda db: [
+            (e.id, e.quantity) for e, _, _ in crud.list_waste(db, None, data.end, None, 200, site_id=1)[0]
+        ],
+        "list recent item": lambda db: [
+            (e.id, e.quantity) for e, _, _ in crud.list_waste(db, recent, data.end, 1 + items // 2, 200, site_id=1)[0]
+        ],
+        "list page, archived": lambda db: _page_at(db, old),
+        "export 90 days": lambda db: len(b"".join(waste_export.stream_waste(db, "csv", recent, data.end, None, 1))),
+        "export year, archived": lambda db: len(b"".join(waste_export.stream_waste(db, "csv", old, old_end, None, 1))),
+        "report 90 days": lambda db: _report(db, recent, data.end, "item"),
+        "report year, archived": lambda db: _report(db, old, old_end, "item"),
+        "report all": lambda db: _report(db, data.start, data.end, "month"),
+    }
+
+    SessionLocal = session_factory(engine)
+    results: dict[str, dict] = {"full": {}, "archived": {}}
+    times: dict[str, dict] = {"full": {}, "archived": {}}
+    insert_ms: dict[str, float] = {}
+    sizes: dict[str, float] = {"full": _size_mib(db_path)}
+    for phase in ("full", "archived"):
+        if phase == "archived":
+            with SessionLocal() as db:
+                t0 = time.perf_counter()
+                moved = archives.archive_site(db, 1, end)
+                archive_s = time.perf_counter() - t0
+            cold = sum(p.stat().st_size for p in archives.site_dir(db_path, 1).glob("*.sqlite")) / 2**20
+            print(
+                f"# archived {sum(n for _, n in moved)} entries in {len(moved)} months before "
+                f"{archives.cutoff(end)} in {archive_s:.1f}s; month files {cold:.1f} MiB"
+            )
+            with engine.connect() as conn:
+                conn.exec_driver_sql("VACUUM")
+            sizes["archived"] = _size_mib(db_path)
+        with SessionLocal() as db:
+            for name, fn in cases.items():
+                results[phase][name] = fn(db)
+                times[phase][name], _ = best_of(lambda: fn(db), repeat)
+                db.rollback()
+            # Dated after the data, so the reads above find the same rows in both phases.
+            day = (end + timedelta(days=1)).isoformat()
+            batch = [schemas.WasteCreate(entry_date=day, item_id=1 + k % items, quantity=1.0) for k in range(1000)]
+            insert_ms[phase], _ = best_of(lambda: crud.create_waste_bulk(db, batch, 1), repeat)
+
+    print(f"main file after VACUUM: {sizes['full']:.1f} MiB -> {sizes['archived']:.1f} MiB")
+    print(f"{'case':>22} {'full ms':>9} {'archived ms':>12} {'x':>6} {'same':>5}")
+    for name in cases:
+        full, arch = times["full"][name], times["archived"][name]
+        same = results["full"][name] == results["archived"][name]
+        print(f"{name:>22} {full:>9.1f} {arch:>12.1f} {full / arch:>6.2f} {'yes' if same else 'NO':>5}")
+    full, arch = insert_ms["full"], insert_ms["archived"]
+    print(f"{'insert 1000 (bulk)':>22} {full:>9.1f} {arch:>12.1f} {full / arch:>6.2f}")
+    engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--items", type=int, default=500)
+    parser.add_argument("--years", type=int, default=5)
+    parser.add_argument("--horizon-days", type=int, default=365)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    run(args.items, args.years, args.horizon_days, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
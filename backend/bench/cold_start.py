@@ -0,0 +1,91 @@
+"""Cold start: time from launching uvicorn to the first 200 from /health.
+
+Each run is a new process against a copy of the same database, either a
+fresh (empty) file or one already at the current schema with data in it.
+"Import" is a bare `import app.main` in a new interpreter, for scale.
+
+    cd backend && python -m bench.cold_start
+    cd backend && python -m bench.cold_start --runs 20 --apps sync
+"""
+from __future__ import annotations
+
+import argparse
+import http.client
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from .common import _free_port, populate, session_factory, temp_engine, temp_path
+
+APPS = {"sync": "app.main:app", "async": "app.main_async:app"}
+
+
+def _first_health(app_path: str, db_path: Path, timeout: float = 60.0) -> float:
+    """Seconds from Popen to the first /health 200, polling every couple of ms."""
+    port = _free_port()
+    env = {**os.environ, "WASTE_DB_PATH": str(db_path), "WASTE_PLAN_IN_APP": "0"}
+    t0 = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", app_path, "--port", str(port), "--log-level", "warning"], env=env
+    )
+    try:
+        while time.perf_counter() - t0 < timeout:
+            try:
+                conn = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+                conn.request("GET", "/health")
+                if conn.getresponse().status == 200:
+                    return time.perf_counter() - t0
+            except OSError:
+                time.sleep(0.002)
+        raise RuntimeError("server did not start")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def _import_s(module: str) -> float:
+    code = f"import time; t = time.perf_counter(); import {module}; print(time.perf_counter() - t)"
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+    return float(out.strip().splitlines()[-1])
+
+
+def run(apps: list[str], runs: int, n_items: int, days: int) -> None:
+    engine = temp_engine()
+    populated = Path(engine.url.database)
+    with session_factory(engine)() as db:
+        populate(db, n_items=n_items, n_days=days)
+    engine.dispose()
+
+    print(f"{'app':>6} {'database':>9} {'p50 ms':>8} {'min ms':>8} {'max ms':>8}")
+    for name in apps:
+        for label in ("fresh", "current"):
+            times = []
+            for _ in range(runs):
+                path = temp_path()
+                if label == "current":
+                    shutil.copy(populated, path)
+                times.append(_first_health(APPS[name], path) * 1000.0)
+                shutil.rmtree(path.parent, ignore_errors=True)
+            print(f"{name:>6} {label:>9} {statistics.median(times):>8.0f} {min(times):>8.0f} {max(times):>8.0f}")
+        module = APPS[name].split(":")[0]
+        imports = [_import_s(module) * 1000.0 for _ in range(runs)]
+        print(f"{name:>6} {'import':>9} {statistics.median(imports):>8.0f} {min(imports):>8.0f} {max(imports):>8.0f}")
+    shutil.rmtree(populated.parent, ignore_errors=True)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--apps", nargs="+", default=list(APPS), choices=list(APPS))
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--items", type=int, default=100)
+    parser.add_argument("--days", type=int, default=365)
+    args = parser.parse_args()
+    run(args.apps, args.runs, args.items, args.days)
+
+
+if __name__ == "__main__":
+    main()
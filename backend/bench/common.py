@@ -0,0 +1,145 @@
+from __future__ import annotations
+
+import contextlib
+import http.client
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+from sqlalchemy import event, insert
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.db import StorageSettings, make_engine
+from app import changes, migrate, models, rollup
+
+
+def temp_path(name: str = "bench.sqlite") -> Path:
+    return Path(tempfile.mkdtemp(prefix="waste-bench-")) / name
+
+
+def temp_engine(name: str = "bench.sqlite") -> Engine:
+    """A fresh SQLite file in a temp dir, with the app schema created and the app's storage profile."""
+    engine = make_engine(StorageSettings(path=temp_path(name)))
+    migrate.ensure_schema(engine)
+    return engine
+
+
+def session_factory(engine: Engine) -> sessionmaker[Session]:
+    return sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+class QueryCounter:
+    """Counts statements sent to the DB while attached to an engine."""
+
+    def __init__(self, engine: Engine):
+        self.count = 0
+        event.listen(engine, "before_cursor_execute", self._on_execute)
+
+    def _on_execute(self, *args) -> None:
+        self.count += 1
+
+    def reset(self) -> None:
+        self.count = 0
+
+
+def populate(db: Session, n_items: int, n_days: int, seed: int = 0, site_id: int = models.DEFAULT_SITE_ID) -> None:
+    """Bulk-insert n_items active items for a site with roughly one entry per item per day."""
+    rng = random.Random(seed)
+    db.execute(
+        insert(models.Item),
+        [
+            {"site_id": site_id, "name": f"Item {i:05d}", "unit": "kg" if i % 5 == 0 else "pieces", "is_active": True}
+            for i in range(n_items)
+        ],
+    )
+    item_ids = [i for (i,) in db.query(models.Item.id).filter(models.Item.site_id == site_id).all()]
+
+    today = date.today()
+    rows = []
+    for back in range(n_days):
+        d = today - timedelta(days=back)
+        weekend_boost = 1.6 if d.weekday() >= 5 else 1.0
+        for item_id in item_ids:
+            if rng.random() < 0.88:
+                qty = max(0.1, rng.gauss((2.0 + item_id % 3) * weekend_boost, 1.2))
+                rows.append(
+                    {"site_id": site_id, "entry_date": d.isoformat(), "item_id": item_id, "quantity": round(qty, 2)}
+                )
+    if rows:
+        db.execute(insert(models.WasteEntry), rows)
+    db.commit()
+    changes.stamp(db)
+    rollup.rebuild(db)
+
+
+def best_of(fn, repeat: int = 5) -> tuple[float, float]:
+    """Run fn `repeat` times, return (best, median) wall time in ms."""
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - t0) * 1000.0)
+    return min(times), statistics.median(times)
+
+
+def percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100.0 * (len(values) - 1))))]
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_ready(port: int, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            conn.request("GET", "/health")
+            if conn.getresponse().status == 200:
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError("server did not start")
+
+
+@contextlib.contextmanager
+def serve_process(app_path: str, db_path: str, env: dict[str, str] | None = None):
+    """Run uvicorn for app_path (e.g. "app.main:app") against db_path; yields (port, Popen)."""
+    port = _free_port()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", app_path, "--port", str(port), "--log-level", "warning"],
+        env={**os.environ, "WASTE_DB_PATH": db_path, **(env or {})},
+    )
+    try:
+        _wait_ready(port)
+        yield port, server
+    finally:
+        server.terminate()
+        server.wait()
+
+
+@contextlib.contextmanager
+def serve(app_path: str, db_path: str, env: dict[str, str] | None = None):
+    """Run uvicorn for app_path (e.g. "app.main:app") against db_path; yields the port."""
+    with serve_process(app_path, db_path, env) as (port, _):
+        yield port
+
+
+def cpu_seconds(pid: int) -> float:
+    """User + system CPU a process has used so far (Linux, from /proc)."""
+    fields = Path(f"/proc/{pid}/stat").read_text().rsplit(")", 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
@@ -0,0 +1,114 @@
+"""p50/p99 latency of POST /waste mixed with /dashboard load, per storage profile.
+
+Starts uvicorn against a populated temp database once per profile and drives it
+with writer and reader threads over keep-alive connections.
+
+    cd backend && python -m bench.concurrency
+"""
+from __future__ import annotations
+
+import argparse
+import http.client
+import json
+import random
+import statistics
+import threading
+import time
+from datetime import date, timedelta
+
+from .common import percentile, populate, serve, session_factory, temp_engine
+
+# Environment overrides per profile (see app.db.StorageSettings).
+PROFILES = {
+    # What db.py did before: rollback journal, full fsync, SQLite default caches.
+    "legacy": {
+        "WASTE_DB_JOURNAL_MODE": "delete",
+        "WASTE_DB_SYNCHRONOUS": "full",
+        "WASTE_DB_CACHE_SIZE_KIB": "2000",
+        "WASTE_DB_MMAP_SIZE_BYTES": "0",
+    },
+    "tuned": {},
+}
+
+
+def _client(port: int, kind: str, n_items: int, stop: threading.Event, out: dict, seed: int) -> None:
+    rng = random.Random(seed)
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    today = date.today()
+    while not stop.is_set():
+        if kind == "write":
+            body = json.dumps(
+                {
+                    "entry_date": (today - timedelta(days=rng.randrange(3))).isoformat(),
+                    "item_id": rng.randrange(1, n_items + 1),
+                    "quantity": round(rng.uniform(0.1, 5.0), 2),
+                }
+            )
+            method, path, headers = "POST", "/waste", {"Content-Type": "application/json"}
+        else:
+            anchor = (today - timedelta(days=rng.randrange(60))).isoformat()
+            view = rng.choice(["day", "week", "month"])
+            method, path, body, headers = "GET", f"/dashboard?view={view}&anchor_date={anchor}", None, {}
+
+        t0 = time.perf_counter()
+        try:
+            conn.request(method, path, body=body, headers=headers)
+            resp = conn.getresponse()
+            resp.read()
+            ok = resp.status == 200
+        except (OSError, http.client.HTTPException):
+            ok = False
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+        elapsed = (time.perf_counter() - t0) * 1000.0
+        out["ms" if ok else "errors"].append(elapsed)
+
+
+def run_profile(name: str, n_items: int, days: int, writers: int, readers: int, seconds: float) -> None:
+    engine = temp_engine()
+    db_path = engine.url.database
+    with session_factory(engine)() as db:
+        populate(db, n_items=n_items, n_days=days)
+    engine.dispose()
+
+    with serve("app.main:app", db_path, PROFILES[name]) as port:
+        stop = threading.Event()
+        results = {"write": {"ms": [], "errors": []}, "read": {"ms": [], "errors": []}}
+        threads = [
+            threading.Thread(target=_client, args=(port, "write", n_items, stop, results["write"], i))
+            for i in range(writers)
+        ] + [
+            threading.Thread(target=_client, args=(port, "read", n_items, stop, results["read"], 1000 + i))
+            for i in range(readers)
+        ]
+        for t in threads:
+            t.start()
+        time.sleep(seconds)
+        stop.set()
+        for t in threads:
+            t.join()
+
+    for kind in ("write", "read"):
+        ms = results[kind]["ms"]
+        print(
+            f"{name:>8} {kind:>6} {len(ms) / seconds:>8.0f} {statistics.median(ms) if ms else float('nan'):>8.1f} "
+            f"{percentile(ms, 99):>8.1f} {len(results[kind]['errors']):>7}"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--profiles", nargs="+", default=list(PROFILES), choices=list(PROFILES))
+    parser.add_argument("--items", type=int, default=100)
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--writers", type=int, default=8)
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=10.0)
+    args = parser.parse_args()
+
+    print(f"{'profile':>8} {'kind':>6} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    for name in args.profiles:
+        run_profile(name, args.items, args.days, args.writers, args.readers, args.seconds)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""Server CPU per request for the read endpoints: full responses, gzipped ones and 304s.
+
+Each case is a run of identical GETs over one keep-alive connection to a
+uvicorn process; CPU is the server process's user + system time over the
+run, divided by the requests. "full" sends no validators, "gzip" adds
+Accept-Encoding: gzip, "304" sends back the ETag from a first response.
+The dashboard and plans come out of the result cache in every mode, so
+"full" is what serving an unchanged body costs.
+
+Each app is first checked with two worker processes on one file: after a
+POST /waste to one, the other must answer the cached reads with the new
+body under the new tag, and with 200 to the tag it handed out before.
+
+    cd backend && python -m bench.conditional_get
+    cd backend && python -m bench.conditional_get --apps sync async --requests 2000
+"""
+from __future__ import annotations
+
+import argparse
+import http.client
+import json
+import statistics
+import time
+from datetime import date
+
+from .common import cpu_seconds, populate, serve_process, session_factory, temp_engine
+
+APPS = {"sync": "app.main:app", "async": "app.main_async:app"}
+PATHS = ["/dashboard?view=month", "/dashboard?view=year", "/items", "/waste?limit=50", "/tomorrow-plan"]
+MODES = ("full", "gzip", "304")
+# Result-cached reads that a write dated today changes.
+CACHED = [
+    "/dashboard?view=day",
+    "/dashboard/sites?view=day",
+    f"/reports/waste?start_date={date.today()}&end_date={date.today()}&group_by=item",
+    "/plan?days=2&model=ses",
+]
+
+
+def _get(conn: http.client.HTTPConnection, path: str, headers: dict[str, str]) -> tuple[int, bytes, str | None]:
+    conn.request("GET", path, headers=headers)
+    resp = conn.getresponse()
+    return resp.status, resp.read(), resp.getheader("ETag")
+
+
+def _check_workers(app: str, db_path: str) -> list[str]:
+    """The CACHED paths whose cached body outlived a write made by another worker process."""
+    stale = []
+    env = {"WASTE_PLAN_IN_APP": "0"}
+    with serve_process(app, db_path, env) as (port_a, _), serve_process(app, db_path, env) as (port_b, _):
+        a = http.client.HTTPConnection("127.0.0.1", port_a, timeout=60)
+        b = http.client.HTTPConnection("127.0.0.1", port_b, timeout=60)
+        for path in CACHED:
+            _, before, old_tag = _get(a, path, {})
+            _get(a, path, {})  # from a's cache now
+            body = json.dumps({"entry_date": date.today().isoformat(), "item_id": 1, "quantity": 100.0})
+            b.request("POST", "/waste", body=body, headers={"Content-Type": "application/json"})
+            b.getresponse().read()
+            _, after, tag = _get(a, path, {})
+            _, expected, expected_tag = _get(b, path, {})
+            status, _, _ = _get(a, path, {"If-None-Match": old_tag or ""})
+            if after == before or after != expected or tag != expected_tag or status != 200:
+                stale.append(path)
+        a.close()
+        b.close()
+    return stale
+
+
+def _case(port: int, pid: int, path: str, mode: str, requests: int) -> dict:
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+    _, body, tag = _get(conn, path, {})
+    headers = {"full": {}, "gzip": {"Accept-Encoding": "gzip"}, "304": {"If-None-Match": tag or ""}}[mode]
+    status, body, _ = _get(conn, path, headers)  # warm, and what the run's responses look like
+    times = []
+    cpu0 = cpu_seconds(pid)
+    for _ in range(requests):
+        t0 = time.perf_counter()
+        _get(conn, path, headers)
+        times.append(time.perf_counter() - t0)
+    cpu = cpu_seconds(pid) - cpu0
+    conn.close()
+    return {
+        "status": status,
+        "bytes": len(body),
+        "cpu_us": cpu / requests * 1e6,
+        "p50_us": statistics.median(times) * 1e6,
+    }
+
+
+def run(apps: list[str], requests: int, n_items: int, days: int) -> None:
+    engine = temp_engine()
+    db_path = engine.url.database
+    with session_factory(engine)() as db:
+        populate(db, n_items=n_items, n_days=days)
+    engine.dispose()
+
+    for name in apps:
+        stale = _check_workers(APPS[name], db_path)
+        verdict = f"STALE {', '.join(stale)}" if stale else "fresh"
+        print(f"{name}: two workers, write in one, cached reads in the other: {verdict}")
+
+    print(f"{n_items} items, {days} days, {requests} requests per case")
+    print(f"{'app':>6} {'path':<24} {'mode':>5} {'status':>6} {'bytes':>7} {'cpu us/req':>11} {'p50 us':>8}")
+    for name in apps:
+        with serve_process(APPS[name], db_path, {"WASTE_PLAN_IN_APP": "0"}) as (port, server):
+            for path in PATHS:
+                for mode in MODES:
+                    r = _case(port, server.pid, path, mode, requests)
+                    print(
+                        f"{name:>6} {path:<24} {mode:>5} {r['status']:>6} {r['bytes']:>7} "
+                        f"{r['cpu_us']:>11.0f} {r['p50_us']:>8.0f}"
+                    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--apps", nargs="+", default=["sync"], choices=list(APPS))
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--items", type=int, default=100)
+    parser.add_argument("--days", type=int, default=365)
+    args = parser.parse_args()
+    run(args.apps, args.requests, args.items, args.days)
+
+
+if __name__ == "__main__":
+    main()
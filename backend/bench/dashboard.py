@@ -0,0 +1,48 @@
+"""Query count and latency of build_dashboard per view against data volume.
+
+Day, week and month views sum their entries in one scan of about two months;
+longer views read whole weeks, months and years from period_item_totals
+where they can, so latency should stay flat up to the year view.
+
+    cd backend && python -m bench.dashboard
+"""
+from __future__ import annotations
+
+import argparse
+from datetime import date
+
+from app.services.dashboard import build_dashboard
+
+from .common import QueryCounter, best_of, populate, session_factory, temp_engine
+
+
+def run(item_counts: list[int], days: int, views: list[str]) -> None:
+    anchor = date.today().isoformat()
+    print(f"{'items':>7} {'view':>8} {'queries':>8} {'best ms':>9} {'median ms':>10}")
+    for n_items in item_counts:
+        engine = temp_engine()
+        SessionLocal = session_factory(engine)
+        with SessionLocal() as db:
+            populate(db, n_items=n_items, n_days=days)
+            counter = QueryCounter(engine)
+            for view in views:
+                counter.reset()
+                build_dashboard(db, view=view, anchor_date_str=anchor)
+                queries = counter.count
+
+                best, median = best_of(lambda: build_dashboard(db, view=view, anchor_date_str=anchor))
+                print(f"{n_items:>7} {view:>8} {queries:>8} {best:>9.1f} {median:>10.1f}")
+        engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--items", type=int, nargs="+", default=[10, 100, 500])
+    parser.add_argument("--days", type=int, default=730)
+    parser.add_argument("--views", nargs="+", default=["day", "week", "month", "quarter", "year"])
+    args = parser.parse_args()
+    run(args.items, args.days, args.views)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+"""Fan-out of live dashboards: N screens on /dashboard/stream against N screens re-fetching /dashboard.
+
+After each write (POST /waste for today), "stream" times how long until every
+screen has the delta; "poll" has every screen GET /dashboard, as the
+frontend used to, and times until all of them have the new payload. Also
+shown: bytes each screen receives per write, and how many dashboards the
+server built. At the end every stream's state (snapshot plus deltas) is
+checked against a fresh GET /dashboard.
+
+    cd backend && python -m bench.dashboard_stream
+    cd backend && python -m bench.dashboard_stream --clients 50 200 500 --writes 50 --apps sync async
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import random
+import time
+from datetime import date
+
+from app.services.dashboard import apply_delta, diff_dashboards
+
+from .common import percentile, populate, serve, session_factory, temp_engine
+
+APPS = {"sync": "app.main:app", "async": "app.main_async:app"}
+
+
+async def _connect(port: int):
+    return await asyncio.open_connection("127.0.0.1", port, limit=1 << 22)
+
+
+async def _head(reader: asyncio.StreamReader) -> dict[str, str]:
+    status = await reader.readline()
+    if b" 200 " not in status:
+        raise RuntimeError(f"unexpected response: {status!r}")
+    headers = {}
+    while (line := await reader.readline()) not in (b"\r\n", b""):
+        name, _, value = line.decode().partition(":")
+        headers[name.strip().lower()] = value.strip()
+    return headers
+
+
+async def _request(reader, writer, method: str, path: str, body: bytes = b"") -> bytes:
+    head = f"{method} {path} HTTP/1.1\r\nHost: bench\r\nContent-Length: {len(body)}\r\n"
+    if body:
+        head += "Content-Type: application/json\r\n"
+    writer.write(head.encode() + b"\r\n" + body)
+    headers = await _head(reader)
+    return await reader.readexactly(int(headers["content-length"]))
+
+
+class Arrivals:
+    """When each delta (by seq) reached each screen, with an event set once all of them have it."""
+
+    def __init__(self, screens: int):
+        self.screens = screens
+        self.times: dict[int, list[float]] = {}
+        self._done: dict[int, asyncio.Event] = {}
+
+    def record(self, seq: int) -> None:
+        times = self.times.setdefault(seq, [])
+        times.append(time.perf_counter())
+        if len(times) == self.screens:
+            self.everywhere(seq).set()
+
+    def everywhere(self, seq: int) -> asyncio.Event:
+        return self._done.setdefault(seq, asyncio.Event())
+
+
+class Screen:
+    """One /dashboard/stream client, keeping its own copy of the dashboard up to date."""
+
+    def __init__(self, arrivals: Arrivals):
+        self.state: dict | None = None
+        self.delta_bytes = 0
+        self.ready = asyncio.Event()
+        self._arrivals = arrivals
+
+    async def run(self, port: int, path: str) -> None:
+        self.reader, self.writer = await _connect(port)
+        self.writer.write(f"GET {path} HTTP/1.1\r\nHost: bench\r\nAccept: text/event-stream\r\n\r\n".encode())
+        await _head(self.reader)
+        buf = b""
+        while True:
+            size = int((await self.reader.readline()).strip() or b"0", 16)  # chunked transfer encoding
+            if size == 0:
+                return
+            buf += (await self.reader.readexactly(size + 2))[:-2]
+            while b"\n\n" in buf:
+                raw, buf = buf.split(b"\n\n", 1)
+                self._on_event(raw)
+
+    def _on_event(self, raw: bytes) -> None:
+        fields = dict(line.split(": ", 1) for line in raw.decode().splitlines() if ": " in line)
+        kind = fields.get("event")
+        if kind == "snapshot":
+            self.state = json.loads(fields["data"])
+            self.ready.set()
+        elif kind == "delta":
+            delta = json.loads(fields["data"])
+            self.delta_bytes += len(raw) + 2
+            seq = delta.pop("seq")
+            self.state = apply_delta(self.state, delta)
+            self._arrivals.record(seq)
+
+    def close(self) -> None:
+        self.writer.close()
+
+
+async def _post(post_conn, n_items: int, rng: random.Random) -> None:
+    body = {"entry_date": date.today().isoformat(), "item_id": rng.randrange(1, n_items + 1), "quantity": 1.5}
+    await _request(*post_conn, "POST", "/waste", json.dumps(body).encode())
+
+
+async def _stream_round(port: int, path: str, clients: int, writes: int, n_items: int) -> dict:
+    arrivals = Arrivals(clients)
+    screens = [Screen(arrivals) for _ in range(clients)]
+    t0 = time.perf_counter()
+    tasks = [asyncio.create_task(s.run(port, path)) for s in screens]
+    await asyncio.gather(*(s.ready.wait() for s in screens))
+    connect_ms = (time.perf_counter() - t0) * 1000.0
+
+    rng = random.Random(0)
+    post_conn = await _connect(port)
+    latencies, spans = [], []
+    for seq in range(1, writes + 1):
+        t0 = time.perf_counter()
+        await _post(post_conn, n_items, rng)
+        await arrivals.everywhere(seq).wait()
+        latencies += [(t - t0) * 1000.0 for t in arrivals.times[seq]]
+        spans.append((max(arrivals.times[seq]) - t0) * 1000.0)
+
+    fresh = json.loads(await _request(*post_conn, "GET", path.replace("/dashboard/stream", "/dashboard")))
+    stats = json.loads(await _request(*post_conn, "GET", "/live/stats"))
+    post_conn[1].close()
+    stale = sum(1 for s in screens if diff_dashboards(s.state, fresh))
+    for s in screens:
+        s.close()
+    for t in tasks:
+        t.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    return {
+        "connect_ms": connect_ms,
+        "p50": percentile(latencies, 50),
+        "p99": percentile(latencies, 99),
+        "all": percentile(spans, 50),
+        "bytes": sum(s.delta_bytes for s in screens) / clients / writes,
+        "builds": stats["builds"],
+        "stale": stale,
+    }
+
+
+async def _poll_round(port: int, path: str, clients: int, writes: int, n_items: int) -> dict:
+    conns = [await _connect(port) for _ in range(clients)]
+    post_conn = await _connect(port)
+    before = json.loads(await _request(*post_conn, "GET", "/cache/stats"))["misses"]
+
+    rng = random.Random(0)
+    latencies, spans, sizes = [], [], []
+
+    async def fetch(conn, t0: float) -> None:
+        sizes.append(len(await _request(*conn, "GET", path)))
+        latencies.append((time.perf_counter() - t0) * 1000.0)
+
+    for _ in range(writes):
+        t0 = time.perf_counter()
+        await _post(post_conn, n_items, rng)
+        await asyncio.gather(*(fetch(c, t0) for c in conns))
+        spans.append((time.perf_counter() - t0) * 1000.0)
+
+    after = json.loads(await _request(*post_conn, "GET", "/cache/stats"))["misses"]
+    for _, writer in [*conns, post_conn]:
+        writer.close()
+    return {
+        "connect_ms": float("nan"),
+        "p50": percentile(latencies, 50),
+        "p99": percentile(latencies, 99),
+        "all": percentile(spans, 50),
+        "bytes": sum(sizes) / clients / writes,
+        "builds": after - before,
+        "stale": 0,
+    }
+
+
+def run(apps: list[str], client_counts: list[int], writes: int, view: str, n_items: int, days: int) -> None:
+    engine = temp_engine()
+    db_path = engine.url.database
+    with session_factory(engine)() as db:
+        populate(db, n_items=n_items, n_days=days)
+    engine.dispose()
+
+    query = f"view={view}&anchor_date={date.today().isoformat()}"
+    env = {"WASTE_PLAN_IN_APP": "0", "WASTE_LIVE_RESYNC_S": "3600"}
+    print(f"{view} view, {n_items} items, {days} days, {writes} writes")
+    print(
+        f"{'app':>6} {'clients':>8} {'mode':>7} {'connect ms':>11} {'p50 ms':>8} {'p99 ms':>8} "
+        f"{'all ms':>8} {'B/screen/write':>15} {'builds':>7} {'stale':>6}"
+    )
+    for name in apps:
+        for clients in client_counts:
+            for mode, round_, path in (
+                ("stream", _stream_round, f"/dashboard/stream?{query}"),
+                ("poll", _poll_round, f"/dashboard?{query}"),
+            ):
+                with serve(APPS[name], db_path, env) as port:
+                    r = asyncio.run(round_(port, path, clients, writes, n_items))
+                print(
+                    f"{name:>6} {clients:>8} {mode:>7} {r['connect_ms']:>11.0f} {r['p50']:>8.1f} {r['p99']:>8.1f} "
+                    f"{r['all']:>8.1f} {r['bytes']:>15.0f} {r['builds']:>7} {r['stale']:>6}"
+                )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--apps", nargs="+", default=["sync"], choices=list(APPS))
+    parser.add_argument("--clients", nargs="+", type=int, default=[10, 100, 300])
+    parser.add_argument("--writes", type=int, default=30)
+    parser.add_argument("--view", default="week", choices=["day", "week", "month", "quarter", "year"])
+    parser.add_argument("--items", type=int, default=100)
+    parser.add_argument("--days", type=int, default=365)
+    args = parser.parse_args()
+    run(args.apps, args.clients, args.writes, args.view, args.items, args.days)
+
+
+if __name__ == "__main__":
+    main()
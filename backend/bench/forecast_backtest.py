@@ -0,0 +1,103 @@
+"""Accuracy and runtime of the planner forecasters, replayed over a year of history.
+
+For every day of the replay each forecaster sees the planner's history window
+ending the day before and predicts that day's waste for every item at once.
+History comes from a synthetic catalogue (weekday seasonality, drift, noise,
+days with nothing logged) or, with --db, from an existing database.
+
+    cd backend && python -m bench.forecast_backtest
+    cd backend && python -m bench.forecast_backtest --db app/data.sqlite
+"""
+from __future__ import annotations
+
+import argparse
+import time
+from datetime import date, timedelta
+
+import numpy as np
+from sqlalchemy import select
+
+from app import models
+from app.db import StorageSettings, make_engine
+from app.services import forecast
+from app.services.tomorrow_plan import HISTORY_DAYS
+
+from .common import percentile, session_factory
+
+WINDOW = HISTORY_DAYS + 1  # history_span is inclusive at both ends
+
+
+def synthetic(n_items: int, days: int, seed: int = 0) -> forecast.History:
+    rng = np.random.default_rng(seed)
+    start = date.today() - timedelta(days=days - 1)
+    weekday = (start.weekday() + np.arange(days)) % 7
+
+    base = rng.gamma(2.0, 1.5, n_items)[:, None]
+    season = np.clip(1.0 + rng.normal(0.0, 0.3, (n_items, 7)), 0.2, None)[:, weekday]
+    drift = 1.0 + rng.normal(0.0, 0.3, n_items)[:, None] * np.linspace(0.0, 1.0, days)
+    mean = base * season * np.clip(drift, 0.2, None)
+
+    present = rng.random((n_items, days)) < rng.uniform(0.4, 1.0, n_items)[:, None]
+    values = np.where(present, np.round(mean * rng.lognormal(0.0, 0.35, (n_items, days)), 2), 0.0)
+    return forecast.History(np.arange(1, n_items + 1), start, values, present)
+
+
+def from_db(path: str, days: int, site_id: int = models.DEFAULT_SITE_ID) -> forecast.History:
+    engine = make_engine(StorageSettings(path=path), readonly=True)
+    with session_factory(engine)() as db:
+        item_ids = list(db.execute(select(models.Item.id).where(models.Item.site_id == site_id)).scalars())
+        end = date.today()
+        hist = forecast.load_history(db, item_ids, end - timedelta(days=days - 1), end, site_id=site_id)
+    engine.dispose()
+    return hist
+
+
+def backtest(hist: forecast.History, names: list[str], replay_days: int) -> None:
+    first = hist.start + timedelta(days=WINDOW)
+    targets = [first + timedelta(days=k) for k in range(replay_days)]
+    targets = [t for t in targets if t <= hist.end]
+    n_items = hist.values.shape[0]
+    print(
+        f"{n_items} items, {len(targets)} forecast days ({targets[0]} .. {targets[-1]}), "
+        f"{WINDOW}-day history window"
+    )
+    print(f"{'model':>10} {'MAE':>8} {'WAPE %':>8} {'bias':>8} {'p50 ms':>8} {'p99 ms':>8} {'ms/1k items':>12}")
+
+    actual = np.stack([hist.window(t, 1).values[:, 0] for t in targets], axis=1)
+    for name in names:
+        forecaster = forecast.get_forecaster(name)
+        pred = np.empty_like(actual)
+        ms = []
+        for j, t in enumerate(targets):
+            window = hist.window(t - timedelta(days=1), WINDOW)
+            t0 = time.perf_counter()
+            p, _ = forecaster.predict(window, [t])
+            ms.append((time.perf_counter() - t0) * 1000.0)
+            pred[:, j] = p[:, 0]
+
+        err = pred - actual
+        wape = np.abs(err).sum() / max(actual.sum(), 1e-9) * 100.0
+        p50 = percentile(ms, 50)
+        print(
+            f"{name:>10} {np.abs(err).mean():>8.3f} {wape:>8.1f} {err.mean():>+8.3f} "
+            f"{p50:>8.2f} {percentile(ms, 99):>8.2f} {p50 * 1000.0 / n_items:>12.2f}"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--models", nargs="+", default=list(forecast.FORECASTERS), choices=list(forecast.FORECASTERS))
+    parser.add_argument("--items", type=int, default=1000, help="synthetic catalogue size")
+    parser.add_argument("--replay-days", type=int, default=365)
+    parser.add_argument("--db", help="replay this SQLite file instead of synthetic history")
+    parser.add_argument("--site", type=int, default=models.DEFAULT_SITE_ID, help="site to replay with --db")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    days = WINDOW + args.replay_days
+    hist = from_db(args.db, days, args.site) if args.db else synthetic(args.items, days, args.seed)
+    backtest(hist, args.models, args.replay_days)
+
+
+if __name__ == "__main__":
+    main()
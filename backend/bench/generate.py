@@ -0,0 +1,146 @@
+"""Deterministic synthetic data at production scale: N sites x M items x Y years.
+
+Each item gets a seeded base level, unit and how often it is wasted at all;
+daily quantities follow a weekday profile (seed.py's weekend boost, with a
+lighter Friday) and a yearly swing. History always ends on the last Sunday,
+so day k back is the same weekday and the same draw whenever it is run: two
+runs with the same arguments hold identical rows (see `checksum`), only
+shifted by whole weeks on the calendar.
+
+    cd backend && python -m bench.generate --sites 10 --items 100 --years 3 --out /tmp/waste-10x100x3.sqlite
+"""
+from __future__ import annotations
+
+import argparse
+import math
+import random
+import time
+from dataclasses import asdict, dataclass
+from datetime import date, timedelta
+from pathlib import Path
+
+from sqlalchemy import func, insert, select
+from sqlalchemy.engine import Engine
+
+from app.db import StorageSettings, make_engine
+from app import changes, migrate, models, rollup
+
+from .common import session_factory
+
+WEEKDAY_BOOST = (1.0, 0.95, 1.0, 1.05, 1.25, 1.6, 1.6)  # Monday first
+CHUNK = 50_000
+
+
+@dataclass
+class Dataset:
+    sites: int
+    items: int  # per site
+    years: int
+    seed: int
+    start: str
+    end: str
+    entries: int = 0
+    checksum: str = ""
+
+
+def last_sunday(today: date | None = None) -> date:
+    today = today or date.today()
+    return today - timedelta(days=(today.weekday() + 1) % 7)
+
+
+def _site_rows(site_id: int, item_ids: list[int], units: dict[int, str], days: list[date], seed: int):
+    rng = random.Random(f"{seed}:{site_id}")
+    for item_id in item_ids:
+        base = rng.uniform(0.8, 6.0)
+        presence = rng.uniform(0.55, 0.95)  # share of days with any waste logged
+        phase = rng.uniform(0, 2 * math.pi)
+        scale = 0.1 if units[item_id] == "kg" else 1.0
+        for k, d in enumerate(days):
+            if rng.random() >= presence:
+                continue
+            season = 1.0 + 0.15 * math.sin(2 * math.pi * k / 365.0 + phase)
+            qty = rng.gauss(base * WEEKDAY_BOOST[d.weekday()] * season, base * 0.3) * scale
+            if qty > 0.05:
+                yield {
+                    "site_id": site_id,
+                    "entry_date": d.isoformat(),
+                    "weekday": d.weekday(),
+                    "item_id": item_id,
+                    "quantity": round(qty, 2),
+                }
+
+
+def generate(engine: Engine, sites: int, items: int, years: int, seed: int = 0, end: date | None = None) -> Dataset:
+    """Fill a migrated, empty database and rebuild its rollups. Returns what was written."""
+    end = end or last_sunday()
+    days = [end - timedelta(days=k) for k in range(years * 364)]  # whole weeks
+    SessionLocal = session_factory(engine)
+    n = 0
+    with SessionLocal() as db:
+        db.execute(insert(models.Site), [{"id": s, "name": f"Site {s:03d}"} for s in range(1, sites + 1)])
+        for site_id in range(1, sites + 1):
+            db.execute(
+                insert(models.Item),
+                [
+                    {
+                        "site_id": site_id,
+                        "name": f"Item {i:05d}",
+                        "unit": "kg" if i % 5 == 0 else "pieces",
+                        "is_active": i % 20 != 19,  # a few retired items, as in a real catalogue
+                    }
+                    for i in range(items)
+                ],
+            )
+            rows = db.execute(
+                select(models.Item.id, models.Item.unit).where(models.Item.site_id == site_id).order_by(models.Item.id)
+            ).all()
+            units = {item_id: unit for item_id, unit in rows}
+            chunk = []
+            for row in _site_rows(site_id, list(units), units, days, seed):
+                chunk.append(row)
+                if len(chunk) == CHUNK:
+                    db.execute(insert(models.WasteEntry), chunk)
+                    n += len(chunk)
+                    chunk = []
+            if chunk:
+                db.execute(insert(models.WasteEntry), chunk)
+                n += len(chunk)
+        db.commit()
+        changes.stamp(db)
+        rollup.rebuild(db)
+    return Dataset(sites, items, years, seed, days[-1].isoformat(), end.isoformat(), n, checksum(engine))
+
+
+def checksum(engine: Engine) -> str:
+    """Row count and quantity total per site, independent of where the dates fall."""
+    w = models.WasteEntry
+    with engine.connect() as conn:
+        rows = conn.execute(
+            select(w.site_id, func.count(), func.round(func.sum(w.quantity), 2)).group_by(w.site_id).order_by(w.site_id)
+        ).all()
+    return ";".join(f"{s}:{c}:{q:.2f}" for s, c, q in rows)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sites", type=int, default=3)
+    parser.add_argument("--items", type=int, default=50, help="items per site")
+    parser.add_argument("--years", type=int, default=2)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", type=Path, required=True, help="SQLite file to create")
+    args = parser.parse_args()
+    if args.out.exists():
+        parser.error(f"{args.out} already exists")
+
+    engine = make_engine(StorageSettings(path=args.out))
+    migrate.ensure_schema(engine)
+    t0 = time.perf_counter()
+    dataset = generate(engine, args.sites, args.items, args.years, args.seed)
+    engine.dispose()
+    print(f"{dataset.entries} entries in {time.perf_counter() - t0:.1f}s -> {args.out}")
+    for k, v in asdict(dataset).items():
+        print(f"  {k}: {v}")
+
+
+if __name__ == "__main__":
+    main()
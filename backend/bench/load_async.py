@@ -0,0 +1,103 @@
+"""Throughput and latency of the sync (app.main) and async (app.main_async) apps
+under the same mixed load at several client counts.
+
+Each client loops over month dashboards for random anchors (mostly cache
+misses), POST /waste and /health, so slow analytics compete with quick calls.
+
+    cd backend && python -m bench.load_async
+"""
+from __future__ import annotations
+
+import argparse
+import http.client
+import json
+import random
+import statistics
+import threading
+import time
+from datetime import date, timedelta
+
+from .common import percentile, populate, serve, session_factory, temp_engine
+
+APPS = {"sync": "app.main:app", "async": "app.main_async:app"}
+MIX = ["dashboard", "dashboard", "waste", "health"]
+
+
+def _client(port: int, n_items: int, stop: threading.Event, out: dict, seed: int) -> None:
+    rng = random.Random(seed)
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+    today = date.today()
+    while not stop.is_set():
+        kind = rng.choice(MIX)
+        body, headers = None, {}
+        if kind == "dashboard":
+            anchor = (today - timedelta(days=rng.randrange(365))).isoformat()
+            method, path = "GET", f"/dashboard?view=month&anchor_date={anchor}"
+        elif kind == "waste":
+            body = json.dumps(
+                {"entry_date": today.isoformat(), "item_id": rng.randrange(1, n_items + 1), "quantity": 1.0}
+            )
+            method, path, headers = "POST", "/waste", {"Content-Type": "application/json"}
+        else:
+            method, path = "GET", "/health"
+
+        t0 = time.perf_counter()
+        try:
+            conn.request(method, path, body=body, headers=headers)
+            resp = conn.getresponse()
+            resp.read()
+            ok = resp.status == 200
+        except (OSError, http.client.HTTPException):
+            ok = False
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+        out[kind if ok else "errors"].append((time.perf_counter() - t0) * 1000.0)
+
+
+def run(apps: list[str], client_counts: list[int], n_items: int, days: int, seconds: float) -> None:
+    engine = temp_engine()
+    db_path = engine.url.database
+    with session_factory(engine)() as db:
+        populate(db, n_items=n_items, n_days=days)
+    engine.dispose()
+
+    print(f"{'app':>6} {'clients':>8} {'endpoint':>10} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>9}")
+    for name in apps:
+        for clients in client_counts:
+            with serve(APPS[name], db_path) as port:
+                stop = threading.Event()
+                per_thread = [{k: [] for k in (*MIX, "errors")} for _ in range(clients)]
+                threads = [
+                    threading.Thread(target=_client, args=(port, n_items, stop, per_thread[i], i))
+                    for i in range(clients)
+                ]
+                for t in threads:
+                    t.start()
+                time.sleep(seconds)
+                stop.set()
+                for t in threads:
+                    t.join()
+
+            merged = {k: [v for d in per_thread for v in d[k]] for k in per_thread[0]}
+            total = sum(len(v) for k, v in merged.items() if k != "errors")
+            print(f"{name:>6} {clients:>8} {'all':>10} {total / seconds:>8.0f}")
+            for kind in ("dashboard", "waste", "health"):
+                ms = merged[kind]
+                p50 = statistics.median(ms) if ms else float("nan")
+                print(f"{'':>6} {'':>8} {kind:>10} {len(ms) / seconds:>8.0f} {p50:>8.1f} {percentile(ms, 99):>9.1f}")
+            if merged["errors"]:
+                print(f"{'':>6} {'':>8} {'errors':>10} {len(merged['errors']):>8}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--apps", nargs="+", default=list(APPS), choices=list(APPS))
+    parser.add_argument("--clients", type=int, nargs="+", default=[50, 200])
+    parser.add_argument("--items", type=int, default=200)
+    parser.add_argument("--days", type=int, default=400)
+    parser.add_argument("--seconds", type=float, default=15.0)
+    args = parser.parse_args()
+    run(args.apps, args.clients, args.items, args.days, args.seconds)
+
+
+if __name__ == "__main__":
+    main()
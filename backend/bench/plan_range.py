@@ -0,0 +1,51 @@
+"""Cost of an N-day plan from build_plan_range versus N calls to build_tomorrow_plan.
+
+    cd backend && python -m bench.plan_range
+"""
+from __future__ import annotations
+
+import argparse
+from datetime import date, timedelta
+
+from app.services.tomorrow_plan import build_plan_range, build_tomorrow_plan
+
+from .common import QueryCounter, best_of, populate, session_factory, temp_engine
+
+
+def _per_day(db, start: date, days: int) -> list:
+    return [build_tomorrow_plan(db, target_date=start + timedelta(days=k)) for k in range(days)]
+
+
+def run(item_counts: list[int], plan_days: list[int], history_days: int) -> None:
+    start = date.today() + timedelta(days=1)
+    print(f"{'items':>7} {'days':>5} {'path':>10} {'queries':>8} {'best ms':>9} {'median ms':>10}")
+    for n_items in item_counts:
+        engine = temp_engine()
+        SessionLocal = session_factory(engine)
+        with SessionLocal() as db:
+            populate(db, n_items=n_items, n_days=history_days)
+            counter = QueryCounter(engine)
+            for days in plan_days:
+                for label, fn in (
+                    ("range", lambda: build_plan_range(db, start=start, days=days)),
+                    ("per-day", lambda: _per_day(db, start, days)),
+                ):
+                    counter.reset()
+                    fn()
+                    queries = counter.count
+                    best, median = best_of(fn)
+                    print(f"{n_items:>7} {days:>5} {label:>10} {queries:>8} {best:>9.1f} {median:>10.1f}")
+        engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--items", type=int, nargs="+", default=[100, 500, 1000])
+    parser.add_argument("--plan-days", type=int, nargs="+", default=[1, 7, 14])
+    parser.add_argument("--days", type=int, default=90, help="days of history")
+    args = parser.parse_args()
+    run(args.items, args.plan_days, args.days)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+"""Latency of /tomorrow-plan served live versus from plan_snapshots, and the cost of a rebuild.
+
+    cd backend && python -m bench.plan_snapshots
+"""
+from __future__ import annotations
+
+import argparse
+from datetime import date, timedelta
+
+from app import snapshots
+from app.services.tomorrow_plan import build_tomorrow_plan
+
+from .common import best_of, populate, session_factory, temp_engine
+
+
+def run(item_counts: list[int], days: int, snapshot_days: int) -> None:
+    today = date.today()
+    target = today + timedelta(days=1)
+    print(f"{'items':>7} {'live ms':>9} {'snapshot ms':>12} {'rebuild ms':>11}   ({snapshot_days} days)")
+    for n_items in item_counts:
+        engine = temp_engine()
+        SessionLocal = session_factory(engine)
+        with SessionLocal() as db:
+            populate(db, n_items=n_items, n_days=days)
+            rebuild, _ = best_of(lambda: snapshots.materialize(db, snapshot_days), repeat=3)
+            live, _ = best_of(lambda: build_tomorrow_plan(db, target_date=target))
+            snap, _ = best_of(lambda: snapshots.load(db, target, today))
+        print(f"{n_items:>7} {live:>9.2f} {snap:>12.3f} {rebuild:>11.1f}")
+        engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--items", type=int, nargs="+", default=[10, 100, 500, 1000])
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--snapshot-days", type=int, default=7)
+    args = parser.parse_args()
+    run(args.items, args.days, args.snapshot_days)
+
+
+if __name__ == "__main__":
+    main()
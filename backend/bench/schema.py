@@ -0,0 +1,150 @@
+"""Range-aggregate latency on waste_entries before and after the v1 schema migration.
+
+Builds a file in the pre-v1 layout (string dates, no covering indexes), times
+the aggregate shapes the services use, migrates it in place with
+app.migrate.upgrade, and times them again.
+
+    cd backend && python -m bench.schema
+"""
+from __future__ import annotations
+
+import argparse
+import random
+import time
+from datetime import date, timedelta
+
+from sqlalchemy import text
+
+from app import migrate, models
+from app.db import StorageSettings, make_engine
+
+from .common import best_of, temp_path
+
+# The layout create_all produced before schema version 1.
+LEGACY_DDL = [
+    """CREATE TABLE items (
+        id INTEGER NOT NULL, name VARCHAR(120) NOT NULL, unit VARCHAR(20) NOT NULL,
+        is_active BOOLEAN NOT NULL, PRIMARY KEY (id))""",
+    "CREATE INDEX ix_items_id ON items (id)",
+    "CREATE UNIQUE INDEX ix_items_name ON items (name)",
+    """CREATE TABLE waste_entries (
+        id INTEGER NOT NULL, entry_date VARCHAR(10) NOT NULL, item_id INTEGER NOT NULL,
+        quantity FLOAT NOT NULL, note TEXT, PRIMARY KEY (id),
+        FOREIGN KEY(item_id) REFERENCES items (id))""",
+    "CREATE INDEX ix_waste_entries_entry_date ON waste_entries (entry_date)",
+    "CREATE INDEX ix_waste_entries_item_id ON waste_entries (item_id)",
+    "CREATE INDEX ix_waste_entries_id ON waste_entries (id)",
+    "CREATE INDEX ix_waste_date_item ON waste_entries (entry_date, item_id)",
+    """CREATE TABLE daily_item_totals (
+        entry_date VARCHAR(10) NOT NULL, item_id INTEGER NOT NULL, total FLOAT NOT NULL,
+        entry_count INTEGER NOT NULL, PRIMARY KEY (entry_date, item_id),
+        FOREIGN KEY(item_id) REFERENCES items (id))""",
+    "CREATE INDEX ix_daily_totals_item_date ON daily_item_totals (item_id, entry_date)",
+]
+
+# {site} is empty on the legacy layout and scopes to one site from v3 on, as the services do.
+QUERIES = {
+    "month by item": """
+        SELECT item_id, SUM(quantity) FROM waste_entries
+        WHERE {site} entry_date >= :start AND entry_date <= :end GROUP BY item_id""",
+    "item 90-day daily": """
+        SELECT entry_date, SUM(quantity) FROM waste_entries
+        WHERE {site} item_id = :item AND entry_date >= :h_start AND entry_date <= :end GROUP BY entry_date""",
+    "90-day all items": """
+        SELECT item_id, entry_date, SUM(quantity) FROM waste_entries
+        WHERE {site} entry_date >= :h_start AND entry_date <= :end GROUP BY item_id, entry_date""",
+}
+
+
+def _fill(engine, n_items: int, days: int, entries_per_day: int, seed: int = 0) -> int:
+    """Several entries per item per day, as a multi-shop catalogue logging through the day."""
+    rng = random.Random(seed)
+    today = date.today()
+    with engine.begin() as conn:
+        conn.execute(
+            text("INSERT INTO items (id, name, unit, is_active) VALUES (:id, :name, 'pieces', 1)"),
+            [{"id": i, "name": f"Item {i:05d}"} for i in range(1, n_items + 1)],
+        )
+        n = 0
+        for back in range(days):
+            d = (today - timedelta(days=back)).isoformat()
+            rows = [
+                {"d": d, "i": item, "q": round(rng.uniform(0.1, 4.0), 2)}
+                for item in range(1, n_items + 1)
+                for _ in range(rng.randrange(entries_per_day + 1))
+            ]
+            conn.execute(
+                text("INSERT INTO waste_entries (entry_date, item_id, quantity) VALUES (:d, :i, :q)"), rows
+            )
+            n += len(rows)
+    return n
+
+
+def _time_queries(engine, params: dict, label: str) -> None:
+    site = "site_id = :site AND" if "site" in params else ""
+    with engine.connect() as conn:
+        for name, sql in QUERIES.items():
+            sql = sql.format(site=site)
+            plan = " / ".join(r[-1] for r in conn.execute(text("EXPLAIN QUERY PLAN " + sql), params))
+            best, median = best_of(lambda: conn.execute(text(sql), params).all())
+            print(f"{label:>7} {name:>18} {best:>9.2f} {median:>10.2f}   {plan}")
+
+
+def _day_key(d: date) -> int:
+    return d.year * 10000 + d.month * 100 + d.day
+
+
+def run(n_items: int, days: int, entries_per_day: int) -> None:
+    path = temp_path()
+    engine = make_engine(StorageSettings(path=path))
+    with engine.begin() as conn:
+        for ddl in LEGACY_DDL:
+            conn.exec_driver_sql(ddl)
+    n = _fill(engine, n_items, days, entries_per_day)
+    with engine.begin() as conn:
+        conn.exec_driver_sql("ANALYZE")
+    print(f"{n} entries, {n_items} items x {days} days, {path.stat().st_size / 1e6:.1f} MB")
+
+    today = date.today()
+    start, h_start = today.replace(day=1), today - timedelta(days=90)
+    print(f"{'schema':>7} {'query':>18} {'best ms':>9} {'median ms':>10}   plan")
+    _time_queries(
+        engine,
+        {"start": start.isoformat(), "end": today.isoformat(), "h_start": h_start.isoformat(), "item": 7},
+        "before",
+    )
+
+    t0 = time.perf_counter()
+    migrate.upgrade(engine)
+    elapsed = time.perf_counter() - t0
+    engine.dispose()
+    engine = make_engine(StorageSettings(path=path))
+    with engine.begin() as conn:
+        conn.exec_driver_sql("VACUUM")
+
+    _time_queries(
+        engine,
+        {
+            "start": _day_key(start),
+            "end": _day_key(today),
+            "h_start": _day_key(h_start),
+            "item": 7,
+            "site": models.DEFAULT_SITE_ID,
+        },
+        "after",
+    )
+    print(f"migration took {elapsed:.1f}s, {path.stat().st_size / 1e6:.1f} MB after VACUUM")
+    engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--items", type=int, default=2000, help="40 shops x 50 items")
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--entries-per-day", type=int, default=2, help="max entries per item per day")
+    args = parser.parse_args()
+    run(args.items, args.days, args.entries_per_day)
+
+
+if __name__ == "__main__":
+    main()
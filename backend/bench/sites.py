@@ -0,0 +1,106 @@
+"""Many sites in one SQLite file versus one file per site (WASTE_DB_SHARD_DIR).
+
+Fills N sites with two years of history in each layout, then times the
+per-site dashboard and plan, and the cross-site dashboard run one site after
+another versus fanned out over build_sites_dashboard's thread pool.
+Dashboards are the month view; latencies are best-of-N milliseconds.
+
+    cd backend && python -m bench.sites
+    cd backend && python -m bench.sites --sites 40 --items 25 --days 730
+"""
+from __future__ import annotations
+
+import argparse
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.db import StorageSettings, make_engine
+from app import migrate
+from app.services.dashboard import build_dashboard, build_sites_dashboard
+from app.services.tomorrow_plan import build_tomorrow_plan
+
+from .common import best_of, percentile, populate, session_factory, temp_path
+
+
+def _file_mb(path: Path) -> float:
+    return sum(p.stat().st_size for p in path.parent.glob(path.name + "*")) / 1e6
+
+
+class Layout:
+    """Session factories per site for one storage layout, built outside the app's router."""
+
+    def __init__(self, sharded: bool, n_sites: int):
+        self.sharded = sharded
+        self.root = temp_path("main.sqlite")
+        self.engines = []
+        self.factories: dict[int, sessionmaker[Session]] = {}
+        self.read_factories: dict[int, sessionmaker[Session]] = {}
+        for site_id in range(1, n_sites + 1):
+            if sharded or not self.engines:
+                path = self.root.parent / f"site-{site_id}.sqlite" if sharded else self.root
+                engine = make_engine(StorageSettings(path=path))
+                migrate.ensure_schema(engine)
+                read_engine = make_engine(StorageSettings(path=path), readonly=True)
+                self.engines += [engine, read_engine]
+            self.factories[site_id] = session_factory(self.engines[-2])
+            self.read_factories[site_id] = session_factory(self.engines[-1])
+
+    def session(self, site_id: int) -> Session:
+        return self.read_factories[site_id]()
+
+    def size_mb(self) -> float:
+        return sum(_file_mb(p) for p in self.root.parent.glob("*.sqlite"))
+
+    def dispose(self) -> None:
+        for engine in self.engines:
+            engine.dispose()
+
+
+def run(n_sites: int, n_items: int, days: int, repeat: int) -> None:
+    today = date.today()
+    anchor = today.isoformat()
+    target = today + timedelta(days=1)
+    sites = {site_id: f"Site {site_id}" for site_id in range(1, n_sites + 1)}
+    print(f"{n_sites} sites x {n_items} items x {days} days")
+    print(
+        f"{'layout':>8} {'fill s':>7} {'MB':>7} {'dash p50':>9} {'plan p50':>9} "
+        f"{'all seq ms':>11} {'all fan ms':>11}"
+    )
+    for sharded in (False, True):
+        layout = Layout(sharded, n_sites)
+        t0 = time.perf_counter()
+        for site_id in sites:
+            with layout.factories[site_id]() as db:
+                populate(db, n_items=n_items, n_days=days, seed=site_id, site_id=site_id)
+        fill = time.perf_counter() - t0
+
+        dash, plan = [], []
+        for site_id in sites:
+            with layout.session(site_id) as db:
+                dash.append(best_of(lambda: build_dashboard(db, "month", anchor, site_id=site_id), repeat)[0])
+                plan.append(best_of(lambda: build_tomorrow_plan(db, target, site_id=site_id), repeat)[0])
+
+        seq, _ = best_of(lambda: build_sites_dashboard(sites, "month", anchor, layout.session, workers=1), repeat)
+        fan, _ = best_of(lambda: build_sites_dashboard(sites, "month", anchor, layout.session), repeat)
+        print(
+            f"{'sharded' if sharded else 'single':>8} {fill:>7.1f} {layout.size_mb():>7.1f} "
+            f"{percentile(dash, 50):>9.2f} {percentile(plan, 50):>9.2f} {seq:>11.1f} {fan:>11.1f}"
+        )
+        layout.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sites", type=int, default=40)
+    parser.add_argument("--items", type=int, default=25, help="items per site")
+    parser.add_argument("--days", type=int, default=730, help="days of history per site")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    run(args.sites, args.items, args.days, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
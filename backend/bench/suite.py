@@ -0,0 +1,273 @@
+"""The standing benchmark suite, over a bench.generate dataset, with a JSON report to diff across commits.
+
+Cases are timed the way pytest-benchmark does it (warmup, then N rounds;
+min/max/mean/stddev/median/IQR/ops in seconds) and the report keeps the same
+shape, plus the dataset parameters and checksum so reports from different
+data are not compared by mistake.
+
+    cd backend && python -m bench.suite --json /tmp/before.json
+    git checkout my-branch
+    cd backend && python -m bench.suite --json /tmp/after.json --compare /tmp/before.json
+    cd backend && python -m bench.suite -k dashboard --sites 10 --items 200 --years 3
+"""
+from __future__ import annotations
+
+import argparse
+import http.client
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import time
+from dataclasses import asdict, dataclass, field
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+from typing import Callable
+
+from app import crud
+from app.db import StorageSettings, make_engine
+from app import migrate
+from app.services.dashboard import build_dashboard, build_sites_dashboard
+from app.services.tomorrow_plan import build_tomorrow_plan
+
+from .common import serve, session_factory, temp_path
+from .generate import Dataset, generate
+
+VIEWS = ("day", "week", "month", "quarter", "year")
+PAGE = 200
+
+
+@dataclass
+class Case:
+    name: str
+    group: str
+    fn: Callable[[], object]
+    rounds: int
+    params: dict = field(default_factory=dict)
+
+
+def measure(fn: Callable[[], object], rounds: int, warmup: int = 1) -> dict:
+    for _ in range(warmup):
+        fn()
+    times = []
+    for _ in range(rounds):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    q = statistics.quantiles(times, n=4) if len(times) > 1 else [times[0]] * 3
+    mean = statistics.fmean(times)
+    return {
+        "min": min(times),
+        "max": max(times),
+        "mean": mean,
+        "stddev": statistics.stdev(times) if len(times) > 1 else 0.0,
+        "median": statistics.median(times),
+        "q1": q[0],
+        "q3": q[2],
+        "iqr": q[2] - q[0],
+        "ops": 1.0 / mean if mean else 0.0,
+        "rounds": rounds,
+    }
+
+
+def _commit_info() -> dict:
+    def git(*args: str) -> str:
+        return subprocess.run(["git", *args], capture_output=True, text=True, check=True).stdout.strip()
+
+    try:
+        return {
+            "id": git("rev-parse", "HEAD"),
+            "branch": git("rev-parse", "--abbrev-ref", "HEAD"),
+            "dirty": bool(git("status", "--porcelain", "--untracked-files=no")),
+        }
+    except (OSError, subprocess.CalledProcessError):
+        return {}
+
+
+def _machine_info() -> dict:
+    return {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "system": platform.system(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+    }
+
+
+# ---- Cases ----
+
+
+def library_cases(SessionLocal, dataset: Dataset, rounds: int) -> tuple[list[Case], Callable[[], None]]:
+    """In-process cases on site 1. Returns them with a closer for the shared session."""
+    db = SessionLocal()
+    anchor = dataset.end
+    target = date.today() + timedelta(days=1)
+    sites = {s: f"Site {s:03d}" for s in range(1, dataset.sites + 1)}
+    cases = [
+        Case(f"dashboard[{view}]", "dashboard", lambda view=view: build_dashboard(db, view, anchor), rounds)
+        for view in VIEWS
+    ]
+    cases.append(
+        Case(
+            "dashboard_sites[month]",
+            "dashboard",
+            lambda: build_sites_dashboard(sites, "month", anchor, lambda s: SessionLocal()),
+            rounds,
+            {"sites": dataset.sites},
+        )
+    )
+    cases.append(Case("tomorrow_plan", "plan", lambda: build_tomorrow_plan(db, target), rounds))
+
+    # Cursors for deep pages, found by walking the chain once.
+    cursors: dict[int, str | None] = {0: None}
+    cursor = None
+    for page in range(1, 1001):
+        rows, _ = crud.list_waste(db, None, None, None, PAGE, cursor=cursor, with_total=False)
+        if len(rows) < PAGE:
+            break
+        cursor = crud.encode_cursor(rows[-1][0])
+        if page in (10, 100, 1000):
+            cursors[page] = cursor
+    for page, cursor in cursors.items():
+        cases.append(
+            Case(
+                f"list_waste[page={page}]",
+                "list_waste",
+                lambda cursor=cursor: crud.list_waste(db, None, None, None, PAGE, cursor=cursor, with_total=False),
+                rounds,
+                {"page": page, "limit": PAGE},
+            )
+        )
+    return cases, db.close
+
+
+def post_waste_case(db_path: Path, dataset: Dataset, posts: int) -> dict:
+    """POST /waste one at a time over a keep-alive connection to uvicorn; each request is a round."""
+    rng = random.Random(dataset.seed)
+    bodies = [
+        json.dumps(
+            {
+                "entry_date": (date.fromisoformat(dataset.end) - timedelta(days=rng.randrange(7))).isoformat(),
+                "item_id": rng.randrange(1, dataset.items + 1),
+                "quantity": round(rng.uniform(0.1, 6.0), 2),
+            }
+        )
+        for _ in range(posts + 10)
+    ]
+    it = iter(bodies)
+    with serve("app.main:app", str(db_path), {"WASTE_PLAN_IN_APP": "0"}) as port:
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+
+        def post():
+            conn.request("POST", "/waste", body=next(it), headers={"Content-Type": "application/json"})
+            resp = conn.getresponse()
+            resp.read()
+            if resp.status != 200:
+                raise RuntimeError(f"POST /waste -> {resp.status}")
+
+        stats = measure(post, posts, warmup=10)
+        conn.close()
+    return stats
+
+
+# ---- Report ----
+
+
+def _print(results: list[dict], baseline: dict[str, dict] | None) -> None:
+    head = f"{'name':<26} {'min ms':>9} {'median ms':>10} {'mean ms':>9} {'stddev':>8} {'ops':>9}"
+    print(head + (f" {'vs base':>8}" if baseline else ""))
+    for b in results:
+        s = b["stats"]
+        line = (
+            f"{b['name']:<26} {s['min'] * 1e3:>9.2f} {s['median'] * 1e3:>10.2f} {s['mean'] * 1e3:>9.2f} "
+            f"{s['stddev'] * 1e3:>8.2f} {s['ops']:>9.1f}"
+        )
+        if baseline:
+            old = baseline.get(b["name"])
+            line += f" {(s['median'] / old['stats']['median'] - 1) * 100:>+7.1f}%" if old else f" {'new':>8}"
+        print(line)
+
+
+def run(args) -> dict:
+    if args.db:
+        meta = Path(f"{args.db}.json")
+        if not meta.exists():
+            raise SystemExit(f"{meta} (written by --save-db) is missing")
+        dataset = Dataset(**json.loads(meta.read_text()))
+        # A copy, so POST /waste does not grow the saved file between runs.
+        path = temp_path()
+        shutil.copy(args.db, path)
+        engine = make_engine(StorageSettings(path=path))
+        migrate.ensure_schema(engine)
+    else:
+        path = temp_path()
+        engine = make_engine(StorageSettings(path=path))
+        migrate.ensure_schema(engine)
+        t0 = time.perf_counter()
+        dataset = generate(engine, args.sites, args.items, args.years, args.seed)
+        print(f"generated {dataset.entries} entries in {time.perf_counter() - t0:.1f}s ({dataset.checksum[:40]}...)")
+        if args.save_db:
+            engine.dispose()
+            shutil.copy(path, args.save_db)
+            Path(f"{args.save_db}.json").write_text(json.dumps(asdict(dataset), indent=2))
+
+    results = []
+    selected = lambda name: not args.k or any(k in name for k in args.k)
+    cases, close = library_cases(session_factory(engine), dataset, args.rounds)
+    try:
+        for case in cases:
+            if selected(case.name):
+                stats = measure(case.fn, case.rounds)
+                results.append({"name": case.name, "group": case.group, "params": case.params, "stats": stats})
+    finally:
+        close()
+    engine.dispose()
+    if selected("post_waste"):
+        stats = post_waste_case(path, dataset, args.posts)
+        results.append({"name": "post_waste", "group": "write", "params": {"app": "app.main"}, "stats": stats})
+    shutil.rmtree(path.parent, ignore_errors=True)
+
+    return {
+        "machine_info": _machine_info(),
+        "commit_info": _commit_info(),
+        "datetime": datetime.now(timezone.utc).isoformat(),
+        "dataset": asdict(dataset),
+        "benchmarks": results,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sites", type=int, default=3)
+    parser.add_argument("--items", type=int, default=50, help="items per site")
+    parser.add_argument("--years", type=int, default=2)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--db", type=Path, help="run on a copy of a dataset saved with --save-db instead of generating")
+    parser.add_argument("--save-db", type=Path, help="keep the generated dataset here for later --db runs")
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--posts", type=int, default=500, help="rounds of the POST /waste case")
+    parser.add_argument("-k", action="append", help="only cases whose name contains this (repeatable)")
+    parser.add_argument("--json", type=Path, help="write the report here")
+    parser.add_argument("--compare", type=Path, help="an earlier report to show median changes against")
+    args = parser.parse_args()
+
+    baseline = None
+    if args.compare:
+        old = json.loads(args.compare.read_text())
+        baseline = {b["name"]: b for b in old["benchmarks"]}
+
+    report = run(args)
+    if args.compare and old["dataset"]["checksum"] != report["dataset"]["checksum"]:
+        print(f"warning: {args.compare} was run on different data; changes are not comparable", file=sys.stderr)
+    _print(report["benchmarks"], baseline)
+    if args.json:
+        args.json.write_text(json.dumps(report, indent=2))
+        print(f"report -> {args.json}")
+
+
+if __name__ == "__main__":
+    main()
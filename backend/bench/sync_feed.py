@@ -0,0 +1,129 @@
+"""Reconnecting an offline tablet: GET /sync from its watermark against downloading everything again.
+
+A tablet has synced the whole site, then misses `changes` entries written by
+another device (POST /sync/waste). "full" is what catching up cost before:
+GET /items plus every /waste page by cursor. "delta" pages GET /sync from
+the watermark. Both are timed with bytes and requests over one keep-alive
+connection. "upload" then sends the tablet's own batch, and "resend" sends
+it again, as after a lost reply; the second inserts nothing.
+
+    cd backend && python -m bench.sync_feed
+    cd backend && python -m bench.sync_feed --apps sync async --changes 10 1000 --days 730
+"""
+from __future__ import annotations
+
+import argparse
+import http.client
+import json
+import time
+import uuid
+from datetime import date
+
+from .common import populate, serve, session_factory, temp_engine
+
+APPS = {"sync": "app.main:app", "async": "app.main_async:app"}
+
+
+class Client:
+    """One keep-alive connection, counting requests and response bytes."""
+
+    def __init__(self, port: int):
+        self.conn = http.client.HTTPConnection("127.0.0.1", port, timeout=120)
+        self.requests = 0
+        self.bytes = 0
+
+    def call(self, method: str, path: str, body=None):
+        headers = {"Content-Type": "application/json"} if body is not None else {}
+        self.conn.request(method, path, body=json.dumps(body) if body is not None else None, headers=headers)
+        resp = self.conn.getresponse()
+        raw = resp.read()
+        if resp.status != 200:
+            raise RuntimeError(f"{method} {path}: {resp.status} {raw[:200]!r}")
+        self.requests += 1
+        self.bytes += len(raw)
+        return json.loads(raw)
+
+
+def _full(client: Client) -> int:
+    client.call("GET", "/items")
+    rows, cursor = 0, None
+    while True:
+        page = client.call("GET", "/waste?limit=200&include_total=false" + (f"&cursor={cursor}" if cursor else ""))
+        rows += len(page["rows"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return rows
+
+
+def _delta(client: Client, since: int, limit: int) -> tuple[int, int]:
+    rows = 0
+    while True:
+        batch = client.call("GET", f"/sync?since={since}&limit={limit}")
+        rows += len(batch["items"]) + len(batch["waste"])
+        since = batch["until"]
+        if not batch["more"]:
+            return rows, since
+
+
+def _uploads(n: int, n_items: int) -> list[dict]:
+    today = date.today().isoformat()
+    return [
+        {"client_id": str(uuid.uuid4()), "entry_date": today, "item_id": 1 + k % n_items, "quantity": 1.25}
+        for k in range(n)
+    ]
+
+
+def _timed(port: int, fn, *args) -> dict:
+    client = Client(port)
+    t0 = time.perf_counter()
+    result = fn(client, *args)
+    ms = (time.perf_counter() - t0) * 1000.0
+    client.conn.close()
+    return {"ms": ms, "requests": client.requests, "bytes": client.bytes, "result": result}
+
+
+def _print(name: str, changes: int, mode: str, r: dict, rows: int) -> None:
+    print(f"{name:>6} {changes:>8} {mode:>7} {r['ms']:>9.1f} {r['requests']:>9} {r['bytes'] / 1024:>9.1f} {rows:>7}")
+
+
+def run(apps: list[str], change_counts: list[int], limit: int, n_items: int, days: int) -> None:
+    print(f"{n_items} items, {days} days of history, /sync limit {limit}")
+    print(f"{'app':>6} {'changes':>8} {'mode':>7} {'ms':>9} {'requests':>9} {'KiB':>9} {'rows':>7}")
+    for name in apps:
+        for changes in change_counts:
+            engine = temp_engine()
+            db_path = engine.url.database
+            with session_factory(engine)() as db:
+                populate(db, n_items=n_items, n_days=days)
+            engine.dispose()
+
+            with serve(APPS[name], db_path, {"WASTE_PLAN_IN_APP": "0"}) as port:
+                _, watermark = _timed(port, _delta, 0, limit)["result"]
+                other = Client(port)
+                other.call("POST", "/sync/waste", _uploads(changes, n_items))
+                other.conn.close()
+
+                full = _timed(port, _full)
+                _print(name, changes, "full", full, full["result"])
+                delta = _timed(port, _delta, watermark, limit)
+                _print(name, changes, "delta", delta, delta["result"][0])
+
+                batch = _uploads(changes, n_items)
+                for mode in ("upload", "resend"):
+                    r = _timed(port, lambda c: c.call("POST", "/sync/waste", batch)["results"])
+                    _print(name, changes, mode, r, sum(1 for x in r["result"] if x["status"] == "created"))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--apps", nargs="+", default=["sync"], choices=list(APPS))
+    parser.add_argument("--changes", nargs="+", type=int, default=[10, 100, 1000])
+    parser.add_argument("--limit", type=int, default=1000, help="/sync batch size")
+    parser.add_argument("--items", type=int, default=100)
+    parser.add_argument("--days", type=int, default=365)
+    args = parser.parse_args()
+    run(args.apps, args.changes, args.limit, args.items, args.days)
+
+
+if __name__ == "__main__":
+    main()
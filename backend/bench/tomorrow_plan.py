@@ -0,0 +1,44 @@
+"""Query count and latency of build_tomorrow_plan against catalogue size.
+
+    cd backend && python -m bench.tomorrow_plan
+"""
+from __future__ import annotations
+
+import argparse
+from datetime import date, timedelta
+
+from app.services.forecast import FORECASTERS
+from app.services.tomorrow_plan import build_tomorrow_plan
+
+from .common import QueryCounter, best_of, populate, session_factory, temp_engine
+
+
+def run(item_counts: list[int], days: int, model: str | None = None) -> None:
+    target = date.today() + timedelta(days=1)
+    print(f"{'items':>7} {'queries':>8} {'best ms':>9} {'median ms':>10}")
+    for n_items in item_counts:
+        engine = temp_engine()
+        SessionLocal = session_factory(engine)
+        with SessionLocal() as db:
+            populate(db, n_items=n_items, n_days=days)
+
+            counter = QueryCounter(engine)
+            build_tomorrow_plan(db, target_date=target, model=model)
+            queries = counter.count
+
+            best, median = best_of(lambda: build_tomorrow_plan(db, target_date=target, model=model))
+        print(f"{n_items:>7} {queries:>8} {best:>9.1f} {median:>10.1f}")
+        engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--items", type=int, nargs="+", default=[10, 100, 500, 1000])
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--model", choices=list(FORECASTERS), help="forecaster for every item (default: per item)")
+    args = parser.parse_args()
+    run(args.items, args.days, args.model)
+
+
+if __name__ == "__main__":
+    main()
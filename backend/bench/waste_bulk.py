@@ -0,0 +1,112 @@
+"""Throughput of per-row create_waste against create_waste_bulk for batch uploads.
+
+Each app is first checked over HTTP with an NDJSON batch holding one line
+that is not JSON: the other lines must be inserted and that one reported at
+its index.
+
+    cd backend && python -m bench.waste_bulk
+"""
+from __future__ import annotations
+
+import argparse
+import http.client
+import json
+import random
+import time
+from datetime import date, timedelta
+
+from app import crud, schemas
+from app.services.waste_import import parse_rows, validate_rows
+
+from .common import populate, serve, session_factory, temp_engine
+
+APPS = {"sync": "app.main:app", "async": "app.main_async:app"}
+
+
+def _payload(n_rows: int, n_items: int, seed: int = 0) -> bytes:
+    rng = random.Random(seed)
+    today = date.today()
+    rows = [
+        {
+            "entry_date": (today - timedelta(days=rng.randrange(7))).isoformat(),
+            "item_id": rng.randrange(1, n_items + 1),
+            "quantity": round(rng.uniform(0.1, 6.0), 2),
+        }
+        for _ in range(n_rows)
+    ]
+    return json.dumps(rows).encode()
+
+
+def _time_per_row(n_rows: int, n_items: int, body: bytes) -> float:
+    engine = temp_engine()
+    with session_factory(engine)() as db:
+        populate(db, n_items=n_items, n_days=0)
+        rows = [schemas.WasteCreate.model_validate(r) for r in json.loads(body)]
+        t0 = time.perf_counter()
+        for r in rows:
+            crud.create_waste(db, r)
+        elapsed = time.perf_counter() - t0
+    engine.dispose()
+    return elapsed
+
+
+def _time_bulk(n_rows: int, n_items: int, body: bytes) -> float:
+    engine = temp_engine()
+    with session_factory(engine)() as db:
+        populate(db, n_items=n_items, n_days=0)
+        t0 = time.perf_counter()
+        valid, _ = validate_rows(parse_rows(body, "application/json"))
+        crud.create_waste_bulk(db, [r for _, r in valid])
+        elapsed = time.perf_counter() - t0
+    engine.dispose()
+    return elapsed
+
+
+def _check_ndjson(app: str) -> str | None:
+    """What is wrong with app's answer to an NDJSON batch with a bad line at index 1, or None."""
+    engine = temp_engine()
+    with session_factory(engine)() as db:
+        populate(db, n_items=2, n_days=0)
+    good = json.dumps({"entry_date": date.today().isoformat(), "item_id": 1, "quantity": 1.5})
+    body = "\n".join([good, "{not json", good])
+    with serve(app, engine.url.database, {"WASTE_PLAN_IN_APP": "0"}) as port:
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+        conn.request("POST", "/waste/bulk", body=body, headers={"Content-Type": "application/x-ndjson"})
+        resp = conn.getresponse()
+        status, out = resp.status, json.loads(resp.read())
+        conn.close()
+    engine.dispose()
+    if status != 200:
+        return f"status {status}: {out}"
+    if out["inserted"] != 2 or [e["index"] for e in out["errors"]] != [1]:
+        return f"inserted {out['inserted']}, errors {out['errors']}"
+    return None
+
+
+def run(row_counts: list[int], n_items: int, per_row_max: int) -> None:
+    for name, app in APPS.items():
+        problem = _check_ndjson(app)
+        print(f"{name}: NDJSON batch with a bad line: {problem or 'good rows inserted, bad line reported'}")
+
+    print(f"{'rows':>7} {'mode':>8} {'seconds':>9} {'rows/s':>10}")
+    for n_rows in row_counts:
+        body = _payload(n_rows, n_items)
+        modes = [("bulk", _time_bulk)]
+        if n_rows <= per_row_max:
+            modes.insert(0, ("per-row", _time_per_row))
+        for name, fn in modes:
+            elapsed = fn(n_rows, n_items, body)
+            print(f"{n_rows:>7} {name:>8} {elapsed:>9.3f} {n_rows / elapsed:>10.0f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[80, 1000, 10000])
+    parser.add_argument("--items", type=int, default=50)
+    parser.add_argument("--per-row-max", type=int, default=1000, help="skip the per-row baseline above this size")
+    args = parser.parse_args()
+    run(args.rows, args.items, args.per_row_max)
+
+
+if __name__ == "__main__":
+    main()
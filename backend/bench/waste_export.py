@@ -0,0 +1,83 @@
+"""Throughput and peak memory of streaming waste exports at large row counts.
+
+    cd backend && python -m bench.waste_export --rows 5000000
+"""
+from __future__ import annotations
+
+import argparse
+import random
+import resource
+import time
+from datetime import date, timedelta
+
+from sqlalchemy import insert
+
+from app import models
+from app.services import waste_export
+
+from .common import session_factory, temp_engine
+
+CHUNK = 20_000
+
+
+def _fill(db, n_rows: int, n_items: int, seed: int = 0) -> None:
+    """Insert n_rows synthetic entries in chunks so the generator itself stays small."""
+    rng = random.Random(seed)
+    db.execute(
+        insert(models.Item),
+        [{"name": f"Item {i:05d}", "unit": "pieces", "is_active": True} for i in range(n_items)],
+    )
+    today = date.today()
+    done = 0
+    while done < n_rows:
+        size = min(CHUNK, n_rows - done)
+        rows = []
+        for k in range(done, done + size):
+            rows.append(
+                {
+                    "entry_date": (today - timedelta(days=k // (n_items * 4))).isoformat(),
+                    "item_id": k % n_items + 1,
+                    "quantity": round(rng.uniform(0.1, 6.0), 2),
+                }
+            )
+        db.execute(insert(models.WasteEntry), rows)
+        done += size
+    db.commit()
+
+
+def _max_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0  # KiB on Linux
+
+
+def run(n_rows: int, n_items: int, formats: list[str]) -> None:
+    engine = temp_engine()
+    with session_factory(engine)() as db:
+        t0 = time.perf_counter()
+        _fill(db, n_rows, n_items)
+        print(f"inserted {n_rows} rows in {time.perf_counter() - t0:.1f}s, peak RSS {_max_rss_mb():.1f} MB")
+
+    print(f"{'format':>8} {'seconds':>8} {'rows/s':>10} {'MB out':>8} {'peak RSS MB':>12}")
+    for fmt in formats:
+        waste_export.require_format(fmt)
+        with session_factory(engine)() as db:
+            out_bytes = 0
+            t0 = time.perf_counter()
+            for chunk in waste_export.stream_waste(db, fmt, None, None, None):
+                out_bytes += len(chunk)
+            elapsed = time.perf_counter() - t0
+        # ru_maxrss only grows, so a flat value across formats means no format buffered the export.
+        print(f"{fmt:>8} {elapsed:>8.1f} {n_rows / elapsed:>10.0f} {out_bytes / 1e6:>8.1f} {_max_rss_mb():>12.1f}")
+    engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=5_000_000)
+    parser.add_argument("--items", type=int, default=200)
+    parser.add_argument("--formats", nargs="+", default=["csv", "ndjson", "parquet"])
+    args = parser.parse_args()
+    run(args.rows, args.items, args.formats)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""Latency of GET /waste pages by depth: LIMIT/OFFSET against keyset cursors.
+
+    cd backend && python -m bench.waste_pages
+"""
+from __future__ import annotations
+
+import argparse
+
+from app import crud
+
+from .common import best_of, populate, session_factory, temp_engine
+
+PAGE = 200
+
+
+def run(n_items: int, days: int, depths: list[int]) -> None:
+    engine = temp_engine()
+    SessionLocal = session_factory(engine)
+    with SessionLocal() as db:
+        populate(db, n_items=n_items, n_days=days)
+
+        # Walk the cursor chain once, remembering the cursor that opens each page.
+        cursors: dict[int, str | None] = {0: None}
+        cursor = None
+        for page in range(1, max(depths) + 1):
+            rows, _ = crud.list_waste(db, None, None, None, PAGE, cursor=cursor, with_total=False)
+            if len(rows) < PAGE:
+                break
+            cursor = crud.encode_cursor(rows[-1][0])
+            cursors[page] = cursor
+
+        print(f"{'page':>7} {'offset ms':>10} {'cursor ms':>10} {'same rows':>10}")
+        for page in depths:
+            if page not in cursors:
+                print(f"{page:>7} {'(past end)':>10}")
+                continue
+            by_offset = lambda: crud.list_waste(db, None, None, None, PAGE, offset=page * PAGE)
+            by_cursor = lambda: crud.list_waste(db, None, None, None, PAGE, cursor=cursors[page])
+            same = [r[0].id for r in by_offset()[0]] == [r[0].id for r in by_cursor()[0]]
+            off_ms, _ = best_of(by_offset)
+            cur_ms, _ = best_of(by_cursor)
+            print(f"{page:>7} {off_ms:>10.2f} {cur_ms:>10.2f} {str(same):>10}")
+    engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--items", type=int, default=200)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--depths", type=int, nargs="+", default=[0, 10, 100, 300])
+    args = parser.parse_args()
+    run(args.items, args.days, args.depths)
+
+
+if __name__ == "__main__":
+    main()
@@ -19,6 +19,27 @@ async function request(path, options = {}) {
   return text ? JSON.parse(text) : null;
 }
 
+// Rows in a /dashboard/stream delta replace the row with the same key; by_item is ranked again.
+function mergeRows(rows, changed, key) {
+  const byKey = new Map(rows.map((r) => [r[key], r]));
+  for (const r of changed) byKey.set(r[key], r);
+  return [...byKey.values()];
+}
+
+function applyDelta(data, delta) {
+  const { seq, by_item, by_item_removed, trend, comparisons, ...fields } = delta;
+  const next = { ...data, ...fields };
+  if (by_item || by_item_removed) {
+    const gone = new Set(by_item_removed || []);
+    next.by_item = mergeRows(data.by_item, by_item || [], "item_id")
+      .filter((r) => !gone.has(r.item_id))
+      .sort((a, b) => b.total_waste - a.total_waste);
+  }
+  if (trend) next.trend = mergeRows(data.trend, trend, "date").sort((a, b) => a.date.localeCompare(b.date));
+  if (comparisons) next.comparisons = mergeRows(data.comparisons, comparisons, "label");
+  return next;
+}
+
 export const api = {
   // Items
   getItems: (includeInactive = true) =>
@@ -48,6 +69,32 @@ export const api = {
     if (anchorDate) params.set("anchor_date", anchorDate);
     return request(`/dashboard?${params.toString()}`);
   },
+  // Live dashboard: onData gets the whole dashboard on connect and again after
+  // every change. Returns a function that closes the stream.
+  streamDashboard: ({ view = "week", anchorDate }, onData, onError) => {
+    const params = new URLSearchParams();
+    params.set("view", view);
+    if (anchorDate) params.set("anchor_date", anchorDate);
+    const source = new EventSource(`${API_BASE}/dashboard/stream?${params.toString()}`);
+    let data = null;
+    source.addEventListener("snapshot", (e) => {
+      data = JSON.parse(e.data);
+      onData(data);
+    });
+    source.addEventListener("delta", (e) => {
+      data = applyDelta(data, JSON.parse(e.data));
+      onData(data);
+    });
+    // Sent by the server when the dashboard cannot be built; connection drops also
+    // fire "error" (without data), and EventSource reconnects from those by itself.
+    source.addEventListener("error", (e) => {
+      if (e.data) {
+        onError(JSON.parse(e.data).detail);
+        source.close();
+      }
+    });
+    return () => source.close();
+  },
 
   // Tomorrow plan
   getTomorrowPlan: ({ targetDate } = {}) => {
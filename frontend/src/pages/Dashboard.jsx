@@ -21,14 +21,10 @@ export default function Dashboard() {
   const [data, setData] = useState(null);
   const [err, setErr] = useState("");
 
-  async function load() {
-    setErr("");
-    const d = await api.getDashboard({ view, anchorDate });
-    setData(d);
-  }
-
+  // Live: new waste shows up without re-fetching the whole dashboard.
   useEffect(() => {
-    load().catch((e) => setErr(e.message));
+    setErr("");
+    return api.streamDashboard({ view, anchorDate }, setData, setErr);
   }, [view, anchorDate]);
 
   const pieData = useMemo(() => (